@@ -26,3 +26,39 @@ def test_empty():
 def test_compare():
     with pytest.raises(SystemExit):
         app.parse_args(["compare"])
+
+
+def test_stats():
+    args = app.parse_args(["stats", "--monthly"])
+    assert args.cmd == "stats"
+    assert args.monthly
+    with pytest.raises(SystemExit):
+        app.parse_args(["stats", "--monthly", "--heatmap"])
+
+
+def test_compare_percentiles():
+    args = app.parse_args(["compare", "--percentiles", "--years", "10"])
+    assert args.percentiles
+    assert args.years == 10
+    with pytest.raises(SystemExit):
+        app.parse_args(["compare", "--percentiles", "--last-week"])
+    assert app.parse_args(["compare", "--rolling", "7d"]).rolling == "7d"
+    with pytest.raises(SystemExit):
+        app.parse_args(["compare", "--rolling", "1y"])
+
+
+def test_query_expression():
+    args = app.parse_args(["query", "--expr", "wind_chill", "--window", "last-month"])
+    assert args.expr == "wind_chill"
+    with pytest.raises(SystemExit):
+        app.parse_args(["query"])
+
+
+def test_relocate():
+    assert app.parse_args(["relocate"]).cmd == "relocate"
+    assert "relocate" not in app.STORE_COMMANDS and "fleet" not in app.STORE_COMMANDS
+
+
+def test_daemon_metrics_endpoint_is_local_by_default():
+    assert app.parse_args(["daemon", "--metrics-port", "9100"]).metrics_addr == "127.0.0.1"
+    assert app.parse_args(["daemon", "--metrics-addr", "0.0.0.0"]).metrics_addr == "0.0.0.0"
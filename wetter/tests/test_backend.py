@@ -8,19 +8,34 @@ of the application. It is responsible for the following tasks:
 - Testing the update process
 """
 # import os
+import json
+import sys
+import time
+import tracemalloc
 from datetime import datetime as dt
 from datetime import timedelta as td
 from datetime import timezone as tz
 
+import numpy as np
+import pandas as pd
 import pytest
 
+from wetter import metrics, tracing
+from wetter.backend import gaps, integrity, queries, sketch, stats
+from wetter.backend.cache import QueryCache
+from wetter.backend.climatology import Climatology
+from wetter.backend.cube import CalendarCube
 from wetter.backend.extern import (
     APIForWeatherData,
     OpenMeteoArchiveMeasurements,
     OpenMeteoMeasurements,
     QueryTicket,
+    date_chunks,
 )
+from wetter.backend.local import WetterDB
+from wetter.backend.spatial import LocationIndex
 from wetter.config.config import Configuration
+from wetter.config.parser import from_store, to_store
 
 
 @pytest.fixture
@@ -97,15 +112,604 @@ def test_serialization(db):
     assert serialized["data"]["index"] == ["temperature", "wind"]
 
 
-informal_api_call = ["parse", "get", "url"]
+informal_api_call = ["parse", "decode", "get", "url"]
 
 
 @pytest.mark.parametrize("method", informal_api_call)
 def test_initialization_of_informal_api(method, db):
     qt = QueryTicket(db.df.index[0], db.df.index[1], db.lat, db.lon)
-    correct_input = {} if method == "parse" else qt
+    correct_input = {"parse": {}, "decode": b"{}"}.get(method, qt)
     api = APIForWeatherData
     with pytest.raises(AssertionError):
         getattr(api, method)(1)
     with pytest.raises(NotImplementedError):
         getattr(api, method)(correct_input)
+
+
+def test_query_cache_evicts_least_recently_used(tmp_path):
+    cache = QueryCache(path=str(tmp_path / "queries.pickle"), maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+
+
+def test_query_cache_is_persisted(tmp_path):
+    path = str(tmp_path / "queries.pickle")
+    cache = QueryCache(path=path)
+    cache.put(("last_week", 1), 42)
+    cache.save()
+    assert QueryCache(path=path).get(("last_week", 1)) == 42
+
+
+def test_query_cache_persists_recent_use(tmp_path):
+    path = str(tmp_path / "queries.pickle")
+    cache = QueryCache(path=path, maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.save()
+    # A hit of the most recent result does not change the order
+    cache = QueryCache(path=path, maxsize=2)
+    assert cache.get("b") == 2 and not cache.modified
+    assert cache.get("a") == 1 and cache.modified
+    cache.save()
+    cache = QueryCache(path=path, maxsize=2)
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+
+
+def test_cached_query_does_not_load_store(tmp_path):
+    cache_path = str(tmp_path / "queries.pickle")
+    date = dt(year=2023, month=1, day=1, minute=10, tzinfo=tz.utc)
+    conf = Configuration(store_path="./tests/testdata.json", self_check=False, cache_path=cache_path)
+    expected = conf.query(queries.last_week, date)
+    conf.cache.save()
+    conf = Configuration(store_path="./tests/testdata.json", self_check=False, cache_path=cache_path)
+    result = conf.query(queries.last_week, date + td(minutes=20))
+    assert conf._store is None
+    assert result.equals(expected)
+
+
+def test_generation_is_part_of_serialization(db):
+    assert db.serialize()["generation"] == db.generation
+
+
+def test_running_stats_match_batch_statistics(db):
+    values = db.df.temperature.to_numpy()
+    merged = stats.RunningStats.from_values(values[:1000]).merge(stats.RunningStats.from_values(values[1000:]))
+    assert merged.count == values.size
+    assert merged.mean == pytest.approx(values.mean())
+    assert merged.variance == pytest.approx(values.var())
+    assert (merged.min, merged.max) == (values.min(), values.max())
+
+
+def test_overall_stats_from_buckets(db):
+    overall = db.overall_stats()
+    assert len(db.stats) == 12
+    assert overall["wind"].count == db.df.index.size
+    assert overall["wind"].mean == pytest.approx(db.df.wind.mean())
+
+
+def test_stats_are_refreshed_on_changed_months(db):
+    db.df.loc[db.df.index[-1], "temperature"] = 100
+    db._refresh_stats(db.df.index[-1:])
+    assert db.stats["2022-12"]["temperature"].max == 100
+    assert db.overall_stats()["temperature"].max == 100
+
+
+def test_stats_are_pushed_on_integrate(db, monkeypatch):
+    recent = db.df.iloc[-100:].copy()
+    db.df = db.df.iloc[:-100]
+    db._refresh_stats(db.df.index.append(recent.index))
+    replaced = db.df.iloc[-2:] + 1
+    calls = []
+    refresh = WetterDB._refresh_stats
+    monkeypatch.setattr(WetterDB, "_refresh_stats", lambda self, index: calls.append(index) or refresh(self, index))
+    db._integrate(recent.iloc[:-50], db.lat, db.lon)
+    assert calls[-1].size == 0
+    db._integrate(pd.concat([replaced, recent.iloc[-50:]]), db.lat, db.lon)
+    assert calls[-1].equals(replaced.index)
+    db._integrate(recent.iloc[-50:], db.lat, db.lon)
+    assert len(calls) == 2
+
+    pushed, sketches = dict(db.stats), dict(db.sketches)
+    db._refresh_stats(db.df.index)
+    assert sketches == db.sketches
+    for key, bucket in db.stats.items():
+        for var, expected in bucket.items():
+            assert pushed[key][var].count == expected.count
+            assert pushed[key][var].mean == pytest.approx(expected.mean)
+            assert pushed[key][var].m2 == pytest.approx(expected.m2)
+            assert (pushed[key][var].min, pushed[key][var].max) == (expected.min, expected.max)
+
+
+def test_climatology_lookup(db, tmp_path):
+    index = Climatology()
+    assert index.extend(db.df, until=dt(year=2023, month=6, day=1, tzinfo=tz.utc)) == 1
+    assert index.extend(db.df, until=dt(year=2023, month=6, day=1, tzinfo=tz.utc)) == 0
+    date = dt(year=2022, month=3, day=1, hour=12, tzinfo=tz.utc)
+    value = db.df.loc[date, "temperature"]
+    normal, rank, years = index.lookup("temperature", date.replace(year=2025), value)
+    assert (normal, rank, years) == (value, 50, 1)
+
+    path = str(tmp_path / "climatology.npz")
+    index.save(path)
+    loaded = Climatology.load(path)
+    assert loaded.years == [2022]
+    assert np.array_equal(loaded.values["wind"], index.values["wind"], equal_nan=True)
+
+
+def test_climatology_reindexes_modified_years(db, tmp_path):
+    until = dt(year=2023, month=6, day=1, tzinfo=tz.utc)
+    index = Climatology(location=(db.lat, db.lon))
+    assert index.extend(db.df, until=until) == 1
+    path = str(tmp_path / "climatology.npz")
+    index.save(path)
+    index = Climatology.load(path)
+    assert index.location == (db.lat, db.lon)
+    date = dt(year=2022, month=3, day=1, hour=12, tzinfo=tz.utc)
+    db.df.loc[date, "temperature"] = 40.0
+    assert index.extend(db.df, until=until) == 1
+    assert index.lookup("temperature", date, 40.0)[0] == 40.0
+    assert index.extend(db.df, until=until) == 0
+
+
+def test_climatology_is_not_extended_with_current_year(db):
+    index = Climatology()
+    assert index.extend(db.df, until=dt(year=2022, month=6, day=1, tzinfo=tz.utc)) == 0
+    assert index.years == []
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode()
+
+    def json(self):
+        return self.payload
+
+
+def fake_api(start, hours, status_code=200):
+    """Create an API returning hourly measurements of Open Meteo format starting at `start`."""
+    times = [start + td(hours=i) for i in range(hours)]
+    payload = {
+        "hourly": {
+            "time": [t.strftime("%Y-%m-%dT%H:%M") for t in times],
+            "temperature_2m": [float(i % 30) for i in range(hours)],
+            "windspeed_10m": [float(i % 7) for i in range(hours)],
+        }
+    }
+
+    class FakeAPI(OpenMeteoMeasurements):
+        @staticmethod
+        def get(qt):
+            return FakeResponse(payload, status_code=status_code)
+
+    return FakeAPI
+
+
+def test_update_keeps_forecast(db):
+    end = dt(year=2023, month=1, day=1, hour=12, tzinfo=tz.utc)
+    db.update(start=db.df.index.max(), end=end, api=fake_api(dt(year=2023, month=1, day=1, tzinfo=tz.utc), 48))
+    assert db.df.index.max() == end
+    assert db.forecast.index.size == 35
+    assert db.forecast.index.min() == end + td(hours=1)
+    assert db.forecast_version == 1
+    upcoming = queries.next_hours(db.forecast, end, hours=6)
+    assert upcoming.index.size == 6
+
+
+def test_update_reports_failure(db):
+    generation = db.generation
+    end = dt(year=2023, month=1, day=1, hour=12, tzinfo=tz.utc)
+    api = fake_api(dt(year=2023, month=1, day=1, tzinfo=tz.utc), 48, status_code=500)
+    assert not db.update(start=db.df.index.max(), end=end, api=api)
+    assert db.generation == generation
+    api = fake_api(dt(year=2023, month=1, day=1, tzinfo=tz.utc), 48)
+    assert db.update(start=db.df.index.max(), end=end, api=api)
+    assert db.generation == generation + 1
+
+
+def test_update_without_new_data_keeps_fingerprint(db):
+    end = dt(year=2023, month=1, day=1, hour=12, tzinfo=tz.utc)
+    api = fake_api(dt(year=2023, month=1, day=1, tzinfo=tz.utc), 48)
+    db.update(start=db.df.index.max(), end=end, api=api)
+    generation, fingerprint = db.generation, db.fingerprint()
+    db.update(start=db.df.index.max(), end=end, api=api)
+    assert db.generation == generation
+    assert db.forecast_version == 1
+    assert db.fingerprint() == fingerprint
+
+
+def test_update_fills_short_gaps(db, tmp_path):
+    db.gap_limit = 3
+    first = dt(year=2023, month=1, day=1, tzinfo=tz.utc)
+    end = first + td(hours=12)
+    db.update(start=db.df.index.max(), end=end, api=fake_api(first + td(hours=2), 48))
+    assert list(db.filled) == [first, first + td(hours=1)]
+    assert db.verify(full=True).counts()["gaps"] == 0
+    to_store(db, path=str(tmp_path / "wetter.json"))
+    assert from_store(str(tmp_path / "wetter.json")).filled.equals(db.filled)
+    # Real measurements replace the interpolated ones
+    db.update(start=db.df.index.max(), end=end, api=fake_api(first, 48))
+    assert db.filled.size == 0 and db.df.temperature[first] == 0.0
+
+
+def test_update_metrics(db):
+    end = dt(year=2023, month=1, day=1, hour=12, tzinfo=tz.utc)
+    api = fake_api(dt(year=2023, month=1, day=1, tzinfo=tz.utc), 48)
+    labels = {"api": api.__name__, "status": 200}
+    before = (metrics.ROWS_INGESTED.value(), metrics.API_REQUESTS.value(**labels), metrics.API_LATENCY.count(**labels))
+    db.update(start=db.df.index.max(), end=end, api=api)
+    assert metrics.ROWS_INGESTED.value() - before[0] == 13
+    assert metrics.API_REQUESTS.value(**labels) - before[1] == 1
+    assert metrics.API_LATENCY.count(**labels) - before[2] == 1
+    bytes_before = metrics.API_BYTES.count(api=api.__name__)
+    db.update(end=end, api=api)
+    assert metrics.API_BYTES.count(api=api.__name__) - bytes_before == 1
+
+
+def test_update_requests_only_new_hours(db):
+    latest = db.df.index.max()
+    end = latest + td(hours=2, minutes=30)
+    tickets = []
+
+    class RecordingAPI(OpenMeteoMeasurements):
+        @staticmethod
+        def get(qt):
+            tickets.append(qt)
+            return FakeResponse({"hourly": {"time": [], "temperature_2m": [], "windspeed_10m": []}})
+
+    db.update(end=end, api=RecordingAPI, forecast_hours=6)
+    url = OpenMeteoMeasurements.url(tickets[0])
+    first, last = latest + td(hours=1), latest + td(hours=8)
+    assert f"start_hour={first:%Y-%m-%dT%H:%M}&end_hour={last:%Y-%m-%dT%H:%M}" in url
+    assert "start_date" not in url and "weathercode" not in url
+    # A second update within the same hour only requests the current hour
+    db.update(end=latest + td(minutes=30), api=RecordingAPI)
+    assert tickets[1].start == tickets[1].end
+
+
+def test_update_trace(db, tmp_path):
+    path = tmp_path / "trace.jsonl"
+    tracing.configure(str(path))
+    try:
+        end = dt(year=2023, month=1, day=1, hour=12, tzinfo=tz.utc)
+        db.update(start=db.df.index.max(), end=end, api=fake_api(dt(year=2023, month=1, day=1, tzinfo=tz.utc), 48))
+    finally:
+        tracing.configure(None)
+    records = {record["name"]: record for record in map(json.loads, path.read_text().splitlines())}
+    stages = ["ticket", "request", "decode", "forecast", "merge", "stats", "compact", "verify"]
+    assert set(records) == set(stages + ["update"])
+    assert all(records[stage]["parent"] == records["update"]["span"] for stage in stages)
+    assert records["request"]["attributes"]["status"] == 200
+    assert records["decode"]["attributes"]["rows"] == 48
+    assert records["forecast"]["attributes"]["rows"] == 35
+    assert records["merge"]["attributes"]["rows"] == 13
+
+
+def test_location_index(tmp_path):
+    index = LocationIndex(str(tmp_path), cell=0.5)
+    index.add(49.0, 8.41, index.path(49.0, 8.41))
+    index.add(49.3, 8.6, index.path(49.3, 8.6))
+    index.add(-33.9, 18.4, index.path(-33.9, 18.4))
+    index.add(49.0, 8.41, index.path(49.0, 8.41))
+    assert len(index) == 3
+    assert index.nearest(49.25, 8.5, tolerance=1)[:2] == (49.3, 8.6)
+    assert index.nearest(49.6, 9.1, tolerance=1)[:2] == (49.3, 8.6)
+    assert index.nearest(49.6, 9.1, tolerance=0.1) is None
+    assert index.nearest(-34, 18, tolerance=2)[:2] == (-33.9, 18.4)
+    index.save()
+    loaded = LocationIndex(str(tmp_path), cell=2)
+    assert sorted(loaded) == sorted(index)
+
+
+def synthetic_payload(years, start=dt(year=1983, month=1, day=1)):
+    hours = round(years * 365 * 24)
+    rng = np.random.default_rng(0)
+    payload = {
+        "utc_offset_seconds": 0,
+        "hourly_units": {"time": "iso8601"},
+        "hourly": {
+            "time": [(start + td(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(hours)],
+            "temperature_2m": np.round(rng.normal(10, 8, hours), 1).tolist(),
+            "windspeed_10m": np.round(rng.gamma(2, 5, hours), 1).tolist(),
+        },
+    }
+    payload["hourly"]["temperature_2m"][1] = None
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+@pytest.mark.parametrize("separators", [(",", ":"), (", ", ": ")])
+def test_decode_matches_parse(separators):
+    content = json.dumps(json.loads(synthetic_payload(0.1)), separators=separators).encode()
+    decoded = OpenMeteoArchiveMeasurements.decode(content)
+    parsed = OpenMeteoArchiveMeasurements.parse(json.loads(content))
+    assert decoded.equals(parsed)
+    assert np.isnan(decoded.temperature[1])
+
+
+def test_decode_considers_utc_offset():
+    content = synthetic_payload(0.01).replace(b'"utc_offset_seconds":0', b'"utc_offset_seconds":7200')
+    decoded = OpenMeteoMeasurements.decode(content)
+    assert decoded.index[0] == dt(year=1982, month=12, day=31, hour=22, tzinfo=tz.utc)
+
+
+def test_decode_falls_back_on_unexpected_values(caplog):
+    payload = json.loads(synthetic_payload(0.01))
+    payload["hourly"]["windspeed_10m"][3] = "n/a"
+    content = json.dumps(payload, separators=(",", ":")).encode()
+    decoded = OpenMeteoArchiveMeasurements.decode(content)
+    assert decoded.equals(OpenMeteoArchiveMeasurements.parse(payload))
+    assert decoded.wind.size == len(payload["hourly"]["time"]) and decoded.wind[3] == "n/a"
+    # Arrays of different length are rejected by the json parser as well
+    del payload["hourly"]["windspeed_10m"][-1]
+    with pytest.raises(ValueError):
+        OpenMeteoArchiveMeasurements.decode(json.dumps(payload).encode())
+    assert caplog.text.count("Falling back to json parser") == 2
+
+
+@pytest.mark.long
+def test_decode_of_large_payload_is_faster_and_smaller():
+    content = synthetic_payload(5)
+
+    def measure(func):
+        start = time.perf_counter()
+        func()
+        duration = time.perf_counter() - start
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return duration, peak
+
+    parse_time, parse_peak = measure(lambda: OpenMeteoArchiveMeasurements.parse(json.loads(content)))
+    decode_time, decode_peak = measure(lambda: OpenMeteoArchiveMeasurements.decode(content))
+    assert decode_time * 5 < parse_time
+    assert decode_peak * 3 < parse_peak
+
+
+def interpolate_gaps(df, limit):
+    """Reference of `gaps.regularize` using the interpolation of pandas per gap length."""
+    grid = df.reindex(pd.date_range(df.index[0], df.index[-1], freq="H", name=df.index.name))
+    result = grid.interpolate(limit_area="inside")
+    for var in grid.columns:
+        missing = grid[var].isna()
+        length = missing.groupby((~missing).cumsum()).transform("sum")
+        result.loc[missing & (length > limit), var] = np.nan
+    return result.dropna(how="all")
+
+
+@pytest.mark.long
+def test_regularize_decade_is_faster_than_pandas():
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2010-01-01", periods=10 * 8760, freq="H", tz="UTC", name="time")
+    df = pd.DataFrame({"temperature": rng.normal(10, 8, index.size), "wind": rng.gamma(2, 5, index.size)}, index=index)
+    drop = rng.random(index.size) < 0.03
+    for start in rng.integers(0, index.size - 10, 50):
+        stop = start + rng.integers(2, 8)
+        drop[start:stop] = True
+    df = df[~drop]
+
+    def measure(func):
+        start = time.perf_counter()
+        for _ in range(5):
+            func()
+        return time.perf_counter() - start
+
+    result, filled = gaps.regularize(df, limit=3)
+    expected = interpolate_gaps(df, limit=3)
+    assert result.index.equals(expected.index)
+    assert np.allclose(result, expected, equal_nan=True)
+    assert filled.to_numpy().sum() == expected.count().sum() - df.count().sum()
+    assert measure(lambda: gaps.regularize(df, limit=3)) < measure(lambda: interpolate_gaps(df, limit=3))
+
+
+def test_integrity_reports_all_anomalies(db):
+    df = db.df.iloc[:100].copy()
+    df.iloc[10, 0] = np.nan
+    df.iloc[20, 0] = 99.0
+    df.iloc[30, 1] = df.iloc[29, 1] + 100
+    df = df.drop(df.index[40:43])
+    df = pd.concat([df, df.iloc[[50]]])
+    report = integrity.check(df)
+    counts = report.counts()
+    assert not report.ok
+    assert counts["missing"] == 1 and counts["range"] == 1 and counts["gaps"] == 1
+    assert counts["duplicates"] == 2 and counts["unsorted"] == 1
+    assert df.index[30] in report.anomalies["spikes"]
+    assert report.anomalies["range"][0] == df.index[20]
+    assert integrity.check(db.df).ok
+
+
+def test_verify_only_checks_rows_after_watermark(db):
+    assert db.verified["rows"] == db.df.index.size
+    assert db.verify().rows == 0
+    assert db.verify(full=True).rows == db.df.index.size
+    end = dt(year=2023, month=1, day=1, hour=12, tzinfo=tz.utc)
+    db.update(start=db.df.index.max(), end=end, api=fake_api(dt(year=2023, month=1, day=1, tzinfo=tz.utc), 48))
+    assert db.verified == dict(until=db.df.index[-1], rows=db.df.index.size)
+    # Insertion before the watermark requires a full check
+    db.df = pd.concat([db.df.iloc[:10], db.df.iloc[11:]])
+    assert db.verify().rows == db.df.index.size
+    assert db.verify(full=True).rows == db.df.index.size
+
+
+class ContentResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeArchive(OpenMeteoArchiveMeasurements):
+    """Archive API returning synthetic measurements of whole days like Open Meteo."""
+
+    @staticmethod
+    def get(qt):
+        days = (qt.end.date() - qt.start.date()).days + 1
+        first = dt.combine(qt.start.date(), dt.min.time())
+        return ContentResponse(synthetic_payload(days / 365, start=first))
+
+
+def test_update_from_archive_keeps_whole_days(db):
+    end = (db.df.index.max() + td(days=2)).replace(hour=12)
+    db.update(start=db.df.index.max(), end=end, api=FakeArchive)
+    # The archive answers with whole days. The hours after the ticket are no forecast.
+    assert db.df.index.max() == end.replace(hour=23)
+    assert db.forecast_version == 0 and db.forecast.index.size == 0
+
+
+def test_date_chunks():
+    start = dt(year=2000, month=1, day=1, tzinfo=tz.utc)
+    end = dt(year=2000, month=3, day=15, hour=6, tzinfo=tz.utc)
+    chunks = list(date_chunks(start, end, days=30))
+    assert [chunk[0].date() for chunk in chunks] == [start.date(), dt(2000, 1, 31).date(), dt(2000, 3, 1).date()]
+    assert all(first[1] + td(hours=1) == second[0] for first, second in zip(chunks, chunks[1:]))
+    assert chunks[-1][1] == end
+
+
+def test_ingest_in_chunks(db):
+    rows, generation = db.df.index.size, db.generation
+    start = dt(year=2020, month=1, day=1, tzinfo=tz.utc)
+    end = dt(year=2021, month=12, day=31, hour=23, tzinfo=tz.utc)
+    chunks = []
+    assert db.ingest(start, end, api=FakeArchive, days=100, on_chunk=lambda *chunk: chunks.append(chunk))
+    assert len(chunks) == 8
+    assert db.df.index.size == rows + 2 * 365 * 24 + 24
+    assert db.df.index.min() == start and db.df.index.is_monotonic_increasing
+    assert db.generation == generation + 1
+    assert "2020-02" in db.stats
+    assert db.verify(full=True).counts()["gaps"] == 0
+
+
+def ingest_overhead(db, years, days=60):
+    """Return the maximum memory allocated on top of the datastore while ingesting a chunk."""
+    start = dt(year=2000, month=1, day=1, tzinfo=tz.utc)
+    end = dt(year=2000 + years, month=1, day=1, tzinfo=tz.utc) - td(hours=1)
+    overheads = []
+
+    def on_chunk(*_):
+        current, peak = tracemalloc.get_traced_memory()
+        overheads.append(peak - on_chunk.current)
+        tracemalloc.reset_peak()
+        on_chunk.current = current
+
+    tracemalloc.start()
+    on_chunk.current = tracemalloc.get_traced_memory()[0]
+    db.ingest(start, end, api=FakeArchive, days=days, on_chunk=on_chunk)
+    tracemalloc.stop()
+    return max(overheads)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason="tracemalloc.reset_peak requires Python 3.9")
+def test_ingest_memory_is_bounded_by_chunk_size(db):
+    other = Configuration(store_path="./tests/testdata.json", self_check=False).get_store()
+    for store, years in ((db, 2), (other, 12)):
+        overhead = ingest_overhead(store, years=years)
+        # Independent of the length of the archive, a copy of the datastore and at most ~1kB per hour of a chunk
+        assert overhead - store.df.memory_usage().sum() < 60 * 24 * 1000
+
+
+def test_quantile_sketch_is_mergeable_and_exact():
+    rng = np.random.default_rng(1)
+    first, second = np.round(rng.normal(10, 8, 5000), 1), np.round(rng.gamma(2, 5, 3000), 1)
+    first[3] = np.nan
+    merged = sketch.QuantileSketch.from_values(first).merge(sketch.QuantileSketch.from_values(second))
+    values = np.concatenate([first, second])
+    assert merged == sketch.QuantileSketch.from_values(values)
+    assert merged.count == 7999
+    qs = [0, 0.1, 0.5, 0.9, 1]
+    expected = np.quantile(values[~np.isnan(values)], qs, method="inverted_cdf")
+    assert merged.quantiles(qs) == pytest.approx(expected)
+    assert sketch.QuantileSketch.from_dict(merged.to_dict()) == merged
+    assert np.isnan(sketch.QuantileSketch().quantiles([0.5])[0])
+
+
+def test_quantile_sketch_error_bound():
+    values = np.random.default_rng(2).normal(10, 8, 10000)
+    estimate = sketch.QuantileSketch.from_values(values).quantiles([0.1, 0.5, 0.9])
+    exact = np.quantile(values, [0.1, 0.5, 0.9], method="inverted_cdf")
+    assert np.all(np.abs(np.array(estimate) - exact) <= sketch.RESOLUTION / 2 + 1e-9)
+
+
+def test_calendar_cube_matches_groupby(db, tmp_path):
+    cube = CalendarCube(zone="Etc/GMT-2")
+    assert cube.extend(db.df.iloc[:5000]) == 5000
+    assert cube.extend(db.df) == db.df.index.size - 5000
+    assert cube.extend(db.df) == 0
+    local = db.df.copy()
+    local.index = local.index + pd.Timedelta(minutes=120)
+    july = local[(local.index.year == 2022) & (local.index.month == 7)]
+    daily = cube.select(year=2022, month=7).aggregate(by=("day",))
+    expected = july.groupby(july.index.day)["temperature"]
+    assert daily["temperature_mean"].to_numpy() == pytest.approx(expected.mean().to_numpy())
+    assert daily["temperature_max"].to_numpy() == pytest.approx(expected.max().to_numpy())
+    assert daily["wind_count"].sum() == july["wind"].count()
+    profile = cube.aggregate(by=("hour",))
+    assert profile["temperature_mean"].to_numpy() == pytest.approx(
+        local.groupby(local.index.hour)["temperature"].mean().to_numpy()
+    )
+    summer = cube.select(month=slice(6, 9)).aggregate(by=("month", "hour"))
+    assert list(summer.index.get_level_values("month").unique()) == [6, 7, 8]
+    assert cube.select(year=1999).aggregate(by=("hour",)).index.size == 0
+    path = str(tmp_path / "cube.npz")
+    cube.generation = 3
+    cube.save(path)
+    loaded = CalendarCube.load(path, zone="Etc/GMT-2")
+    assert loaded.generation == 3 and loaded.last == db.df.index[-1]
+    assert loaded.aggregate(by=("month",)).equals(cube.aggregate(by=("month",)))
+    assert CalendarCube.load(path, zone="Etc/GMT-1").years == []
+
+
+def test_calendar_cube_aggregates_modified_days_again(db, tmp_path):
+    cube = CalendarCube(zone="Asia/Kolkata", location=(db.lat, db.lon))
+    cube.extend(db.df)
+    path = str(tmp_path / "cube.npz")
+    cube.save(path)
+    cube = CalendarCube.load(path, zone="Asia/Kolkata")
+    assert cube.location == (db.lat, db.lon)
+    assert cube.extend(db.df) == 0
+    df = db.df.drop(db.df.index[3000])
+    df.loc[df.index[5000], "temperature"] = 40.0
+    # Both changes lie within one day each
+    assert cube.extend(df) == 2 * 24 - 1
+    expected = CalendarCube(zone="Asia/Kolkata")
+    expected.extend(df)
+    for name in ("count", "sum", "min", "max"):
+        assert np.allclose(cube.arrays[name], expected.arrays[name])
+    # Compacted days stay part of the cube
+    assert cube.extend(df[df.index >= df.index[24 * 30]]) == 0
+    assert np.array_equal(cube.arrays["count"], expected.arrays["count"])
+
+
+def test_calendar_cube_follows_daylight_saving_time(db):
+    cube = CalendarCube(zone="Europe/Berlin")
+    assert cube.extend(db.df[db.df.index.month < 7]) + cube.extend(db.df) == db.df.index.size
+    local = db.df.tz_convert("Europe/Berlin")
+    profile = cube.aggregate(by=("month", "hour"))
+    expected = local.groupby([local.index.month, local.index.hour])["temperature"]
+    assert profile["temperature_count"].to_numpy() == pytest.approx(expected.count().to_numpy())
+    assert profile["temperature_mean"].to_numpy() == pytest.approx(expected.mean().to_numpy())
+    # Only the checksums of added days are updated, these match the checksums of all days
+    days, checksums = integrity.checksums(db.df, db.df.index.asi8 // pd.Timedelta(days=1).value)
+    assert cube.checksums == dict(zip(days.tolist(), checksums.tolist()))
+
+
+def test_calendar_cube_keeps_repeated_hours_of_neighbouring_days(db):
+    # The hour repeated at the end of daylight saving time (2h shift) spans two UTC days
+    cube = CalendarCube(zone="Antarctica/Troll")
+    cube.extend(db.df)
+    df = db.df.copy()
+    df.loc[dt(year=2022, month=10, day=30, hour=5, tzinfo=tz.utc), "temperature"] = 40.0
+    assert cube.extend(df) == 24 + 1
+    expected = CalendarCube(zone="Antarctica/Troll")
+    expected.extend(df)
+    for name in ("count", "sum", "min", "max"):
+        assert np.allclose(cube.arrays[name], expected.arrays[name])
@@ -0,0 +1,129 @@
+"""Test file for the library interface."""
+import json
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+from datetime import timedelta as td
+from datetime import timezone as tz
+
+import pandas as pd
+import pytest
+
+from wetter import client as client_module
+from wetter.backend import queries
+from wetter.backend.extern import OpenMeteoMeasurements
+from wetter.client import RWLock, WetterClient
+from wetter.config.parser import from_store, to_store
+
+DATE = dt(year=2022, month=7, day=15, hour=12, tzinfo=tz.utc)
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    path = tmp_path / "wetter.json"
+    shutil.copy("./tests/testdata.json", path)
+    yield str(path)
+    client_module.clear_cache()
+
+
+def test_client_is_lazy_and_shared(tmp_path, store_path):
+    """Creating a client does no I/O, loaded datastores are shared per file."""
+    WetterClient(str(tmp_path / "missing.json"))
+    first, second = WetterClient(store_path), WetterClient(store_path)
+    assert first._entry.store is None
+    first.generation
+    assert second._entry.store is first._entry.store
+
+
+def test_client_shared_per_options(store_path):
+    """Clients with other options do not get the datastore loaded for the first one."""
+    first, second = WetterClient(store_path), WetterClient(store_path, gap_limit=3)
+    assert first._entry is not second._entry
+    first.generation
+    assert second._entry.store is None
+    second.generation
+    assert second._entry.store.gap_limit == 3 and first._entry.store.gap_limit is None
+    assert WetterClient(store_path, gap_limit=3)._entry is second._entry
+
+
+class EmptyResponse:
+    status_code = 200
+    content = json.dumps({"hourly": {"time": [], "temperature_2m": [], "windspeed_10m": []}}).encode()
+
+
+class EmptyAPI(OpenMeteoMeasurements):
+    @staticmethod
+    def get(qt):
+        return EmptyResponse()
+
+
+def test_client_update_reports_changes(store_path):
+    """A successful update without new measurements reports no change."""
+    client = WetterClient(store_path)
+    generation = client.generation
+    assert not client.update(save=False, api=EmptyAPI)
+    assert client.generation == generation
+
+
+def test_client_queries(store_path):
+    """Queries match the query functions and return independent copies."""
+    client = WetterClient(store_path)
+    db = from_store(store_path)
+    pd.testing.assert_frame_equal(client.last_month(DATE), queries.last_month(db.df, DATE, rollup=db.rollup))
+    pd.testing.assert_frame_equal(client.latest(DATE), queries.latest_datapoint(db.df, DATE))
+    window = client.last_week(DATE)
+    window["temperature"] = 0.0
+    assert not (client.last_week(DATE)["temperature"] == 0.0).all()
+    assert client.location == (db.lat, db.lon)
+    start = DATE - td(hours=23)
+    day = db.df.temperature[start:DATE]
+    assert client.rolling("24h", start=DATE, end=DATE).temperature_mean[0] == pytest.approx(day.mean())
+    expected = db.df.temperature[:DATE].iloc[-1] * 9 / 5 + 32
+    assert client.evaluate("temperature_f", end=DATE).iloc[-1] == pytest.approx(expected)
+
+
+def test_client_refresh(store_path):
+    """Changes on disk are only visible after an explicit refresh."""
+    client = WetterClient(store_path)
+    assert client.refresh()
+    assert not client.refresh()
+    db = from_store(store_path)
+    db.generation += 1
+    to_store(db, path=store_path)
+    assert client.generation == db.generation - 1
+    assert client.refresh()
+    assert client.generation == db.generation
+
+
+def test_client_concurrent_refresh(store_path):
+    """Queries from many threads interleaved with refreshes see a consistent datastore."""
+    client = WetterClient(store_path)
+    expected = queries.size(client.last_month(DATE))
+
+    def work(i):
+        if i % 10 == 0:
+            client._entry.signature = None
+            return client.refresh()
+        return queries.size(client.last_month(DATE)) == expected
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert all(pool.map(work, range(100)))
+
+
+def test_rwlock_writer_is_exclusive():
+    """A writer waits for all readers and blocks new readers."""
+    lock = RWLock()
+    events = []
+
+    def writer():
+        with lock.write():
+            events.append("write")
+
+    with lock.read():
+        thread = threading.Thread(target=writer)
+        thread.start()
+        thread.join(timeout=0.1)
+        events.append("read")
+    thread.join()
+    assert events == ["read", "write"]
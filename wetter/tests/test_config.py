@@ -1,10 +1,16 @@
+import datetime
+import io
 import json
+import os
+import shutil
 
 import pandas as pd
 import pytest
 
+from wetter.backend.extern import OpenMeteoArchiveMeasurements
+from wetter.backend.local import WetterDB
 from wetter.config import config
-from wetter.config.parser import DecodeDateTime, WetterEncoder
+from wetter.config.parser import DecodeDateTime, WetterEncoder, dump_split
 
 
 @pytest.fixture
@@ -37,3 +43,137 @@ def test_load_save_config_with_checks():
 def test_load_changed_config_with_checks():
     db = config.Configuration(config_path="tests/testconfig_changed.toml", store_path="tests/testdata.json").get_store()
     assert db.df.size > 0
+
+
+def test_store_is_loaded_lazily():
+    conf = config.Configuration(config_path="tests/testconfig.toml", store_path="tests/testdata.json")
+    assert conf._store is None
+    assert conf.get_store().df.index.size > 0
+    assert conf._store is not None
+
+
+def test_changed_location_is_detected_without_update():
+    conf = config.Configuration(config_path="tests/testconfig_changed.toml", store_path="tests/testdata.json")
+    size = conf.get_store().df.index.size
+    assert conf.location_changed()
+    assert conf.get_store().df.index.size == size
+
+
+def test_rollup_is_serialized(conf):
+    db = conf.get_store()
+    db.retention = 0
+    db.compact(now=datetime.datetime(year=2023, month=7, day=1, tzinfo=datetime.timezone.utc))
+    data = json.loads(json.dumps(db.serialize(), cls=WetterEncoder), object_hook=DecodeDateTime)
+    loaded = WetterDB(**data)
+    assert loaded.rollup.equals(db.rollup)
+    assert loaded.stats == db.stats
+
+
+def test_forecast_is_serialized(conf):
+    db = conf.get_store()
+    db.forecast = db.df.iloc[-3:]
+    db.forecast_version = 2
+    db.forecast_issued = db.df.index[-4]
+    data = json.loads(json.dumps(db.serialize(), cls=WetterEncoder), object_hook=DecodeDateTime)
+    loaded = WetterDB(**data)
+    assert loaded.forecast.equals(db.forecast)
+    assert (loaded.forecast_version, loaded.forecast_issued) == (2, db.df.index[-4])
+
+
+def test_forecast_is_not_cached_across_versions(tmp_path):
+    store_path = str(tmp_path / "wetter.json")
+    shutil.copy("tests/testdata.json", store_path)
+    options = dict(store_path=store_path, cache_path=str(tmp_path / "queries.pickle"), self_check=False)
+    conf = config.Configuration(**options)
+    db = conf.get_store()
+    db.forecast, db.forecast_version, db.forecast_issued = db.df.iloc[-3:], 1, db.df.index[-4]
+    config.to_store(db, path=store_path)
+    conf = config.Configuration(**options)
+    assert conf.forecast()[1] == 1
+    conf.cache.save()
+    # Update with the same measurements but a new forecast (generation unchanged)
+    db = conf.get_store()
+    db.forecast, db.forecast_version = db.df.iloc[-3:] + 100, 2
+    config.to_store(db, path=store_path)
+    conf = config.Configuration(**options)
+    forecast, version, _ = conf.forecast()
+    assert version == 2 and forecast.equals(db.forecast)
+
+
+def test_sidecars_are_rebuilt_for_another_location(tmp_path):
+    store_path = str(tmp_path / "wetter.json")
+    shutil.copy("tests/testdata.json", store_path)
+    options = dict(store_path=store_path, cache_path=str(tmp_path / "queries.pickle"), self_check=False)
+    conf = config.Configuration(**options)
+    db = conf.get_store()
+    assert conf.climatology().location == (db.lat, db.lon)
+    maximum = conf.cube().aggregate()["temperature_max"][0]
+    # Datastore of another location with the same generation (e.g. reused on relocation)
+    db.lat += 5
+    db.df["temperature"] += 10
+    config.to_store(db, path=store_path)
+    index = config.Configuration(**options).climatology()
+    date = db.df.index[100]
+    assert index.location == (db.lat, db.lon)
+    assert index.lookup("temperature", date, 0)[0] == db.df.loc[date, "temperature"]
+    assert config.Configuration(**options).cube().aggregate()["temperature_max"][0] == maximum + 10
+
+
+def test_relocation_reuses_nearby_store(tmp_path, monkeypatch):
+    store_path = str(tmp_path / "wetter.json")
+    shutil.copy("tests/testdata.json", store_path)
+    conf = config.Configuration(config_path="tests/testconfig_changed.toml", store_path=store_path, self_check=False)
+    nearby = config.from_store("tests/testdata.json")
+    nearby.lat, nearby.lon = 52.3, 8.5
+    index = conf.locations()
+    index.add(nearby.lat, nearby.lon, index.path(nearby.lat, nearby.lon))
+    config.to_store(nearby, path=index.path(nearby.lat, nearby.lon))
+    index.save()
+
+    calls = []
+    monkeypatch.setattr(WetterDB, "update", lambda self, **kwargs: calls.append(kwargs))
+    conf._location_changed(lat=52, lon=8.41)
+
+    assert (conf.get_store().lat, conf.get_store().lon) == (52.3, 8.5)
+    assert not conf.location_changed()
+    assert calls[0]["start"] == nearby.df.index.max()
+    assert calls[0]["api"] is OpenMeteoArchiveMeasurements
+    assert calls[-1] == {}
+    archived = conf.locations().nearest(49, 8.41, tolerance=0)
+    assert archived is not None and config.from_store(archived[2]).df.equals(nearby.df)
+
+
+def test_relocate_fetches_configured_location(tmp_path, monkeypatch):
+    conf = config.Configuration(
+        config_path="tests/testconfig_changed.toml",
+        store_path="tests/testdata.json",
+        cache_path=str(tmp_path / "queries.pickle"),
+        self_check=False,
+    )
+    calls = []
+    monkeypatch.setattr(config.Configuration, "_location_changed", lambda self, **kwargs: calls.append(kwargs))
+    assert conf.location_changed()
+    conf.relocate()
+    assert calls == [dict(lat=52, lon=8.41)]
+
+
+def test_unchanged_store_is_not_written(tmp_path):
+    path = str(tmp_path / "wetter.json")
+    shutil.copy("tests/testdata.json", path)
+    db = config.from_store(path)
+    mtime = os.stat(path).st_mtime_ns
+    assert not config.to_store(db, path=path)
+    assert os.stat(path).st_mtime_ns == mtime
+    assert config.to_store(db, path=str(tmp_path / "copy.json"))
+    db.lat += 1
+    assert config.to_store(db, path=path)
+    assert not config.to_store(db, path=path)
+    assert config.from_store(path).lat == db.lat
+
+
+def test_streamed_store_equals_json_dump(conf):
+    db = conf.get_store()
+    db.df.iloc[3, 0] = float("nan")
+    stream = io.StringIO()
+    dump_split(db.df, stream, chunksize=1000)
+    assert stream.getvalue() == json.dumps(db.df.T.to_dict(orient="split"), cls=WetterEncoder)
@@ -0,0 +1,74 @@
+"""Test file for the update scheduler of the daemon mode."""
+import pytest
+
+from wetter import daemon
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_host_jitter_is_stable():
+    assert daemon.host_jitter(300, host="a") == daemon.host_jitter(300, host="a")
+    assert daemon.host_jitter(300, host="a") != daemon.host_jitter(300, host="b")
+    assert all(0 <= daemon.host_jitter(300, host=str(i)) < 300 for i in range(100))
+
+
+def test_schedule_with_jitter():
+    clock = FakeClock(now=10 * 3600 + 100)
+    runs = []
+    scheduler = daemon.Scheduler(lambda: runs.append(clock()) or True, jitter=300, host="a", clock=clock)
+    scheduler.run(last_run=clock() - 60, iterations=3, sleep=clock.sleep)
+    offset = 305 + daemon.host_jitter(300, host="a")
+    assert runs == pytest.approx([10 * 3600 + offset, 11 * 3600 + offset, 12 * 3600 + offset])
+    assert max(clock.slept) <= daemon.Scheduler.tick
+
+
+def test_backoff_on_failure():
+    clock = FakeClock(now=0)
+    results = iter([False, False, False, True])
+    runs = []
+
+    def job():
+        runs.append(clock())
+        return next(results)
+
+    scheduler = daemon.Scheduler(job, offset=0, jitter=0, backoff=60, clock=clock)
+    scheduler.run(last_run=None, iterations=4, sleep=clock.sleep)
+    delays = [second - first for first, second in zip(runs, runs[1:])]
+    assert delays == pytest.approx([60, 120, 240], rel=0.11)
+    assert scheduler.failures == 0
+
+
+def test_missed_runs_are_coalesced():
+    clock = FakeClock(now=0)
+    runs = []
+
+    def job():
+        runs.append(clock())
+        if len(runs) == 1:
+            # Downtime (e.g. suspend) of several intervals during the first run
+            clock.now += 5 * 3600
+        return True
+
+    scheduler = daemon.Scheduler(job, offset=0, jitter=0, clock=clock)
+    scheduler.run(last_run=-10 * 3600, iterations=2, sleep=clock.sleep)
+    assert runs == [0, 6 * 3600]
+
+
+def test_exception_counts_as_failure():
+    def job():
+        raise ConnectionError("offline")
+
+    scheduler = daemon.Scheduler(job, jitter=0, clock=lambda: 0)
+    assert 50 < scheduler.run_once() < 70
+    assert scheduler.failures == 1
@@ -0,0 +1,50 @@
+"""Test file for reports over a fleet of datastores."""
+import math
+import shutil
+from datetime import datetime as dt
+from datetime import timezone as tz
+
+import pytest
+
+from wetter import fleet
+from wetter.backend import queries
+from wetter.config.parser import from_store
+
+DATE = dt(year=2022, month=7, day=15, hour=12, tzinfo=tz.utc)
+
+
+@pytest.fixture
+def stores(tmp_path):
+    paths = []
+    for name in ("north", "south"):
+        path = tmp_path / f"{name}.json"
+        shutil.copy("./tests/testdata.json", path)
+        paths.append(str(path))
+    yield paths
+
+
+def test_fleet_matches_single_store(stores):
+    """Each streamed result matches the query executed directly on the store."""
+    results = list(fleet.run(stores, "last-month", DATE, workers=2))
+    assert sorted(result.path for result in results) == sorted(stores)
+    db = from_store(stores[0])
+    window = queries.last_month(db.df, DATE)
+    for result in results:
+        assert result.count == queries.size(window)
+        assert math.isclose(result.value, queries.average(window)["temperature"])
+
+
+def test_fleet_reduce(stores):
+    """Reduce keeps the extreme site or weights the mean by measurements."""
+    results = [
+        fleet.SiteResult(path="a", value=10.0, count=1, lat=0.0, lon=0.0),
+        fleet.SiteResult(path="b", value=20.0, count=3, lat=0.0, lon=0.0),
+        fleet.SiteResult(path="c", value=float("nan"), count=0, lat=0.0, lon=0.0),
+    ]
+    assert fleet.reduce(results, how="max").path == "b"
+    assert fleet.reduce(results, how="min").path == "a"
+    mean = fleet.reduce(results, how="mean")
+    assert mean.path is None and mean.count == 4 and mean.value == 17.5
+    assert fleet.reduce(results[2:]) is None
+    with pytest.raises(AssertionError):
+        fleet.reduce(results, how="median")
@@ -0,0 +1,63 @@
+"""Test file for the export of operational metrics."""
+import urllib.request
+
+import pytest
+
+from wetter import metrics
+
+
+@pytest.fixture
+def registry():
+    registry = metrics.Registry()
+    yield registry
+
+
+def test_counter_and_gauge_render(registry):
+    counter = registry.register(metrics.Counter("requests_total", "Requests.", labels=("api", "status")))
+    gauge = registry.register(metrics.Gauge("size_bytes", "Size."))
+    counter.inc(api="Open", status=200)
+    counter.inc(2, api="Open", status=200)
+    counter.inc(api='Quo"te', status=500)
+    gauge.set(1024)
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{api="Open",status="200"} 3' in text
+    assert 'requests_total{api="Quo\\"te",status="500"} 1' in text
+    assert "size_bytes 1024" in text
+    with pytest.raises(AssertionError):
+        counter.inc(-1, api="Open", status=200)
+    with pytest.raises(AssertionError):
+        counter.inc(api="Open")
+    with pytest.raises(AssertionError):
+        registry.register(metrics.Gauge("size_bytes", "Duplicate."))
+
+
+def test_histogram_is_cumulative(registry):
+    histogram = registry.register(metrics.Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0)))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+    text = registry.render()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 3' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "latency_seconds_sum 6.05" in text
+    assert "latency_seconds_count 4" in text
+    with histogram.time():
+        pass
+    assert histogram.count() == 5
+
+
+def test_textfile_and_endpoint(registry, tmp_path):
+    registry.register(metrics.Counter("runs_total", "Runs.")).inc()
+    path = tmp_path / "textfile" / "wetter.prom"
+    metrics.write_textfile(str(path), registry=registry)
+    assert path.read_text() == registry.render()
+    server = metrics.serve(0, registry=registry)
+    assert server.server_address[0] == "127.0.0.1"
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as resp:
+            assert resp.headers["Content-Type"] == metrics.CONTENT_TYPE
+            assert resp.read().decode() == registry.render()
+    finally:
+        server.shutdown()
@@ -5,14 +5,17 @@ Additionally it needs to be tested if the arguments and return values
 for the functions are the same. Details about the queries can be found
 in the appropiate documentation of the [wetter library](../wetter/queries.py).
 """
+import time
 from datetime import datetime as dt
 from datetime import timedelta as td
 from datetime import timezone as tz
 
+import numpy as np
+import pandas as pd
 import pytest
 
 from wetter import tools
-from wetter.backend import queries
+from wetter.backend import derived, queries, retention, rolling, stats
 from wetter.config import config
 
 
@@ -115,3 +118,225 @@ def test_last_week(db):
     selection = queries.last_week(db.df, date)
     assert selection.index.size == 7 * 24
     assert selection.index.min().day == 25
+
+
+def test_window_is_rounded_to_full_hours():
+    date = dt(year=2023, month=1, day=1, hour=12, minute=30, tzinfo=tz(td(hours=2)))
+    start, end = queries.window(queries.last_week, date)
+    assert start == dt(year=2022, month=12, day=25, hour=11, tzinfo=tz.utc)
+    assert end == dt(year=2023, month=1, day=1, hour=10, tzinfo=tz.utc)
+    _, end = queries.window(queries.latest_datapoint, date.replace(minute=0))
+    assert end == dt(year=2023, month=1, day=1, hour=9, tzinfo=tz.utc)
+
+
+def test_average_is_preserved_by_compaction(db):
+    date = dt(year=2023, month=3, day=1, tzinfo=tz.utc)
+    expected = queries.average(queries.last_year(db.df, date))
+    db.retention = 1
+    generation = db.generation
+    compacted = db.compact(now=dt(year=2023, month=7, day=1, tzinfo=tz.utc))
+    assert compacted == 181 * 24
+    assert db.generation == generation + 1
+    assert db.compact(now=dt(year=2023, month=7, day=1, tzinfo=tz.utc)) == 0
+    assert db.generation == generation + 1
+    selection = queries.last_year(db.df, date, rollup=db.rollup)
+    assert queries.size(selection) == 365 * 24
+    assert queries.average(selection)["temperature"] == pytest.approx(expected["temperature"])
+    assert queries.average(selection)["wind"] == pytest.approx(expected["wind"])
+
+
+def test_compaction_keeps_statistics(db):
+    expected = db.overall_stats()["temperature"]
+    db.retention = 0
+    db.compact(now=dt(year=2023, month=7, day=1, tzinfo=tz.utc))
+    assert db.df.index.size == 1
+    db._refresh_stats(db.rollup.index)
+    result = db.overall_stats()["temperature"]
+    assert result.count == expected.count
+    assert result.variance == pytest.approx(expected.variance)
+    assert (result.min, result.max) == (expected.min, expected.max)
+
+
+def test_query_fuses_windows_and_variables(db):
+    start = dt(year=2022, month=1, day=1, tzinfo=tz.utc)
+    end = dt(year=2022, month=2, day=1, tzinfo=tz.utc) - td(seconds=1)
+    query = queries.Query(db.df).window(start=start).variables("temperature", "wind").window(end=end)
+    result = query.variables("temperature").collect()
+    expected = db.df[db.df.index.month == 1][["temperature"]]
+    assert result.equals(expected)
+    assert "binary search" in query.explain()
+
+
+def test_query_resample_and_aggregate(db):
+    start = dt(year=2022, month=1, day=1, tzinfo=tz.utc)
+    query = queries.Query(db.df).window(start, start + td(days=7) - td(seconds=1)).resample("D").agg("max")
+    result = query.collect()
+    assert result.index.size == 7
+    assert result.temperature[0] == db.df.temperature[:24].max()
+    overall = queries.Query(db.df).window(start, start + td(days=1)).agg("mean").collect()
+    assert overall.index[0] == start
+    assert overall.wind[0] == pytest.approx(db.df.wind[:25].mean())
+
+
+def test_query_is_lazy(db):
+    query = queries.Query(db.df).agg("mean")
+    with pytest.raises(AssertionError):
+        query.agg("max")
+    with pytest.raises(AssertionError):
+        queries.Query(db.df).resample("D").collect()
+
+
+def test_compare_all_matches_single_windows(db):
+    date = dt(year=2023, month=1, day=1, hour=5, tzinfo=tz.utc)
+    result = queries.compare_all(db.df, date)
+    assert list(result.index) == ["week", "month", "year"]
+    for name, func in (("week", queries.last_week), ("month", queries.last_month), ("year", queries.last_year)):
+        window = func(db.df, date)
+        assert result.loc[name, "count"] == window.index.size
+        assert result.loc[name, "temperature_mean"] == pytest.approx(window.temperature.mean())
+        assert result.loc[name, "wind_max"] == window.wind.max()
+        assert result.loc[name, "temperature_min"] == window.temperature.min()
+
+
+def test_compare_all_considers_rollup(db):
+    date = dt(year=2023, month=1, day=1, hour=5, tzinfo=tz.utc)
+    expected = queries.compare_all(db.df, date)
+    db.retention = 0
+    db.compact(now=dt(year=2022, month=12, day=28, tzinfo=tz.utc))
+    result = queries.compare_all(db.df, date, rollup=db.rollup)
+    assert result.loc["year", "count"] == expected.loc["year", "count"]
+    assert result.loc["year", "temperature_mean"] == pytest.approx(expected.loc["year", "temperature_mean"])
+    assert result.loc["month", "wind_max"] == expected.loc["month", "wind_max"]
+
+
+def test_percentiles_match_exact_quantiles(db):
+    start = dt(year=2022, month=2, day=10, hour=5, tzinfo=tz.utc)
+    end = dt(year=2022, month=11, day=3, hour=7, tzinfo=tz.utc)
+    table = queries.percentiles(db.df, start, end, db.sketches)
+    window = db.df[(db.df.index >= start) & (db.df.index <= end)]
+    for var in db.df.columns:
+        expected = np.quantile(window[var].dropna(), [0.1, 0.5, 0.9], method="inverted_cdf")
+        assert table.loc[var, ["p10", "p50", "p90"]].tolist() == pytest.approx(expected)
+        assert table.loc[var, "count"] == window[var].count()
+    # Window within a single month only reads the measurements
+    table = queries.percentiles(db.df, start, start + td(days=3), db.sketches)
+    assert table.loc["temperature", "count"] == 3 * 24 + 1
+
+
+def test_sketches_survive_compaction(db):
+    before = queries.percentiles(db.df, db.df.index.min(), db.df.index.max(), db.sketches)
+    db.retention = 0
+    db.compact(now=dt(year=2022, month=7, day=1, tzinfo=tz.utc))
+    db._refresh_stats(db.rollup.index)
+    after = queries.percentiles(db.df, db.df.index.min() - td(days=365), db.df.index.max(), db.sketches)
+    assert after.equals(before)
+
+
+def test_query_fill_interpolates_short_gaps(db):
+    start = dt(year=2022, month=3, day=1, tzinfo=tz.utc)
+    end = start + td(days=2)
+    # Gaps of 1, 3 and 5 hours, the first one at the start of the window
+    missing = [start + td(hours=h) for h in [0, 10, 11, 12, 30, 31, 32, 33, 34]]
+    df = db.df.drop(missing)
+    result = queries.Query(df).window(start, end).fill(3, flag=True).collect()
+    hourly = db.df[(db.df.index >= start) & (db.df.index <= end)]
+    expected = df.reindex(db.df.index).interpolate(limit_area="inside").reindex(hourly.index)
+    assert result.index.equals(hourly.index.drop(missing[4:]))
+    assert result.filled.sum() == 4 and result.filled[start]
+    assert np.allclose(result[["temperature", "wind"]], expected.reindex(result.index))
+    assert "interpolate gaps" in queries.Query(df).fill().explain()
+
+
+def test_derived_expression_matches_pandas(db):
+    window = queries.last_month(db.df, dt(year=2022, month=7, day=15, tzinfo=tz.utc))
+    values = derived.evaluate(window, "wind_chill - temperature")
+    speed = window.wind**0.16
+    expected = 13.12 + 0.6215 * window.temperature - 11.37 * speed + 0.3965 * window.temperature * speed
+    assert np.allclose(values, expected - window.temperature)
+    definitions = derived.definitions({"gust": "wind_ms * 1.5", "gust_kmh": "gust * 3.6"})
+    assert np.allclose(derived.evaluate(window, "gust_kmh", derived=definitions), window.wind * 1.5)
+    with pytest.raises(AssertionError):
+        derived.evaluate(window, "humidity * 2")
+    with pytest.raises(AssertionError):
+        derived.evaluate(window, "loop", derived={"loop": "loop + 1"})
+
+
+def test_rolling_matches_pandas(db):
+    df = db.df.drop(db.df.index[100:110])
+    result = rolling.rolling(df, window="7d", statistics=("mean", "min", "max", "std"))
+    expected = df.rolling("7d", min_periods=84)
+    assert result.index.equals(df.index)
+    assert np.allclose(result.temperature_mean, expected.temperature.mean(), equal_nan=True)
+    assert np.allclose(result.wind_max, expected.wind.max(), equal_nan=True)
+    assert np.allclose(result.wind_std, expected.wind.std(ddof=0), equal_nan=True)
+
+
+def test_rolling_zscores_flag_anomalies(db):
+    df = db.df.copy()
+    df.iloc[5000, 0] = df.temperature.iloc[4280:5000].mean() + 10 * df.temperature.iloc[4280:5000].std(ddof=0)
+    scores = rolling.zscores(df, window="30d")
+    assert scores.temperature.iloc[5000] == pytest.approx(10)
+    assert np.isnan(scores.temperature.iloc[0])
+    assert df.index[5000] in rolling.anomalies(df, window="30d", threshold=9).index
+
+
+@pytest.mark.long
+def test_rolling_decade_is_faster_than_pandas():
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2010-01-01", periods=10 * 8760, freq="H", tz="UTC", name="time")
+    df = pd.DataFrame({"temperature": rng.normal(10, 8, index.size), "wind": rng.gamma(2, 5, index.size)}, index=index)
+
+    def measure(func):
+        start = time.perf_counter()
+        for _ in range(5):
+            func()
+        return time.perf_counter() - start
+
+    def baseline():
+        window = df.rolling(rolling.WINDOWS["30d"], min_periods=360)
+        return window.mean(), window.min(), window.max()
+
+    result = rolling.rolling(df, window="30d")
+    assert np.allclose(result.temperature_min, baseline()[1].temperature, equal_nan=True)
+    assert measure(lambda: rolling.rolling(df, window="30d")) < measure(baseline)
+
+
+def test_reingest_of_compacted_measurements_is_ignored(db):
+    db.retention = 0
+    db.compact(now=dt(year=2022, month=7, day=1, tzinfo=tz.utc))
+    db.retention = None
+    compacted = int(db.rollup["count"].sum())
+    total = db.overall_stats()["temperature"].count
+    old = config.from_store("./tests/testdata.json").df
+    db._integrate(old[old.index < dt(year=2022, month=7, day=1, tzinfo=tz.utc)], db.lat, db.lon)
+    assert int(db.rollup["count"].sum()) == compacted
+    assert db.overall_stats()["temperature"].count == total
+    assert db.df.index.min() == dt(year=2022, month=7, day=1, tzinfo=tz.utc)
+
+
+def test_rollup_ignores_missing_measurements():
+    index = pd.date_range("2000-01-01", periods=72, freq="H", tz="UTC", name="time")
+    temperature = np.concatenate([np.full(24, 10.0), np.full(12, 20.0), np.full(12, np.nan), np.full(24, np.nan)])
+    df = pd.DataFrame({"temperature": temperature, "wind": 5.0}, index=index)
+    expected = np.nanmean(temperature)
+    rollup = retention.merge(retention.daily(df.iloc[:30]), retention.daily(df.iloc[30:]))
+    assert rollup["temperature_count"].tolist() == [24, 12, 0]
+    assert rollup[queries.COUNT].tolist() == [24, 24, 24]
+    date = dt(year=2000, month=1, day=4, tzinfo=tz.utc)
+    # Fully compacted and partially compacted (the NaN hours are raw measurements)
+    for raw, days in ((df.iloc[:0], rollup), (df.iloc[36:], retention.daily(df.iloc[:36]))):
+        selection = queries.last_week(raw, date, rollup=days)
+        assert queries.average(selection)["temperature"] == pytest.approx(expected)
+        assert queries.size(selection) == 72
+        report = queries.compare_all(raw, date, rollup=days)
+        assert report.loc["week", "temperature_mean"] == pytest.approx(expected)
+    result = stats.RunningStats.from_aggregates(
+        rollup["temperature_count"],
+        rollup["temperature"],
+        rollup["temperature_m2"],
+        rollup["temperature_min"],
+        rollup["temperature_max"],
+    )
+    assert result.count == 36 and result.mean == pytest.approx(expected)
+    assert result.variance == pytest.approx(np.nanvar(temperature))
+    assert (result.min, result.max) == (10.0, 20.0)
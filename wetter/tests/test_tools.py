@@ -0,0 +1,61 @@
+"""Test file for the helper tools."""
+import logging
+
+from wetter import tools
+
+
+def test_lazy_queue_handler(tmp_path):
+    path = tmp_path / "logs" / "wetter.log"
+    created = []
+
+    def factory():
+        path.parent.mkdir()
+        created.append(path)
+        return logging.FileHandler(path)
+
+    handler = tools.LazyQueueHandler(factory)
+    logger = logging.getLogger("wetter.test.lazy")
+    logger.propagate = False
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        logger.debug("Not emitted")
+        assert created == [] and not path.parent.exists()
+        logger.info("First line")
+        logger.info("Second line")
+        assert created == [path]
+        handler.stop()
+        assert path.read_text().splitlines() == ["First line", "Second line"]
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def test_logio_skips_formatting_if_disabled():
+    class Expensive:
+        formatted = 0
+
+        def __repr__(self):
+            Expensive.formatted += 1
+            return "Expensive()"
+
+    logger = logging.getLogger("wetter.test.logio")
+    logger.setLevel(logging.INFO)
+
+    @tools.logio(logger)
+    def identity(value):
+        return value
+
+    value = Expensive()
+    assert identity(value) is value
+    assert Expensive.formatted == 0
+    logger.setLevel(logging.DEBUG)
+    identity(value)
+    assert Expensive.formatted == 2
+
+
+def test_local_zone(monkeypatch):
+    monkeypatch.setenv("TZ", ":Europe/Berlin")
+    assert tools.local_zone() == "Europe/Berlin"
+    monkeypatch.setenv("TZ", "no zone")
+    assert tools.local_zone() == "UTC" or tools.local_zone().startswith("Etc/GMT")
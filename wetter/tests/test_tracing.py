@@ -0,0 +1,45 @@
+"""Test file for the tracing of the update pipeline."""
+import json
+
+import pytest
+
+from wetter import tracing
+
+
+@pytest.fixture
+def trace(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    tracing.configure(str(path))
+    yield path
+    tracing.configure(None)
+
+
+def read(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_disabled_is_noop():
+    assert not tracing.enabled()
+    with tracing.span("stage", rows=1) as sp:
+        sp.set(bytes=2)
+    assert sp is tracing.NOOP
+
+
+def test_nested_spans(trace):
+    with tracing.span("outer", kind="test") as outer:
+        with tracing.span("inner") as inner:
+            inner.set(rows=3)
+        with pytest.raises(ValueError):
+            with tracing.span("failing"):
+                raise ValueError("boom")
+        outer.set(done=True)
+    records = read(trace)
+    assert [record["name"] for record in records] == ["inner", "failing", "outer"]
+    inner, failing, outer = records
+    assert outer["parent"] is None
+    assert inner["parent"] == outer["span"] and failing["parent"] == outer["span"]
+    assert len({record["trace"] for record in records}) == 1
+    assert inner["attributes"] == {"rows": 3}
+    assert outer["attributes"] == {"kind": "test", "done": True}
+    assert failing["error"] == "ValueError: boom"
+    assert outer["duration_ms"] >= inner["duration_ms"] >= 0
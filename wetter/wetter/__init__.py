@@ -22,6 +22,21 @@ The second big submodule is [backend](./backend).
 It handles the connection to external services to download the data,
 the connection to the local storage and the queries executed on it.
 
+The [fleet.py](./fleet.py) module runs a query on many datastores (e.g. one per site)
+in parallel processes and reduces the results to a single answer.
+
+The [client.py](./client.py) module is the library interface for other Python programs.
+Its `WetterClient` shares loaded datastores between threads and clients of the same process.
+
+The [metrics.py](./metrics.py) module collects operational metrics (API latency and response size,
+ingested rows, store load/save, query latency) and exports them in the Prometheus text format.
+
+The [daemon.py](./daemon.py) module schedules periodic updates in a long running
+process (`wetter daemon`) with per-host jitter, backoff and coalescing of missed runs.
+
+The [tracing.py](./tracing.py) module writes spans of the update pipeline stages
+as JSON lines (enabled by `WETTER_TRACE`).
+
 The [tools.py](./tools.py) module includes helper tools for different aspects
 of the package e.g. logging. Finally, the [app.py](./app.py)
 module handles the interface to the user.
@@ -5,13 +5,16 @@ The user should be able to handle all necessary communication with
 the backend using this interface incl. updating of the database.
 """
 import argparse
+import json
 import logging
+import signal
 from datetime import datetime as dt
 from datetime import timedelta
 
-from wetter import __version__
+from wetter import __version__, daemon, fleet, metrics, tracing
+from wetter.backend import derived
 from wetter.backend import queries as qu
-from wetter.backend.extern import OpenMeteoArchiveMeasurements
+from wetter.backend import rolling, stats
 from wetter.config import config
 from wetter.config.defaults import WETTER_LOG_VARIABLE
 from wetter.tools import get_env_logging, logio
@@ -21,53 +24,170 @@ from wetter.tools import setup_logging, utcnow
 setup_logging(get_env_logging(WETTER_LOG_VARIABLE))
 log = logging.getLogger(__name__)
 
+# Subcommands reading or writing the datastore of the configured location
+STORE_COMMANDS = ("update", "compare", "forecast", "check", "daemon", "query", "stats", "latest")
+
 
 def main():
     """Parse user query and and pretty print answer from the database."""
     log.info("Starting main application")
     args = parse_args()
     current_config = config.Configuration()
-    db = current_config.get_store()
+
+    if args.cmd == "configure":
+        log.info("Configuration information requested")
+        if args.systemd:
+            current_config._print_systemd_service()
+        elif args.systemdtimer:
+            current_config._print_systemd_timer()
+        elif args.config:
+            print("Configuration path:", current_config.config_path)
+        return
+
     now = local_now()
-    latest = qu.latest_datapoint(db.df, now)
+    if args.cmd in STORE_COMMANDS and current_config.location_changed():
+        print("The configured location changed. Fetch its measurements with `wetter relocate`.")
 
     if args.cmd == "update":
-        if args.historical:
-            now = utcnow()
-            start = dt(year=now.year - 1, month=1, day=1, tzinfo=now.tzinfo)
-            end = now - timedelta(days=30)
-            db.update(start=start, end=end, api=OpenMeteoArchiveMeasurements)
-        log.info("Update requested")
-        db.update()
-        config.to_store(db)
+        with tracing.span("wetter update", historical=args.historical):
+            db = current_config.get_store()
+            if args.historical:
+                now = utcnow()
+                since = now.year - 1 if args.since is None else args.since
+                start = dt(year=since, month=1, day=1, tzinfo=now.tzinfo)
+                end = now - timedelta(days=30)
+                db.ingest(start=start, end=end, days=args.chunk_days, on_chunk=print_progress)
+            log.info("Update requested")
+            db.update()
+            config.to_store(db, path=current_config.store_path)
+        # Only updates write the textfile, other commands would replace the samples of the last update
+        textfile = args.metrics_textfile or current_config.config.get("metrics", {}).get("textfile")
+        if textfile is not None:
+            metrics.write_textfile(textfile)
     elif args.cmd == "compare":
         log.info("Comparison requested")
+        latest = current_config.query(qu.latest_datapoint, now)
         if args.week:
-            average = qu.last_week(db.df, now)
+            average = current_config.query(qu.last_week, now)
             pretty_print_comparison(latest=latest, average=average, mode="week")
         if args.month:
-            average = qu.last_month(db.df, now)
+            average = current_config.query(qu.last_month, now)
             pretty_print_comparison(latest=latest, average=average, mode="month")
         if args.year:
-            average = qu.last_year(db.df, now)
+            average = current_config.query(qu.last_year, now)
             pretty_print_comparison(latest=latest, average=average, mode="year")
         if args.detailed:
-            average = qu.specific_month(df=db.df, date=now, month=args.detailed)
-            pretty_print_detailed_comparison(average)
+            average = current_config.query(qu.specific_month, now, month=args.detailed)
+            pretty_print_detailed_comparison(average, cube=current_config.cube())
+        if args.normal:
+            pretty_print_normal_comparison(latest=latest, climatology=current_config.climatology())
+        if args.percentiles:
+            db = current_config.store
+            start = db.df.index.min() if db.rollup.index.size == 0 else db.rollup.index.min()
+            if args.years is not None:
+                start = max(start, now - timedelta(days=365 * args.years))
+            table = qu.percentiles(db.df, start, now, db.sketches)
+            pretty_print_percentiles(latest=latest, table=table, start=start)
+        if args.rolling:
+            db = current_config.store
+            # The window ending at the latest measurement and the one before it (z-score)
+            since = db.df.index.max() - timedelta(hours=rolling.WINDOWS[args.rolling])
+            recent = db.df.loc[since:]
+            pretty_print_rolling(
+                latest=latest,
+                table=rolling.rolling(recent, window=args.rolling).iloc[-1],
+                scores=rolling.zscores(recent, window=args.rolling).iloc[-1],
+                window=args.rolling,
+            )
+        if args.all:
+            report = current_config.query(qu.compare_all, now)
+            if args.json:
+                print_json_report(latest=latest, report=report)
+            else:
+                pretty_print_report(latest=latest, report=report)
+    elif args.cmd == "forecast":
+        log.info("Forecast requested")
+        forecast, version, issued = current_config.forecast()
+        pretty_print_forecast(qu.next_hours(forecast, now, hours=args.hours), issued=issued, version=version)
+    elif args.cmd == "check":
+        log.info("Integrity check requested")
+        print(current_config.store.verify(full=True))
+    elif args.cmd == "relocate":
+        log.info("Relocation requested")
+        if current_config.location_changed():
+            current_config.relocate()
+        else:
+            print("The configured location did not change.")
+    elif args.cmd == "daemon":
+        log.info("Daemon mode requested")
+        run_daemon(current_config, args)
+    elif args.cmd == "fleet":
+        log.info("Fleet report requested")
+        results = []
+        for result in fleet.run(args.stores, query=args.query, date=now, variable=args.variable, workers=args.workers):
+            print(f"{result.path}: {result.value:.1f} (#{result.count} measurements)")
+            results.append(result)
+        pretty_print_fleet(fleet.reduce(results, how=args.reduce), args)
+    elif args.cmd == "query":
+        log.info("Expression requested")
+        window = current_config.query(fleet.QUERIES[args.window], now)
+        values = derived.evaluate(window, args.expr, derived=current_config.derived())
+        pretty_print_expression(window, values, args)
+    elif args.cmd == "stats":
+        log.info("Statistics requested")
+        buckets = current_config.statistics()
+        if args.monthly:
+            pretty_print_monthly_statistics(buckets)
+        elif args.diurnal:
+            pretty_print_diurnal_profile(current_config.cube())
+        elif args.heatmap:
+            pretty_print_heatmap(current_config.cube())
+        else:
+            pretty_print_statistics(buckets)
     elif args.cmd == "latest":
         log.info("Latest measurement requested")
+        latest = current_config.query(qu.latest_datapoint, now)
         pretty_print_latest(latest)
-    elif args.cmd == "configure":
-        log.info("Configuration information requested")
-        if args.systemd:
-            current_config._print_systemd_service()
-        elif args.systemdtimer:
-            current_config._print_systemd_timer()
-        elif args.config:
-            print("Configuration path:", current_config.config_path)
     else:
         log.err(f"KeyError: Can not understand the provided subcommand {args.cmd}", exc_info=True)
 
+    current_config.cache.save()
+
+
+def print_progress(start, end):
+    """Print progress of a chunked update."""
+    print(f"Downloaded measurements from {start:%Y-%m-%d} to {end:%Y-%m-%d}")
+
+
+def run_daemon(current_config, args):
+    """Update the datastore periodically until terminated.
+
+    :params current_config: Configuration incl. the datastore
+    :type current_config: Configuration
+    :params args: Arguments of the daemon subcommand
+    :type args: argparse.Namespace
+    """
+    textfile = args.metrics_textfile or current_config.config.get("metrics", {}).get("textfile")
+
+    def job():
+        with tracing.span("wetter update", historical=False):
+            success = current_config.store.update()
+            if success:
+                config.to_store(current_config.store, path=current_config.store_path)
+        if textfile is not None:
+            metrics.write_textfile(textfile)
+        return success
+
+    scheduler = daemon.Scheduler(job, interval=args.interval, jitter=args.jitter, backoff=args.backoff)
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port, addr=args.metrics_addr)
+    signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+    print("Updating the database periodically, stop with Ctrl+C.")
+    try:
+        scheduler.run(last_run=current_config.store.df.index.max().timestamp())
+    except KeyboardInterrupt:
+        scheduler.stop()
+
 
 @logio(log)
 def get_parser():
@@ -78,16 +198,56 @@ def get_parser():
         epilog="Have a nice day!",
     )
     parser.add_argument("-v", "--version", action="version", version=__version__)
+    parser.add_argument(
+        "--metrics-textfile", help="Write Prometheus metrics to file after updates (node exporter textfile)"
+    )
     subparsers = parser.add_subparsers(help="Subcommands for updates and details", dest="cmd")
     subparsers.add_parser("latest", help="Latest measurment [default]")
     yearcomb = subparsers.add_parser("update", help="Update DB")
     yearcomb.add_argument("--historical", action="store_true", help="Update with historical data")
+    yearcomb.add_argument("--since", type=int, default=None, help="First year of --historical [default: last year]")
+    yearcomb.add_argument("--chunk-days", type=int, default=365, help="Days per request of --historical")
     comparison_parser = subparsers.add_parser("compare", help="Compare w/ last week, month, year")
     group = comparison_parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--last-week", action="store_true", dest="week", help="Compare w/ last week")
     group.add_argument("--last-year", action="store_true", dest="year", help="Compare w/ last year")
     group.add_argument("--last-month", action="store_true", dest="month", help="Compare w/ last month")
     group.add_argument("--month", type=int, choices=range(1, 13), dest="detailed", help="Month")
+    group.add_argument("--normal", action="store_true", help="Compare w/ normal of this day & hour")
+    group.add_argument("--all", action="store_true", help="Compare w/ last week, month and year at once")
+    group.add_argument("--percentiles", action="store_true", help="Compare w/ p10, p50 & p90 of all measurements")
+    group.add_argument("--rolling", choices=list(rolling.WINDOWS), help="Compare w/ moving average, min, max & z-score")
+    comparison_parser.add_argument("--json", action="store_true", help="Print report of --all as json")
+    comparison_parser.add_argument("--years", type=int, default=None, help="Limit --percentiles to last years")
+    forecastparser = subparsers.add_parser("forecast", help="Forecast saved during latest update")
+    forecastparser.add_argument("--hours", type=int, default=24, help="Number of hours [default: 24]")
+    subparsers.add_parser("check", help="Check all measurements for anomalies")
+    subparsers.add_parser("relocate", help="Fetch measurements of a changed location")
+    daemonparser = subparsers.add_parser("daemon", help="Update DB periodically (instead of systemd timer)")
+    daemonparser.add_argument("--interval", type=int, default=3600, help="Seconds between updates [default: 3600]")
+    daemonparser.add_argument("--jitter", type=int, default=300, help="Max. per-host offset in seconds [default: 300]")
+    daemonparser.add_argument("--backoff", type=int, default=60, help="Seconds until first retry [default: 60]")
+    daemonparser.add_argument("--metrics-port", type=int, default=None, help="Serve Prometheus metrics on port")
+    daemonparser.add_argument(
+        "--metrics-addr",
+        default="127.0.0.1",
+        help="Address of the metrics endpoint, 0.0.0.0 for all [default: 127.0.0.1]",
+    )
+    fleetparser = subparsers.add_parser("fleet", help="Query many datastores in parallel")
+    fleetparser.add_argument("stores", nargs="+", help="Locations of the datastores")
+    fleetparser.add_argument("--query", choices=list(fleet.QUERIES), default="last-month", help="Query")
+    fleetparser.add_argument("--variable", choices=["temperature", "wind"], default="temperature", help="Variable")
+    fleetparser.add_argument("--reduce", choices=fleet.REDUCERS, default="max", help="Reduction over all stores")
+    fleetparser.add_argument("--workers", type=int, default=None, help="Number of processes [default: cores]")
+    queryparser = subparsers.add_parser("query", help="Evaluate expression over measurements")
+    queryparser.add_argument("--expr", required=True, help="Expression e.g. `wind_chill - temperature`")
+    windows = [name for name in fleet.QUERIES if name != "latest"]
+    queryparser.add_argument("--window", choices=windows, default="last-week", help="Window [default: last-week]")
+    statsparser = subparsers.add_parser("stats", help="Statistics of all measurements")
+    gstats = statsparser.add_mutually_exclusive_group()
+    gstats.add_argument("--monthly", action="store_true", help="Show statistics per month")
+    gstats.add_argument("--diurnal", action="store_true", help="Show average per hour of the day")
+    gstats.add_argument("--heatmap", action="store_true", help="Show average temperature per month and hour")
     confparser = subparsers.add_parser("configure", help="Configuration of the tool")
     gconf = confparser.add_mutually_exclusive_group(required=True)
     gconf.add_argument("--systemd", action="store_true", help="Show systemd profile")
@@ -156,10 +316,11 @@ def pretty_print_comparison(latest, average, mode, variable="temperature"):
     assert mode in ("week", "year", "month"), f"Mode {mode} is unknown."
 
     try:
-        temp_avg = average[variable][0]
+        assert qu.size(average) > 0, "Window is not allowed to be empty."
+        temp_avg = qu.average(average)[variable]
         temp_now = latest[variable][0]
-    except IndexError as err:
-        log.error(f"IndexError: {err}", exc_info=True)
+    except (AssertionError, IndexError) as err:
+        log.error(f"{type(err).__name__}: {err}", exc_info=True)
         print("Unfortunately there are not enough data points.")
         add = "--historical" if mode == "year" else ""
         print(f"Please consider updating the database: `wetter update {add}`")
@@ -174,11 +335,13 @@ def pretty_print_comparison(latest, average, mode, variable="temperature"):
         print_disclaimer_window(average)
 
 
-def pretty_print_detailed_comparison(window, variable="temperature"):
+def pretty_print_detailed_comparison(window, cube, variable="temperature"):
     """Pretty print the output of a detailed month window comparison.
 
     :params window: Measurement within a certain month
     :type latest: pd.DataFrame
+    :params cube: Calendar aggregation cube of the database
+    :type cube: CalendarCube
     :raises: AssertionError, IndexError, KeyError
     """
     try:
@@ -189,10 +352,12 @@ def pretty_print_detailed_comparison(window, variable="temperature"):
         print("Please consider updating the database: `wetter update`")
     else:
         window.index = window.index.map(lambda x: x.astimezone(local_now().tzinfo))
-        overall_average = window.mean()[variable]
-        daily_average = {data.index[0]: data.mean()[variable] for (day, data) in window.groupby(window.index.day)}
+        overall_average = qu.average(window)[variable]
+        first = window.index[0]
+        days = cube.select(year=first.year, month=first.month).aggregate(by=("day",))[f"{variable}_mean"]
+        daily_average = {first.replace(day=day): value for day, value in days.items()}
         hotter_days = {k: v for k, v in daily_average.items() if v > overall_average}
-        month = window.index[0].strftime("%B %Y")
+        month = first.strftime("%B %Y")
         msg = f"It was on average 🌡️ {overall_average:.1f}°C in 📅 {month}."
         print(msg)
         log.info(msg)
@@ -203,6 +368,264 @@ def pretty_print_detailed_comparison(window, variable="temperature"):
         log.info(f"Hotter days are: {hotter_days}")
 
 
+def pretty_print_normal_comparison(latest, climatology, variable="temperature"):
+    """Pretty print the comparison of the latest measurement with the climatology.
+
+    :params latest: Latest measurement from database
+    :type latest: pd.DataFrame
+    :params climatology: Climatology index of the database
+    :type climatology: Climatology
+    :raises: IndexError, KeyError
+    """
+    try:
+        value = latest[variable][0]
+        normal, rank, years = climatology.lookup(variable, latest.index[0], value)
+        assert years > 0, "No completed years in the database."
+    except (IndexError, KeyError, AssertionError) as err:
+        log.error(f"{type(err).__name__}: {err}", exc_info=True)
+        print("Unfortunately there are not enough data points.")
+        print("Please consider updating the database: `wetter update --historical`")
+    else:
+        diff = value - normal
+        relation = "warmer" if diff > 0 else "colder"
+        relation = "same" if diff == 0 else relation
+        msg = (
+            f"It is {abs(diff):.1f}°C {relation} ({value:.1f}°C) than the normal ({normal:.1f}°C) for this time of year"
+        )
+        print(msg)
+        print(f"The measurement is higher than {rank:.0f}% of the measurements in {years} years.")
+        log.info(msg)
+
+
+def pretty_print_percentiles(latest, table, start):
+    """Pretty print the comparison of the latest measurement with the percentiles.
+
+    :params latest: Latest measurement from database
+    :type latest: pd.DataFrame
+    :params table: Percentiles and number of measurements per variable
+    :type table: pd.DataFrame
+    :params start: Start of the time period of the percentiles
+    :type start: pd.Timestamp
+    """
+    if latest.index.size == 0 or table["count"].min() == 0:
+        print("Unfortunately there are not enough data points.")
+        print("Please consider updating the database: `wetter update --historical`")
+        return
+    names = {"temperature": ("🌡️", "°C"), "wind": ("🌬️", "km/h")}
+    print(f"Percentiles since {start:%Y-%m-%d} ({table['count'].min():,} measurements)")
+    for var, row in table.iterrows():
+        icon, unit = names.get(var, ("", ""))
+        quantiles = " | ".join(f"{name}: {value:.1f}{unit}" for name, value in row.drop("count").items())
+        print(f"{icon} {var:<12} {quantiles} | now: {latest[var][0]:.1f}{unit}")
+    log.info(f"Percentiles since {start}: {table.to_dict()}")
+
+
+def pretty_print_rolling(latest, table, scores, window):
+    """Pretty print the comparison of the latest measurement with the moving window before it.
+
+    :params latest: Latest measurement from database
+    :type latest: pd.DataFrame
+    :params table: Moving statistics `{var}_{statistic}` of the window ending at the latest measurement
+    :type table: pd.Series
+    :params scores: Z-score of the latest measurement per variable
+    :type scores: pd.Series
+    :params window: Length of the window e.g. `24h`
+    :type window: str
+    """
+    if latest.index.size == 0 or scores.isna().all():
+        print("Unfortunately there are not enough data points.")
+        print("Please consider updating the database: `wetter update`")
+        return
+    names = {"temperature": ("🌡️", "°C"), "wind": ("🌬️", "km/h")}
+    print(f"Moving window of the last {window}")
+    for var, score in scores.items():
+        icon, unit = names.get(var, ("", ""))
+        values = " | ".join(f"{name}: {table[f'{var}_{name}']:.1f}{unit}" for name in ("mean", "min", "max"))
+        flag = " ⚠️" if abs(score) > rolling.THRESHOLD else ""
+        print(f"{icon} {var:<12} {values} | now: {latest[var][0]:.1f}{unit} (z-score {score:+.1f}){flag}")
+
+
+def pretty_print_report(latest, report):
+    """Pretty print the report of all windows (week, month, year).
+
+    :params latest: Latest measurement from database
+    :type latest: pd.DataFrame
+    :params report: Aggregates of each window
+    :type report: pd.DataFrame
+    """
+    pretty_print_latest(latest.copy())
+    tzinfo = local_now().tzinfo
+    for mode, row in report.iterrows():
+        start = row.start.astimezone(tzinfo).strftime("%Y-%m-%d")
+        end = row.end.astimezone(tzinfo).strftime("%Y-%m-%d")
+        if row["count"] == 0:
+            print(f"Last {mode} (📅 {start} - {end}): not enough data points.")
+            continue
+        msg = (
+            f"Last {mode} (📅 {start} - {end}, #{row['count']:.0f} measurements): "
+            + f"🌡️ {row.temperature_mean:.1f}°C [{row.temperature_min:.1f}, {row.temperature_max:.1f}] "
+            + f"🌬️ {row.wind_mean:.1f} km/h [{row.wind_min:.1f}, {row.wind_max:.1f}]"
+        )
+        print(msg)
+        log.info(msg)
+
+
+def print_json_report(latest, report):
+    """Print the report of all windows (week, month, year) as json document.
+
+    :params latest: Latest measurement from database
+    :type latest: pd.DataFrame
+    :params report: Aggregates of each window
+    :type report: pd.DataFrame
+    """
+    document = dict(latest=None, windows=dict())
+    if latest.index.size > 0:
+        document["latest"] = dict(time=latest.index[0].isoformat(), **latest.iloc[0].to_dict())
+    for mode, row in report.iterrows():
+        row = row.to_dict()
+        row.update(start=row["start"].isoformat(), end=row["end"].isoformat())
+        document["windows"][mode] = {key: None if val != val else val for key, val in row.items()}
+    print(json.dumps(document, indent=2))
+
+
+def pretty_print_fleet(result, args):
+    """Pretty print the reduced result of a fleet query.
+
+    :params result: Reduced result over all datastores
+    :type result: SiteResult
+    :params args: Arguments of the fleet subcommand
+    :type args: argparse.Namespace
+    """
+    if result is None:
+        print("Unfortunately there are not enough data points in any of the datastores.")
+        return
+    if result.path is None:
+        msg = f"The {args.variable} over all sites ({args.query}) was on average {result.value:.1f}."
+    else:
+        msg = f"The site with {args.reduce} {args.variable} ({args.query}) is {result.path} with {result.value:.1f}."
+    print(msg)
+    log.info(msg)
+
+
+def pretty_print_expression(window, values, args):
+    """Pretty print the average and range of an expression within a window.
+
+    :params window: Selection of measurements the expression was evaluated on
+    :type window: pd.DataFrame
+    :params values: Value of the expression per row of the window
+    :type values: pd.Series
+    :params args: Arguments of the query subcommand
+    :type args: argparse.Namespace
+    """
+    if qu.size(window) == 0 or values.count() == 0:
+        print("Unfortunately there are not enough data points.")
+        print("Please consider updating the database: `wetter update`")
+        return
+    selection = values.to_frame()
+    if qu.COUNT in window.columns:
+        # Rows of compacted days are weighted by their number of measurements
+        selection[qu.COUNT] = window[qu.COUNT]
+    average = qu.average(selection)[args.expr]
+    msg = (
+        f"{args.expr} ({args.window}) was on average {average:.1f} "
+        f"[{values.min():.1f}, {values.max():.1f}] (#{qu.size(window)} measurements)."
+    )
+    print(msg)
+    log.info(msg)
+
+
+def pretty_print_forecast(forecast, issued, version):
+    """Pretty print the forecast of the next hours.
+
+    :params forecast: Forecast of the next hours
+    :type forecast: pd.DataFrame
+    :params issued: Date the forecast was saved
+    :type issued: pd.Timestamp
+    :params version: Version of the forecast table
+    :type version: int
+    """
+    if forecast.index.size == 0:
+        print("Unfortunately there is no forecast for the next hours.")
+        print("Please consider updating the database: `wetter update`")
+        return
+    tzinfo = local_now().tzinfo
+    for date, row in forecast.iterrows():
+        date = date.astimezone(tzinfo)
+        print(f"📅 {date.strftime('%Y-%m-%d @ %I:%M%p')} 🌡️ {row.temperature:.1f}°C 🌬️ {row.wind:.1f} km/h")
+    issued = issued.astimezone(tzinfo).strftime("%Y-%m-%d @ %I:%M%p")
+    print(f"Forecast #{version} saved on 📅 {issued}.")
+
+
+def pretty_print_statistics(buckets):
+    """Pretty print the statistics over all measurements.
+
+    :params buckets: Running statistics per calendar month and variable
+    :type buckets: dict
+    """
+    if len(buckets) == 0:
+        print("Unfortunately there are not enough data points.")
+        print("Please consider updating the database: `wetter update`")
+        return
+    variables = list(next(iter(buckets.values())).keys())
+    overall = stats.overall(buckets, variables)
+    icons = {"temperature": "🌡️", "wind": "🌬️"}
+    for var, val in overall.items():
+        msg = (
+            f"{icons.get(var, '')} {var}: {val.mean:.1f} ± {val.std:.1f} "
+            + f"(min {val.min:.1f}, max {val.max:.1f}) from #{val.count} measurements"
+        )
+        print(msg)
+        log.info(msg)
+    print(f"Statistics cover 📅 {min(buckets)} - {max(buckets)}.")
+
+
+def pretty_print_diurnal_profile(cube):
+    """Pretty print the average of each variable per (local) hour of the day.
+
+    :params cube: Calendar aggregation cube of the database
+    :type cube: CalendarCube
+    """
+    profile = cube.aggregate(by=("hour",))
+    if profile.index.size == 0:
+        print("Unfortunately there are not enough data points.")
+        print("Please consider updating the database: `wetter update`")
+        return
+    for hour, row in profile.iterrows():
+        values = " ".join(f"{var} {row[f'{var}_mean']:.1f}" for var in cube.variables)
+        print(f"{hour:02d}:00 {values}")
+
+
+def pretty_print_heatmap(cube, variable="temperature"):
+    """Pretty print the average of a variable per month (rows) and (local) hour (columns).
+
+    :params cube: Calendar aggregation cube of the database
+    :type cube: CalendarCube
+    :params variable: Variable to be shown
+    :type variable: str
+    """
+    table = cube.aggregate(by=("month", "hour"))[f"{variable}_mean"].unstack("hour")
+    if table.index.size == 0:
+        print("Unfortunately there are not enough data points.")
+        print("Please consider updating the database: `wetter update`")
+        return
+    print("   " + "".join(f"{hour:>5d}" for hour in table.columns))
+    for month, row in table.iterrows():
+        print(f"{month:>2d} " + "".join(f"{value:5.1f}" for value in row))
+
+
+def pretty_print_monthly_statistics(buckets):
+    """Pretty print the statistics of each calendar month.
+
+    :params buckets: Running statistics per calendar month and variable
+    :type buckets: dict
+    """
+    for key in sorted(buckets):
+        values = " ".join(
+            f"{var} {val.mean:.1f} ± {val.std:.1f} [{val.min:.1f}, {val.max:.1f}]" for var, val in buckets[key].items()
+        )
+        print(f"{key} #{next(iter(buckets[key].values())).count} {values}")
+
+
 def print_disclaimer_latest(latest):
     """Disclaimer about the data the calculations are based upon.
 
@@ -230,7 +653,7 @@ def print_disclaimer_window(window):
     :params window: Measurement within a certain month
     :type latest: pd.DataFrame
     """
-    num = window.index.size
+    num = qu.size(window)
     try:
         assert num > 0, "Window is not allowed to be empty."
     except AssertionError as err:
@@ -4,11 +4,12 @@ This module handles the measurement data.
 It is reponsible for defining a unified interface to the local data.
 The includes the json structure of the data to be saved on the local machine.
 as well as the update of the data using open API services.
-The module defines three components:
+The module defines four components:
 
 - `WetterDB`: Read/Write/Update of the database
 - `APIForWeatherData`: Definition of an API for access different WetterAPI services
 - `QueryTicket`: Common data structure to abstract and regulate query parameters
+- `QueryCache`: Persistent cache for the results of the queries
 
 The `WetterDB` reads and write data to the json backend store.
 This can handle all the day to day queries of the cli tool.
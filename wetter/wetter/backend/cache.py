@@ -0,0 +1,144 @@
+"""Persistent cache for the results of queries on the local data.
+
+Most invocations of the cli tool run the same queries on an unchanged
+datastore e.g. a dashboard polling `wetter compare --last-month`.
+The `QueryCache` keeps the results of these queries between invocations.
+A result is keyed by the query function, the selected window and the
+`generation` of the `WetterDB` which is bumped on every update.
+New measurements therefore never hit outdated results.
+
+The cache additionally remembers the generation (and location) of
+each datastore file together with its size and modification time.
+This allows answering cached queries without loading the datastore at all.
+"""
+import logging
+import os
+import pickle
+from collections import OrderedDict
+
+from wetter.config.defaults import DEFAULT_CACHE_PATH, QUERY_CACHE_SIZE
+
+log = logging.getLogger(__name__)
+
+
+class QueryCache:
+    """Bounded least-recently-used (LRU) cache persisted on disk.
+
+    :param path: Location of the cache file
+    :type path: str
+    :param maxsize: Maximum number of cached results
+    :type maxsize: int
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, maxsize=QUERY_CACHE_SIZE):
+        assert maxsize > 0, "Cache size must be > 0."
+        self.path = path
+        self.maxsize = maxsize
+        self.modified = False
+        self._entries = OrderedDict()
+        self._stores = dict()
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Return cached result and mark it as recently used.
+
+        :param key: Key of the result
+        :type key: tuple
+        :param default: Returned if key is not cached [default: None]
+        :return: Cached result
+        """
+        if key not in self._entries:
+            log.debug(f"Cache miss for {key}")
+            return default
+        log.debug(f"Cache hit for {key}")
+        # The order is persisted as well, otherwise the eviction is first-in first-out across invocations
+        if next(reversed(self._entries)) != key:
+            self._entries.move_to_end(key)
+            self.modified = True
+        return self._entries[key]
+
+    def put(self, key, value):
+        """Add result to the cache and evict the least recently used results.
+
+        :param key: Key of the result
+        :type key: tuple
+        :param value: Result to be cached
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            evicted, _ = self._entries.popitem(last=False)
+            log.debug(f"Evicted {evicted} from cache")
+        self.modified = True
+
+    def store_info(self, store_path):
+        """Return the remembered information about a datastore file.
+
+        The information is only returned if the file did not change since
+        it was registered i.e. has the same size and modification time.
+
+        :param store_path: Location of the datastore file
+        :type store_path: str
+        :return: Information e.g. `generation`, `lat` and `lon` or None if unknown/outdated
+        :rtype: dict
+        """
+        signature, info = self._stores.get(os.path.abspath(store_path), (None, None))
+        if signature is None or signature != self.signature(store_path):
+            return None
+        return info
+
+    def register(self, store_path, signature, **info):
+        """Remember information about a datastore file.
+
+        :param store_path: Location of the datastore file
+        :type store_path: str
+        :param signature: Size and modification time of the file when it was read
+        :type signature: tuple
+        :param info: Information about the content e.g. `generation`
+        :type info: dict
+        """
+        self._stores[os.path.abspath(store_path)] = (signature, info)
+        self.modified = True
+
+    def save(self):
+        """Persist the cache on disk (only if it was modified)."""
+        if not self.modified:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"entries": self._entries, "stores": self._stores}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+        self.modified = False
+        log.info(f"Saved {len(self)} cached results to {self.path}")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+            entries = data["entries"]
+            stores = data["stores"]
+        except Exception as err:
+            log.warning(f"Ignoring unreadable cache {self.path}: {err}")
+            return
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        self._entries = entries
+        self._stores = stores
+
+    @staticmethod
+    def signature(path):
+        """Return size and modification time of a file (None if it does not exist)."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
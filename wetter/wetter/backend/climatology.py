@@ -0,0 +1,171 @@
+"""Climatology of the measurements for comparisons with the long-term normal.
+
+The climatology is an index over all completed calendar years (UTC) in the
+datastore. Each measurement is placed in a slot defined by its day of the
+year and hour. Days are counted as in a leap year such that the same calendar
+day shares a slot across all years (the 29th of February is empty in common
+years). For each variable there is an array of shape (slots, years).
+
+A comparison with the normal is a single lookup of the row of a slot.
+The index is extended incrementally if new or modified years arrive in the
+datastore (see `integrity.checksums`). It is persisted next to the datastore
+as `.npz` file together with the location of the datastore.
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from wetter.backend import integrity
+
+log = logging.getLogger(__name__)
+
+HOURS = 24
+SLOTS = 366 * HOURS
+_DAYS_BEFORE_MONTH = np.cumsum([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+
+
+def slots(index):
+    """Return the slot (day of leap year and hour) of each timestamp.
+
+    :param index: Timestamps of the measurements
+    :type index: pd.DatetimeIndex
+    :rtype: np.ndarray of int
+    """
+    index = index.tz_convert("UTC")
+    days = _DAYS_BEFORE_MONTH[index.month.to_numpy() - 1] + index.day.to_numpy() - 1
+    return days * HOURS + index.hour.to_numpy()
+
+
+class Climatology:
+    """Index of measurements per slot and completed year.
+
+    :param years: Completed years included in the index
+    :type years: list of int
+    :param counts: Number of measurements in the datastore for each included year
+    :type counts: list of int
+    :param values: Measurements per variable as array of shape (slots, years)
+    :type values: dict of np.ndarray
+    :param generation: Generation of the datastore the index was last extended with
+    :type generation: int
+    :param checksums: Checksum of the measurements of each included year (see `integrity.checksums`)
+    :type checksums: list of int
+    :param location: Latitude and longitude of the datastore
+    :type location: tuple of float
+    """
+
+    def __init__(self, years=None, counts=None, values=None, generation=None, checksums=None, location=None):
+        self.years = list(years) if years is not None else []
+        self.counts = list(counts) if counts is not None else []
+        self.values = dict(values) if values is not None else {}
+        self.generation = generation
+        # Index files of older versions lack the checksums, their years are indexed again
+        self.checksums = list(checksums) if checksums is not None else [None] * len(self.years)
+        self.location = None if location is None else tuple(location)
+
+    def extend(self, df, until):
+        """Add completed years of the datastore which are missing or incomplete.
+
+        The checksums of the measurements per year are compared. A year is
+        (re)indexed if it is new or any of its measurements was added, removed
+        or modified.
+
+        :param df: Database with all measurements (sorted by time)
+        :type df: pd.DataFrame
+        :param until: Years before the year of this date are completed
+        :type until: datetime.datetime w/ time zone information
+        :return: Number of (re)indexed years
+        :rtype: int
+        """
+        changed = 0
+        if df.index.size == 0:
+            return changed
+        years, checksums = integrity.checksums(df, df.index.tz_convert("UTC").year.to_numpy())
+        for year, checksum in zip(years.tolist(), checksums.tolist()):
+            if year >= pd.Timestamp(until).tz_convert("UTC").year:
+                break
+            if year in self.years and self.checksums[self.years.index(year)] == checksum:
+                continue
+            start = pd.Timestamp(year=year, month=1, day=1, tz="UTC")
+            lo, hi = df.index.searchsorted([start, start.replace(year=year + 1)])
+            self._set_year(year, df.iloc[lo:hi], checksum)
+            changed += 1
+        if changed:
+            log.info(f"Indexed {changed} years for climatology ({len(self.years)} years in total)")
+        return changed
+
+    def lookup(self, variable, date, value):
+        """Compare a measurement with the normal of its day of the year and hour.
+
+        :param variable: Name of the variable e.g. `temperature`
+        :type variable: str
+        :param date: Time of the measurement
+        :type date: datetime.datetime w/ time zone information
+        :param value: Measured value
+        :type value: float
+        :return: Normal (mean) of the slot, percentile rank of the value and number of years
+        :rtype: tuple of (float, float, int)
+        """
+        assert date.tzinfo is not None
+        row = self.values[variable][slots(pd.DatetimeIndex([date]))[0]]
+        row = row[~np.isnan(row)]
+        if row.size == 0:
+            return np.nan, np.nan, 0
+        rank = ((row < value).sum() + 0.5 * (row == value).sum()) / row.size * 100
+        return float(row.mean()), float(rank), int(row.size)
+
+    def save(self, path):
+        """Persist the index as `.npz` file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        arrays = {f"values_{var}": val for var, val in self.values.items()}
+        generation = -1 if self.generation is None else self.generation
+        checksums = np.array([0 if value is None else value for value in self.checksums], dtype=np.uint64)
+        location = [np.nan, np.nan] if self.location is None else list(self.location)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                years=self.years,
+                counts=self.counts,
+                generation=generation,
+                checksums=checksums,
+                location=location,
+                **arrays,
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Load a persisted index (an empty index if the file does not exist)."""
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as data:
+            values = {key.split("_", 1)[1]: data[key] for key in data.files if key.startswith("values_")}
+            generation = int(data["generation"])
+            location = data["location"].tolist() if "location" in data.files else [np.nan, np.nan]
+            return cls(
+                years=data["years"].tolist(),
+                counts=data["counts"].tolist(),
+                values=values,
+                generation=None if generation < 0 else generation,
+                checksums=data["checksums"].tolist() if "checksums" in data.files else None,
+                location=None if np.isnan(location).any() else location,
+            )
+
+    def _set_year(self, year, window, checksum):
+        if year not in self.years:
+            position = int(np.searchsorted(self.years, year))
+            self.years.insert(position, year)
+            self.counts.insert(position, 0)
+            self.checksums.insert(position, None)
+            for var in self.values:
+                self.values[var] = np.insert(self.values[var], position, np.nan, axis=1)
+        position = self.years.index(year)
+        self.counts[position] = window.index.size
+        self.checksums[position] = checksum
+        index = slots(window.index)
+        for var in window.columns:
+            if var not in self.values:
+                self.values[var] = np.full((SLOTS, len(self.years)), np.nan)
+            column = np.full(SLOTS, np.nan)
+            column[index] = window[var].to_numpy()
+            self.values[var][:, position] = column
@@ -0,0 +1,340 @@
+"""Calendar aggregation cube of the measurements.
+
+Reports like daily averages of a month, diurnal profiles or month × hour
+heatmaps are aggregations over calendar components. Instead of grouping
+the measurements for each report, the cube holds count, sum, minimum and
+maximum per variable for each cell of (year × month × day × hour) in the
+local calendar. The cells are dense arrays of shape (years, 12, 31, 24).
+The local calendar follows a time zone incl. its daylight saving time, a
+change of the current offset from UTC therefore keeps the aggregates.
+
+Any report is a selection of the cube (`select`) followed by a roll up of
+the remaining calendar components (`aggregate`). Both only touch the
+aggregates, never the measurements.
+
+The cube is extended incrementally with measurements before the first or
+after the last aggregated measurement. Days in between whose measurements
+were modified (see `integrity.checksums`) are aggregated again. Only the
+checksums of these and the added days are updated. It is persisted next
+to the datastore as `.npz` file together with the location of the datastore
+and the time zone.
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from wetter.backend import integrity
+
+log = logging.getLogger(__name__)
+
+AXES = ("year", "month", "day", "hour")
+SHAPE = (12, 31, 24)
+STATISTICS = ("count", "sum", "min", "max")
+# Value of each statistic in an empty cell
+EMPTY = dict(count=0, sum=0.0, min=np.inf, max=-np.inf)
+DAY = pd.Timedelta(days=1).value
+HOUR = pd.Timedelta(hours=1).value
+
+
+class CalendarCube:
+    """Aggregates of measurements per variable and local calendar hour.
+
+    :param zone: Time zone of the local calendar e.g. `Europe/Berlin`
+    :type zone: str
+    :param variables: Names of the variables
+    :type variables: list of str
+    :param years: Years covered by the cube (first axis)
+    :type years: list of int
+    :param arrays: Aggregates `count`, `sum`, `min` and `max` of shape (years, 12, 31, 24, variables)
+    :type arrays: dict of np.ndarray
+    :param first: Timestamp of the first aggregated measurement
+    :type first: pd.Timestamp
+    :param last: Timestamp of the last aggregated measurement
+    :type last: pd.Timestamp
+    :param generation: Generation of the datastore the cube was last extended with
+    :type generation: int
+    :param labels: Calendar values of the months, days and hours axes [default: all]
+    :type labels: dict of list
+    :param checksums: Checksum of the aggregated measurements per UTC day (day number to checksum)
+    :type checksums: dict
+    :param location: Latitude and longitude of the datastore
+    :type location: tuple of float
+    """
+
+    def __init__(
+        self,
+        zone="UTC",
+        variables=None,
+        years=None,
+        arrays=None,
+        first=None,
+        last=None,
+        generation=None,
+        labels=None,
+        checksums=None,
+        location=None,
+    ):
+        self.zone = zone
+        self.variables = list(variables) if variables is not None else []
+        self.years = list(years) if years is not None else []
+        self.arrays = dict(arrays) if arrays is not None else self._empty(len(self.years))
+        self.first = first
+        self.last = last
+        self.generation = generation
+        self.checksums = dict(checksums) if checksums is not None else {}
+        self.location = None if location is None else tuple(location)
+        self.labels = dict(month=list(range(1, 13)), day=list(range(1, 32)), hour=list(range(24)))
+        if labels is not None:
+            self.labels.update(labels)
+
+    def _empty(self, years):
+        shape = (years, *SHAPE, len(self.variables))
+        return dict(
+            count=np.zeros(shape, dtype=np.int32),
+            sum=np.zeros(shape),
+            min=np.full(shape, np.inf),
+            max=np.full(shape, -np.inf),
+        )
+
+    def extend(self, df):
+        """Add measurements before the first or after the last aggregated measurement.
+
+        Days between the first and last aggregated measurement are aggregated
+        again if any of their measurements was added, removed or modified.
+        Days which are no longer part of the datastore (compacted) are kept.
+
+        :param df: Database with all measurements (sorted by time)
+        :type df: pd.DataFrame
+        :return: Number of added or aggregated again measurements
+        :rtype: int
+        """
+        if df.index.size == 0:
+            return 0
+        if len(self.variables) == 0:
+            self.variables = list(df.columns)
+            self.arrays = self._empty(len(self.years))
+        changed = 0
+        if self.first is None:
+            new = df
+        else:
+            lo = df.index.searchsorted(self.first, side="left")
+            hi = df.index.searchsorted(self.last, side="right")
+            changed = self._refresh(df.iloc[lo:hi], since=df.index[0])
+            new = pd.concat([df.iloc[:lo], df.iloc[hi:]])
+        if new.index.size > 0:
+            self._add(new)
+            # A checksum is the sum of the hashes of the rows, the new rows of a partially aggregated day are added
+            days, checksums = integrity.checksums(new, new.index.asi8 // DAY)
+            for day, checksum in zip(days.tolist(), checksums.tolist()):
+                self.checksums[day] = (self.checksums.get(day, 0) + checksum) % 2**64
+            self.first = new.index[0] if self.first is None else min(self.first, new.index[0])
+            self.last = new.index[-1] if self.last is None else max(self.last, new.index[-1])
+            log.info(f"Added {new.index.size} measurements to the calendar cube")
+        return changed + new.index.size
+
+    def _refresh(self, df, since):
+        """Aggregate again the days whose measurements changed since they were added.
+
+        :param df: Measurements between the first and last aggregated measurement
+        :type df: pd.DataFrame
+        :param since: First measurement of the datastore, earlier days were compacted
+        :type since: pd.Timestamp
+        :return: Number of aggregated again measurements
+        :rtype: int
+        """
+        keys = df.index.asi8 // DAY
+        days, checksums = integrity.checksums(df, keys)
+        current = dict(zip(days.tolist(), checksums.tolist()))
+        first = pd.Timestamp(since).value // DAY
+        changed = sorted(
+            day
+            for day in set(current) | {day for day in self.checksums if day >= first}
+            if current.get(day) != self.checksums.get(day)
+        )
+        if len(changed) == 0:
+            return 0
+        # Reset the cells of all hours of the changed days within the aggregated period
+        hours = np.repeat(np.array(changed, dtype=np.int64) * DAY, 24) + np.tile(np.arange(24) * HOUR, len(changed))
+        hours = pd.DatetimeIndex(hours, tz="UTC")
+        hours = hours[(hours >= self.first) & (hours <= self.last)]
+        cells = self._cells(hours[np.isin(hours.tz_convert(self.zone).year, self.years)])
+        size = len(self.years) * int(np.prod(SHAPE))
+        for name, value in EMPTY.items():
+            self.arrays[name].reshape(size, -1)[cells] = value
+        for day in changed:
+            if day in current:
+                self.checksums[day] = current[day]
+            else:
+                self.checksums.pop(day, None)
+        # The hour repeated at the end of daylight saving time may share its cell with a neighbouring day
+        changed = np.array(changed, dtype=np.int64)
+        window = df[np.isin(keys, np.concatenate([changed - 1, changed, changed + 1]))]
+        window = window[np.isin(self._cells(window.index), cells)]
+        self._add(window)
+        log.info(f"Aggregated {window.index.size} measurements of {len(changed)} modified days again")
+        return window.index.size
+
+    def _cells(self, index):
+        """Return the flat position of the cell of each timestamp (its local year must be part of the cube)."""
+        local = index.tz_convert(self.zone)
+        year = np.searchsorted(self.years, local.year.to_numpy())
+        return np.ravel_multi_index(
+            (year, local.month.to_numpy() - 1, local.day.to_numpy() - 1, local.hour.to_numpy()),
+            (len(self.years), *SHAPE),
+        )
+
+    def _add(self, df):
+        local = df.index.tz_convert(self.zone)
+        years = np.unique(local.year)
+        for year in years:
+            if year not in self.years:
+                position = int(np.searchsorted(self.years, year))
+                self.years.insert(position, int(year))
+                for name, empty in self._empty(1).items():
+                    self.arrays[name] = np.insert(self.arrays[name], position, empty[0], axis=0)
+        cells = self._cells(df.index)
+        size = len(self.years) * int(np.prod(SHAPE))
+        for position, var in enumerate(self.variables):
+            values = df[var].to_numpy(dtype=float)
+            valid = ~np.isnan(values)
+            cell, value = cells[valid], values[valid]
+            count = self.arrays["count"].reshape(size, -1)
+            count[:, position] += np.bincount(cell, minlength=size).astype(np.int32)
+            self.arrays["sum"].reshape(size, -1)[:, position] += np.bincount(cell, weights=value, minlength=size)
+            np.minimum.at(self.arrays["min"].reshape(size, -1)[:, position], cell, value)
+            np.maximum.at(self.arrays["max"].reshape(size, -1)[:, position], cell, value)
+
+    def select(self, year=None, month=None, day=None, hour=None):
+        """Select a part of the cube (a view, the aggregates are not copied).
+
+        Each calendar component is either None (all), a single value or a slice
+        of values (stop excluded) e.g. `select(year=2022, month=slice(6, 9))` for
+        the summer of 2022. Months and days start at 1 like in the calendar.
+
+        :return: Cube of the selection
+        :rtype: CalendarCube
+        """
+        keys = [_year_key(self.years, year)]
+        labels = dict()
+        for name, value in (("month", month), ("day", day), ("hour", hour)):
+            values = self.labels[name]
+            if value is None:
+                key = slice(None)
+            elif isinstance(value, slice):
+                lo = 0 if value.start is None else int(np.searchsorted(values, value.start))
+                hi = len(values) if value.stop is None else int(np.searchsorted(values, value.stop))
+                key = slice(lo, hi)
+            else:
+                lo = int(np.searchsorted(values, value))
+                key = slice(lo, lo + 1 if lo < len(values) and values[lo] == value else lo)
+            keys.append(key)
+            labels[name] = values[key]
+        key = tuple(keys)
+        return CalendarCube(
+            zone=self.zone,
+            variables=self.variables,
+            years=self.years[keys[0]],
+            arrays={name: array[key] for name, array in self.arrays.items()},
+            generation=self.generation,
+            labels=labels,
+        )
+
+    def aggregate(self, by=()):
+        """Roll up all calendar components except the given ones.
+
+        :param by: Calendar components to keep e.g. `("hour",)` for a diurnal profile
+        :type by: tuple of str
+        :return: Count, mean, min and max per variable (columns e.g. `temperature_mean`)
+            for each non-empty combination of the kept components (index)
+        :rtype: pd.DataFrame
+        :raises: AssertionError
+        """
+        assert all(name in AXES for name in by), f"Unknown calendar component, expected one of {AXES}"
+        labels = dict(self.labels, year=self.years)
+        axes = tuple(position for position, name in enumerate(AXES) if name not in by)
+        count = self.arrays["count"].sum(axis=axes)
+        total = self.arrays["sum"].sum(axis=axes)
+        low = self.arrays["min"].min(axis=axes, initial=np.inf)
+        high = self.arrays["max"].max(axis=axes, initial=-np.inf)
+        kept = [name for name in AXES if name in by]
+        if len(kept) > 0:
+            index = pd.MultiIndex.from_product([labels[name] for name in kept], names=kept)
+        else:
+            index = pd.RangeIndex(1)
+        columns = dict()
+        flat = (index.size, len(self.variables))
+        count, total, low, high = (array.reshape(flat) for array in (count, total, low, high))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for position, var in enumerate(self.variables):
+                empty = count[:, position] == 0
+                columns[f"{var}_count"] = count[:, position]
+                columns[f"{var}_mean"] = np.where(empty, np.nan, total[:, position] / count[:, position])
+                columns[f"{var}_min"] = np.where(empty, np.nan, low[:, position])
+                columns[f"{var}_max"] = np.where(empty, np.nan, high[:, position])
+        result = pd.DataFrame(columns, index=index)
+        if len(kept) == 1:
+            result.index = result.index.get_level_values(0)
+        return result[(count > 0).any(axis=1)]
+
+    def save(self, path):
+        """Persist the cube as `.npz` file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        generation = -1 if self.generation is None else self.generation
+        bounds = [-1 if date is None else pd.Timestamp(date).value for date in (self.first, self.last)]
+        location = [np.nan, np.nan] if self.location is None else list(self.location)
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                zone=self.zone,
+                variables=np.array(self.variables, dtype=str),
+                years=np.array(self.years, dtype=np.int64),
+                bounds=np.array(bounds, dtype=np.int64),
+                generation=generation,
+                days=np.array(list(self.checksums), dtype=np.int64),
+                checksums=np.array(list(self.checksums.values()), dtype=np.uint64),
+                location=location,
+                **self.arrays,
+            )
+
+    @classmethod
+    def load(cls, path, zone="UTC"):
+        """Load a persisted cube (an empty cube if the file does not exist or the time zone differs)."""
+        if not os.path.exists(path):
+            return cls(zone=zone)
+        with np.load(path) as data:
+            # Cubes of older versions are bucketed by a fixed offset from UTC
+            if "zone" not in data.files or str(data["zone"]) != zone:
+                log.info("Time zone of the local calendar changed, rebuilding the calendar cube")
+                return cls(zone=zone)
+            first, last = (None if value < 0 else pd.Timestamp(int(value), tz="UTC") for value in data["bounds"])
+            generation = int(data["generation"])
+            # Cubes of older versions lack the checksums, their days are aggregated again on the next extension
+            checksums = dict()
+            if "checksums" in data.files:
+                checksums = dict(zip(data["days"].tolist(), data["checksums"].tolist()))
+            location = data["location"].tolist() if "location" in data.files else [np.nan, np.nan]
+            return cls(
+                zone=zone,
+                variables=data["variables"].tolist(),
+                years=data["years"].tolist(),
+                arrays={name: data[name] for name in STATISTICS},
+                first=first,
+                last=last,
+                generation=None if generation < 0 else generation,
+                checksums=checksums,
+                location=None if np.isnan(location).any() else location,
+            )
+
+
+def _year_key(years, year):
+    """Return the slice of the years axis for a single year, a slice of years or None."""
+    if year is None:
+        return slice(None)
+    if isinstance(year, slice):
+        lo = 0 if year.start is None else int(np.searchsorted(years, year.start))
+        hi = len(years) if year.stop is None else int(np.searchsorted(years, year.stop))
+        return slice(lo, hi)
+    lo = int(np.searchsorted(years, year))
+    return slice(lo, lo + 1 if lo < len(years) and years[lo] == year else lo)
@@ -0,0 +1,102 @@
+"""Derived variables calculated from the stored measurements.
+
+A derived variable is an arithmetic expression over the stored variables
+e.g. the wind chill calculated from `temperature` and `wind`. Expressions
+are evaluated by `numexpr` over whole selections: the expression is
+compiled once and evaluated in blocks on multiple threads without
+temporary arrays for the intermediate results.
+
+Derived variables can be named. Besides the predefined ones in `DERIVED`,
+additional variables can be defined in the `[derived]` table of the
+configuration. Named variables may be used within other expressions. They
+are expanded before the evaluation, hence every expression is evaluated
+in a single pass.
+
+Expressions over a selection incl. daily aggregates of compacted measurements
+(see `wetter.backend.retention`) are evaluated on the daily averages.
+"""
+import logging
+import re
+
+import numexpr as ne
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# Predefined derived variables (temperature in °C, wind in km/h)
+DERIVED = {
+    "wind_chill": "13.12 + 0.6215 * temperature - 11.37 * wind**0.16 + 0.3965 * temperature * wind**0.16",
+    "temperature_f": "temperature * 9 / 5 + 32",
+    "wind_ms": "wind / 3.6",
+}
+
+_NAME = re.compile(r"\b([A-Za-z_]\w*)\b(\s*\()?")
+
+
+def definitions(config=None):
+    """Return the predefined and configured derived variables.
+
+    :param config: Derived variables of the configuration (name to expression) [default: None]
+    :type config: dict
+    :return: Expression of each derived variable
+    :rtype: dict
+    :raises: AssertionError
+    """
+    result = dict(DERIVED)
+    for name, expression in (config or {}).items():
+        assert _NAME.fullmatch(name) is not None, f"Invalid name of derived variable: {name}"
+        assert isinstance(expression, str), f"Expression of {name} must be a string."
+        result[name] = expression
+    return result
+
+
+def expand(expression, variables, derived=None):
+    """Replace the derived variables within an expression by their definition.
+
+    :param expression: Arithmetic expression e.g. `wind_chill - temperature`
+    :type expression: str
+    :param variables: Names of the stored variables
+    :type variables: list of str
+    :param derived: Expression of each derived variable [default: `DERIVED`]
+    :type derived: dict
+    :return: Expression only referencing stored variables
+    :rtype: str
+    :raises: AssertionError
+    """
+    if derived is None:
+        derived = DERIVED
+    variables = set(variables)
+
+    def substitute(expression, stack):
+        def replace(match):
+            name, call = match.groups()
+            if call is not None or name in variables:
+                return match.group(0)
+            assert name in derived, f"Unknown variable {name}, expected one of {sorted(variables | set(derived))}"
+            assert name not in stack, f"Derived variable {name} references itself."
+            return f"({substitute(derived[name], stack + (name,))})"
+
+        return _NAME.sub(replace, expression)
+
+    return substitute(expression, ())
+
+
+def evaluate(window, expression, derived=None):
+    """Evaluate an expression over a selection of measurements.
+
+    :param window: Selection of measurements e.g. the result of `queries.last_week`
+    :type window: pd.DataFrame
+    :param expression: Arithmetic expression over stored and derived variables
+    :type expression: str
+    :param derived: Expression of each derived variable [default: `DERIVED`]
+    :type derived: dict
+    :return: Value of the expression per row
+    :rtype: pd.Series
+    :raises: AssertionError
+    """
+    variables = [var for var in window.columns if _NAME.fullmatch(var) is not None]
+    expanded = expand(expression, variables, derived=derived)
+    log.debug(f"Evaluating {expanded} over {window.index.size} rows")
+    columns = {var: window[var].to_numpy(dtype=float) for var in variables}
+    values = ne.evaluate(expanded, local_dict=columns, global_dict={})
+    return pd.Series(values, index=window.index, name=expression)
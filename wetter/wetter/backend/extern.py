@@ -8,16 +8,26 @@ and (2) an query ticket for unifying the exchange to these servers.
 """
 
 # from wetter.tools import logio
+import json
 import logging
+import re
+import warnings
 from dataclasses import dataclass
 from datetime import datetime as dt
+from datetime import timedelta
 from datetime import timezone as tz
 
+import numpy as np
 import pandas as pd
 import requests as rqs
 
 log = logging.getLogger(__name__)
 
+# Mapping of hourly variables of Open Meteo to the columns of the WetterDB
+OPEN_METEO_HOURLY = {"temperature_2m": "temperature", "windspeed_10m": "wind"}
+# Default number of forecast hours requested after the end of a query ticket
+FORECAST_HOURS = 48
+
 
 class APIForWeatherData:
     """Informal interface to external APIs.
@@ -28,8 +38,13 @@ class APIForWeatherData:
 
     ¡Caution! This is not a strict interface and will be not enforced.
     But if it looks like a duck, ... :)
+
+    APIs answering with hours after the end of a query ticket as forecast
+    set `FORECAST`. All other hours are regular measurements.
     """
 
+    FORECAST = False
+
     @staticmethod
     def parse(response):
         """Parse and transform the response in a format accepted by WetterDB.
@@ -43,6 +58,22 @@ class APIForWeatherData:
         assert type(response) == dict
         raise NotImplementedError("Parsing is not implemented.")
 
+    @staticmethod
+    def decode(content):
+        """Decode the raw body of a response in a format accepted by WetterDB.
+
+        The default implementation parses the body as json and calls `parse`.
+        APIs might overwrite this for a more efficient decoding.
+
+        :param content: Body of the response of the API query
+        :type content: bytes
+        :return: Measurements to be added to the WetterDB
+        :rtype: pd.DataFrame
+        :raises: AssertionError
+        """
+        assert isinstance(content, bytes), f"Expected bytes, got {type(content)}"
+        return APIForWeatherData.parse(json.loads(content))
+
     @staticmethod
     def url(qt):
         """URL of the API to be called.
@@ -80,15 +111,16 @@ class OpenMeteoArchiveMeasurements(APIForWeatherData):
         For details check superclass `APIForWeatherData`.
         """
         assert type(response) == dict
-        df = pd.DataFrame(
-            {
-                "time": [dt.strptime(x, "%Y-%m-%dT%H:%M").astimezone(tz=tz.utc) for x in response["hourly"]["time"]],
-                "temperature": response["hourly"]["temperature_2m"],
-                "wind": response["hourly"]["windspeed_10m"],
-            }
-        )
-        df = df.set_index("time")
-        return df
+        return _parse_hourly(response, OPEN_METEO_HOURLY)
+
+    @staticmethod
+    def decode(content):
+        """Decode the raw body of a response in a format accepted by WetterDB.
+
+        For details check superclass `APIForWeatherData` and `decode_hourly`.
+        """
+        assert isinstance(content, bytes), f"Expected bytes, got {type(content)}"
+        return decode_hourly(content, OPEN_METEO_HOURLY)
 
     @staticmethod
     def url(qt):
@@ -125,7 +157,14 @@ class OpenMeteoArchiveMeasurements(APIForWeatherData):
 
 
 class OpenMeteoMeasurements(APIForWeatherData):
-    """Implementation of the APIForWeatherData Interface for the Open Meteo."""
+    """Implementation of the APIForWeatherData Interface for the Open Meteo.
+
+    The forecast API accepts exact hour bounds (`start_hour`/`end_hour`).
+    Only the hours of the ticket and its `forecast_hours` are requested
+    instead of whole days (and the default forecast of seven days).
+    """
+
+    FORECAST = True
 
     @staticmethod
     def parse(response):
@@ -134,15 +173,16 @@ class OpenMeteoMeasurements(APIForWeatherData):
         For details check superclass `APIForWeatherData`.
         """
         assert type(response) == dict
-        df = pd.DataFrame(
-            {
-                "time": [dt.strptime(x, "%Y-%m-%dT%H:%M").astimezone(tz=tz.utc) for x in response["hourly"]["time"]],
-                "temperature": response["hourly"]["temperature_2m"],
-                "wind": response["hourly"]["windspeed_10m"],
-            }
-        )
-        df = df.set_index("time")
-        return df
+        return _parse_hourly(response, OPEN_METEO_HOURLY)
+
+    @staticmethod
+    def decode(content):
+        """Decode the raw body of a response in a format accepted by WetterDB.
+
+        For details check superclass `APIForWeatherData` and `decode_hourly`.
+        """
+        assert isinstance(content, bytes), f"Expected bytes, got {type(content)}"
+        return decode_hourly(content, OPEN_METEO_HOURLY)
 
     @staticmethod
     def url(qt):
@@ -154,15 +194,15 @@ class OpenMeteoMeasurements(APIForWeatherData):
         url = (
             "https://api.open-meteo.com/v1/forecast?"
             + "latitude={lat:.2f}&longitude={lon:.2f}&"
-            + "timezone={tz}&start_date={start}&end_date={end}&"
-            + "hourly=temperature_2m,windspeed_10m,weathercode&current_weather=true"
+            + "timezone={tz}&start_hour={start}&end_hour={end}&"
+            + "hourly=temperature_2m,windspeed_10m"
         )
         return url.format(
             lat=qt.lat,
             lon=qt.lon,
             tz=qt.tz,
-            start=qt.start.strftime("%Y-%m-%d"),
-            end=qt.end.strftime("%Y-%m-%d"),
+            start=_hour(qt.start, qt.tz, ceil=True),
+            end=_hour(qt.end + timedelta(hours=qt.forecast_hours), qt.tz),
         )
 
     @staticmethod
@@ -178,6 +218,119 @@ class OpenMeteoMeasurements(APIForWeatherData):
         return result
 
 
+def _hour(date, zone, ceil=False):
+    """Format a date as full hour (ISO 8601 w/o timezone) in the timezone of the request."""
+    date = pd.Timestamp(date)
+    if date.tzinfo is not None:
+        date = date.tz_convert(zone)
+    date = date.ceil("H") if ceil else date.floor("H")
+    return date.strftime("%Y-%m-%dT%H:%M")
+
+
+def decode_hourly(content, variables):
+    """Decode the hourly arrays of an Open Meteo response directly into NumPy arrays.
+
+    The body is not parsed into Python objects. Instead the json arrays of the
+    `hourly` object are located in the raw bytes. Numbers are converted by
+    `np.fromstring` and the (fixed width) timestamps by a view on the bytes.
+    The timestamps are converted to UTC using `utc_offset_seconds` of the response.
+    Should the body not follow the expected layout, it falls back to the json parser.
+
+    :param content: Body of the response
+    :type content: bytes
+    :param variables: Mapping of hourly variables of the API to columns
+    :type variables: dict
+    :return: Measurements indexed by time (UTC)
+    :rtype: pd.DataFrame
+    """
+    try:
+        hourly = re.search(rb'"hourly"\s*:\s*\{', content)
+        if hourly is None:
+            raise ValueError("No hourly measurements in response")
+        hourly = hourly.end()
+        times = _decode_times(_json_array(content, b"time", hourly))
+        data = {col: _decode_numbers(_json_array(content, var.encode(), hourly)) for var, col in variables.items()}
+        for col, values in data.items():
+            if values.size != times.size:
+                raise ValueError(f"Length of {col} ({values.size}) does not match length of time ({times.size})")
+    except ValueError as err:
+        log.warning(f"Falling back to json parser for decoding the response: {err}")
+        return _parse_hourly(json.loads(content), variables)
+    offset = re.search(rb'"utc_offset_seconds"\s*:\s*(-?\d+)', content)
+    offset = int(offset.group(1)) if offset is not None else 0
+    index = pd.DatetimeIndex(times - np.timedelta64(offset, "s"), name="time").tz_localize("UTC")
+    return pd.DataFrame(data, index=index)
+
+
+def _json_array(content, key, start):
+    """Return the bytes between the brackets of the json array of a key."""
+    begin = re.compile(rb'"' + re.escape(key) + rb'"\s*:\s*\[').search(content, start)
+    if begin is None:
+        raise ValueError(f"No array {key} in response")
+    begin = begin.end()
+    end = content.index(b"]", begin)
+    return content[begin:end]
+
+
+def _decode_numbers(body):
+    if len(body) == 0:
+        return np.empty(0)
+    # `np.fromstring` stops at the first invalid number, all elements of the array must be read
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        values = np.fromstring(body.replace(b"null", b"nan"), sep=",")
+    if values.size != body.count(b",") + 1:
+        raise ValueError(f"Read {values.size} of {body.count(b',') + 1} numbers")
+    return values
+
+
+def _decode_times(body):
+    if len(body) == 0:
+        return np.empty(0, dtype="datetime64[m]")
+    body = body.replace(b" ", b"")
+    width = len(b'"YYYY-MM-DDTHH:MM",')
+    if (len(body) + 1) % width != 0:
+        raise ValueError("Timestamps are not of format YYYY-MM-DDTHH:MM")
+    stop = width - 2
+    chars = np.frombuffer(body + b",", dtype="S1").reshape(-1, width)
+    return chars[:, 1:stop].copy().view(f"S{stop - 1}").ravel().astype("datetime64[m]")
+
+
+def _parse_hourly(response, variables):
+    """Parse the hourly measurements of a json response of Open Meteo."""
+    df = pd.DataFrame(
+        {
+            "time": [dt.strptime(x, "%Y-%m-%dT%H:%M").astimezone(tz=tz.utc) for x in response["hourly"]["time"]],
+            **{col: response["hourly"][var] for var, col in variables.items()},
+        }
+    )
+    df = df.set_index("time")
+    return df
+
+
+def date_chunks(start, end, days=365):
+    """Split a date range into consecutive chunks for separate requests.
+
+    The chunks do not overlap: a chunk ends one hour before the next one starts.
+
+    :param start: Start date of the range
+    :type start: datetime.datetime w/ time zone information
+    :param end: End date of the range
+    :type end: datetime.datetime w/ time zone information
+    :param days: Length of a chunk in days
+    :type days: int
+    :return: Start and end date of each chunk
+    :rtype: Generator of tuple
+    :raises: AssertionError
+    """
+    assert days > 0, "Chunks must be at least one day long."
+    assert start <= end, "Start date must not be after end date."
+    step = timedelta(days=days)
+    while start <= end:
+        yield start, min(start + step - timedelta(hours=1), end)
+        start = start + step
+
+
 @dataclass
 class QueryTicket:
     """Define, check and possibly restrict request parameters for APIs.
@@ -196,6 +349,8 @@ class QueryTicket:
     :type lon: float
     :param tz: Timezone of the measurements to be queried [default: UTC]
     :type tz: str
+    :param forecast_hours: Number of forecast hours after the end date (if supported by the API)
+    :type forecast_hours: int
     """
 
     start: dt.date
@@ -203,12 +358,14 @@ class QueryTicket:
     lat: float
     lon: float
     tz: str = "UTC"
+    forecast_hours: int = FORECAST_HOURS
 
     def __post_init__(self):
         assert self.lon >= -180
         assert self.lon <= 180
         assert self.lat >= -90
         assert self.lat <= 90
+        assert self.forecast_hours >= 0
         if self.start > self.end:
             tmp = self.start
             self.start = self.end
@@ -0,0 +1,73 @@
+"""Regularization of the measurements to an hourly grid.
+
+Measurements merged from different APIs (recent and archive) can miss
+single hours. The averages of the queries then weight the remaining hours
+of the window unevenly. The regularization reindexes the measurements to
+an hourly grid and linearly interpolates short gaps:
+
+- Only gaps of at most `limit` consecutive hours are filled. Longer gaps
+  (e.g. an outage of several days) stay missing.
+- Only gaps with measurements on both sides are filled (no extrapolation).
+- Every interpolated value is flagged. The flags allow excluding them later
+  or replacing them with real measurements.
+
+The regularization is applied per variable in a single vectorized pass
+without a loop over the gaps. It is used on ingest (`[gaps] limit` of the
+configuration) and lazily at query time (`Query.fill`).
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+FREQUENCY = pd.Timedelta(hours=1)
+# Default maximum number of consecutive missing hours which are interpolated
+LIMIT = 3
+
+
+def regularize(df, limit=LIMIT):
+    """Reindex measurements to an hourly grid and interpolate short gaps.
+
+    The measurements are expected on full hours and sorted. Hours which are
+    still missing after the interpolation are not part of the result.
+
+    :param df: Measurements (variables as columns, timestamps as index)
+    :type df: pd.DataFrame
+    :param limit: Maximum number of consecutive missing hours which are interpolated
+    :type limit: int
+    :return: Regularized measurements and flags of the interpolated values
+    :rtype: tuple of (pd.DataFrame, pd.DataFrame of bool)
+    :raises: AssertionError
+    """
+    assert limit >= 0, "Limit must be >= 0."
+    assert df.index.is_monotonic_increasing, "Measurements must be sorted."
+    if df.index.size < 2:
+        return df.copy(), pd.DataFrame(False, index=df.index, columns=df.columns)
+    step = FREQUENCY.value
+    first = df.index.asi8[0]
+    positions = (df.index.asi8 - first) // step
+    size = int(positions[-1]) + 1
+    grid = np.full((size, len(df.columns)), np.nan)
+    grid[positions] = df.to_numpy(dtype=float)
+
+    slots = np.arange(size)[:, None]
+    valid = ~np.isnan(grid)
+    # Position of the previous and next valid value of each slot (-1 and size if there is none)
+    previous = np.maximum.accumulate(np.where(valid, slots, -1), axis=0)
+    following = np.minimum.accumulate(np.where(valid, slots, size)[::-1], axis=0)[::-1]
+    filled = ~valid & (previous >= 0) & (following < size) & (following - previous - 1 <= limit)
+
+    rows, cols = np.nonzero(filled)
+    lo, hi = previous[rows, cols], following[rows, cols]
+    weight = (rows - lo) / (hi - lo)
+    grid[rows, cols] = grid[lo, cols] + weight * (grid[hi, cols] - grid[lo, cols])
+
+    keep = np.zeros(size, dtype=bool)
+    keep[positions] = True
+    keep |= filled.any(axis=1)
+    index = pd.DatetimeIndex(first + np.flatnonzero(keep) * step, tz=df.index.tz, name=df.index.name)
+    log.debug(f"Interpolated {int(filled.sum())} values in {int(filled.any(axis=1).sum())} missing hours")
+    result = pd.DataFrame(grid[keep], index=index, columns=df.columns)
+    return result, pd.DataFrame(filled[keep], index=index, columns=df.columns)
@@ -0,0 +1,143 @@
+"""Vectorized integrity checks of the measurements of a datastore.
+
+`WetterDB.check_df` only validates the schema. The checks in this module
+validate the content of the whole datastore in a single vectorized pass
+and report every anomaly class at once:
+
+- `timezone`: Index is not in UTC
+- `unsorted`: Timestamp is earlier than its predecessor
+- `duplicates`: Timestamp occurs more than once
+- `missing`: Measurement is NaN
+- `range`: Measurement is physically implausible (see `LIMITS`)
+- `spikes`: Measurement jumps more than `SPIKES` within one hour
+- `gaps`: More than one `FREQUENCY` between consecutive measurements
+
+The checks can start at an arbitrary position e.g. the verified watermark
+of the datastore. Only rows at or after this position are reported while
+their predecessor is still considered for spikes, gaps and ordering.
+
+The `checksums` of groups of measurements (e.g. per day) allow indexes
+derived from the datastore to detect which parts of it were modified.
+"""
+import logging
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+FREQUENCY = pd.Timedelta(hours=1)
+# Physically plausible values per variable
+LIMITS = {"temperature": (-90.0, 60.0), "wind": (0.0, 410.0)}
+# Maximum plausible change per variable within one FREQUENCY
+SPIKES = {"temperature": 15.0, "wind": 80.0}
+ANOMALIES = ("timezone", "unsorted", "duplicates", "missing", "range", "spikes", "gaps")
+
+
+@dataclass
+class Report:
+    """Anomalies found by an integrity check.
+
+    :param rows: Number of checked rows
+    :type rows: int
+    :param anomalies: Timestamps of the anomalies per anomaly class
+    :type anomalies: dict of pd.DatetimeIndex
+    """
+
+    rows: int
+    anomalies: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        """True if no anomaly was found."""
+        return all(index.size == 0 for index in self.anomalies.values())
+
+    def counts(self):
+        """Return the number of anomalies per anomaly class.
+
+        :rtype: dict
+        """
+        return {name: int(index.size) for name, index in self.anomalies.items()}
+
+    def __str__(self):
+        if self.ok:
+            return f"Checked {self.rows} rows, no anomalies found."
+        lines = [f"Checked {self.rows} rows, found anomalies:"]
+        for name, index in self.anomalies.items():
+            if index.size > 0:
+                examples = ", ".join(str(timestamp) for timestamp in index[:3])
+                lines.append(f"- {name}: {index.size} (e.g. {examples})")
+        return "\n".join(lines)
+
+
+def check(df, start=0):
+    """Check the measurements of a datastore for anomalies.
+
+    :param df: Measurements (variables as columns, timestamps as index)
+    :type df: pd.DataFrame
+    :param start: Position of the first row to be reported
+    :type start: int
+    :return: Anomalies of all rows at or after `start`
+    :rtype: Report
+    """
+    assert 0 <= start <= df.index.size, f"Start {start} out of bounds"
+    begin = max(start - 1, 0)
+    frame = df.iloc[begin:]
+    index = frame.index
+    # Rows at or after `start` (the first row of the frame might be the predecessor)
+    report = np.arange(index.size) >= start - begin
+    anomalies = dict()
+
+    utc = index.tz is not None and str(index.tz) == "UTC"
+    anomalies["timezone"] = index[report] if not utc and index.size > 0 else index[:0]
+
+    delta = np.diff(index.asi8)
+    unsorted = np.zeros(index.size, dtype=bool)
+    unsorted[1:] = delta < 0
+    anomalies["unsorted"] = index[unsorted & report]
+    anomalies["duplicates"] = index[index.duplicated(keep=False) & report]
+
+    values = frame.to_numpy(dtype=float)
+    missing = np.isnan(values).any(axis=1)
+    anomalies["missing"] = index[missing & report]
+
+    implausible = np.zeros(index.size, dtype=bool)
+    spikes = np.zeros(index.size, dtype=bool)
+    hourly = np.zeros(index.size, dtype=bool)
+    hourly[1:] = delta == FREQUENCY.value
+    with np.errstate(invalid="ignore"):
+        for position, column in enumerate(frame.columns):
+            lower, upper = LIMITS.get(column, (-np.inf, np.inf))
+            implausible |= (values[:, position] < lower) | (values[:, position] > upper)
+            if column in SPIKES and index.size > 1:
+                jump = np.abs(np.diff(values[:, position])) > SPIKES[column]
+                spikes[1:] |= jump
+    anomalies["range"] = index[implausible & report]
+    anomalies["spikes"] = index[spikes & hourly & report]
+
+    gaps = np.zeros(index.size, dtype=bool)
+    gaps[1:] = delta > FREQUENCY.value
+    anomalies["gaps"] = index[gaps & report]
+    return Report(rows=int(report.sum()), anomalies=anomalies)
+
+
+def checksums(df, keys):
+    """Return a checksum of the measurements of each group e.g. day or year.
+
+    Each row (timestamp and values) is hashed and the hashes of a group are
+    summed (modulo 2**64). The checksum of a group changes if one of its
+    measurements is added, removed or modified.
+
+    :param df: Sorted measurements (variables as columns)
+    :type df: pd.DataFrame
+    :param keys: Group of each row, sorted like the rows e.g. the year
+    :type keys: np.ndarray of int
+    :return: Groups and their checksums
+    :rtype: tuple of (np.ndarray of int, np.ndarray of np.uint64)
+    """
+    if df.index.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64)
+    hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    groups, starts = np.unique(np.asarray(keys), return_index=True)
+    return groups, np.add.reduceat(hashes, starts)
@@ -5,12 +5,28 @@ It defines the process to (de)serialize the data store to json, executes
 check on the internal pd.DataFrame object if it is consistent and coherent with
 assumptions made beforehand and defines the workflow for an update.
 """
+import hashlib
 import logging
+import time
+import warnings
 from datetime import datetime as dt
 
+import numpy as np
 import pandas as pd
 
-from wetter.backend.extern import APIForWeatherData, OpenMeteoMeasurements, QueryTicket
+from wetter import metrics, tracing
+from wetter.backend import gaps, integrity
+from wetter.backend import retention as retention_module
+from wetter.backend import sketch as sketch_module
+from wetter.backend import stats as stats_module
+from wetter.backend.extern import (
+    FORECAST_HOURS,
+    APIForWeatherData,
+    OpenMeteoArchiveMeasurements,
+    OpenMeteoMeasurements,
+    QueryTicket,
+    date_chunks,
+)
 from wetter.tools import utcnow
 
 # from wetter import logio
@@ -29,34 +45,169 @@ class WetterDB:
     :type lon: float
     :param data: Key/Value store of pd.DataFrame (read from json)
     :type dict:
+    :param generation: Counter of the content version, bumped on every change (update, compaction) [default: 0]
+    :type generation: int
+    :param stats: Running statistics per calendar month and variable [default: calculated from data]
+    :type stats: dict
+    :param rollup: Key/Value store of daily aggregates of compacted measurements (read from json)
+    :type rollup: dict
+    :param retention: Number of years hourly measurements are kept [default: None i.e. forever]
+    :type retention: int
+    :param forecast: Key/Value store of the latest forecast incl. `version` and `issued` date (read from json)
+    :type forecast: dict
+    :param verified: Watermark of the integrity check i.e. `until` date and number of `rows` checked
+    :type verified: dict
+    :param sketches: Quantile sketches per calendar month and variable [default: calculated from data]
+    :type sketches: dict
+    :param filled: Hours with interpolated measurements (read from json)
+    :type filled: list of str
+    :param gap_limit: Maximum number of missing hours interpolated on update [default: None i.e. no interpolation]
+    :type gap_limit: int
     """
 
-    def __init__(self, version, lat, lon, data):
+    __slots__ = (
+        "version",
+        "lat",
+        "lon",
+        "generation",
+        "retention",
+        "_raw_data",
+        "df",
+        "persisted",
+        "verified",
+        "rollup",
+        "forecast",
+        "forecast_version",
+        "forecast_issued",
+        "stats",
+        "sketches",
+        "filled",
+        "gap_limit",
+    )
+
+    def __init__(
+        self,
+        version,
+        lat,
+        lon,
+        data,
+        generation=0,
+        stats=None,
+        rollup=None,
+        retention=None,
+        forecast=None,
+        verified=None,
+        sketches=None,
+        filled=None,
+        gap_limit=None,
+    ):
         self.version = version
         self.lat = lat
         self.lon = lon
+        self.generation = generation
+        self.retention = retention
+        self.gap_limit = gap_limit
         self._raw_data = data
 
-        # Setup the measurements (flexibel for future updates)
-        number_of_measurements = len(self._raw_data["data"])
-        measurements = {self._raw_data["index"][i]: self._raw_data["data"][i] for i in range(0, number_of_measurements)}
+        self.df = _frame_from_split(self._raw_data)
+        if not self.df.index.is_monotonic_increasing:
+            log.warning("Measurements of the datastore are not sorted, sorting them")
+            self.df = self.df.sort_index()
+        self.check_df()
+        # Fingerprint of the content saved on disk (see `fingerprint`)
+        self.persisted = None
+        if verified is None:
+            self.verified = None
+        else:
+            self.verified = dict(until=pd.Timestamp(verified["until"]), rows=verified["rows"])
+        self.filled = pd.DatetimeIndex(pd.to_datetime(filled if filled is not None else [], utc=True), name="time")
 
-        # Setup dataframe
-        df = pd.DataFrame({"time": self._raw_data["columns"], **measurements})
-        df = df.set_index("time")
+        # Setup daily aggregates of compacted measurements
+        if rollup is None:
+            self.rollup = retention_module.empty(self.df.columns)
+        else:
+            self.rollup = retention_module.upgrade(_frame_from_split(rollup), self.df.columns)
 
-        self.df = df
-        self.check_df()
+        # Setup forecast table (replaced on each update)
+        if forecast is None:
+            self.forecast = self.df.iloc[:0]
+            self.forecast_version = 0
+            self.forecast_issued = None
+        else:
+            self.forecast = _frame_from_split(forecast["data"])
+            self.forecast_version = forecast["version"]
+            self.forecast_issued = pd.Timestamp(forecast["issued"])
+
+        # Setup running statistics and quantile sketches
+        self.stats = dict()
+        self.sketches = dict()
+        if stats is not None:
+            self.stats = {
+                key: {var: stats_module.RunningStats.from_dict(val) for var, val in bucket.items()}
+                for key, bucket in stats.items()
+            }
+        if sketches is not None:
+            self.sketches = {
+                key: {var: sketch_module.QuantileSketch.from_dict(val) for var, val in bucket.items()}
+                for key, bucket in sketches.items()
+            }
+        if stats is None or sketches is None:
+            self._refresh_stats(self.df.index.append(self.rollup.index))
 
     # @logio(log)
-    def serialize(self):
-        """Serialization of the entire data structure."""
-        result = dict(data=self.df.T.to_dict(orient="split"))
+    def serialize(self, measurements=True):
+        """Serialization of the entire data structure.
+
+        :param measurements: Flag if the measurements (`data`) are included [default: True]
+        :type measurements: bool
+        :return: Key/Value store of the datastore (json serializable)
+        :rtype: dict
+        """
+        result = dict(data=self.df.T.to_dict(orient="split")) if measurements else dict()
         result["lat"] = self.lat
         result["lon"] = self.lon
         result["version"] = self.version
+        result["generation"] = self.generation
+        result["stats"] = {
+            key: {var: val.to_dict() for var, val in bucket.items()} for key, bucket in self.stats.items()
+        }
+        result["sketches"] = {
+            key: {var: val.to_dict() for var, val in bucket.items()} for key, bucket in self.sketches.items()
+        }
+        if self.rollup.index.size > 0:
+            result["rollup"] = self.rollup.T.to_dict(orient="split")
+        if self.forecast_issued is not None:
+            result["forecast"] = dict(
+                version=self.forecast_version,
+                issued=self.forecast_issued,
+                data=self.forecast.T.to_dict(orient="split"),
+            )
+        if self.verified is not None:
+            result["verified"] = self.verified
+        if self.filled.size > 0:
+            result["filled"] = list(self.filled)
         return result
 
+    def fingerprint(self):
+        """Fingerprint of the content of the datastore.
+
+        The fingerprint covers the measurements, daily aggregates, forecast and
+        metadata. The running statistics are derived from the measurements and
+        therefore not included. Equal fingerprints mean that nothing changed.
+
+        :return: Hex digest of the content
+        :rtype: str
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for frame in (self.df, self.rollup, self.forecast):
+            digest.update(",".join(frame.columns).encode())
+            digest.update(frame.index.asi8.tobytes())
+            digest.update(np.ascontiguousarray(frame.to_numpy(dtype=float)).tobytes())
+        meta = (self.version, self.lat, self.lon, self.generation, self.forecast_version, self.forecast_issued)
+        digest.update(repr(meta + (self.verified,)).encode())
+        digest.update(self.filled.asi8.tobytes())
+        return digest.hexdigest()
+
     def check_df(self):
         """Check assumptions about the database and its structure/schema.
 
@@ -69,42 +220,169 @@ class WetterDB:
         assert self.df.index.size > 0
         assert self.df.index[0].tzinfo is not None
 
+    def verify(self, full=False):
+        """Check the content of the measurements for anomalies.
+
+        Only the rows appended since the last verification (the watermark)
+        are checked. Should rows be inserted before the watermark, e.g. by
+        a historical update, the whole datastore is checked again.
+
+        :param full: Flag if the whole datastore should be checked [default: False]
+        :type full: bool
+        :return: Anomalies found in the checked rows
+        :rtype: integrity.Report
+        """
+        start = 0
+        if not full and self.verified is not None:
+            position = self.df.index.searchsorted(self.verified["until"], side="right")
+            if position == self.verified["rows"]:
+                start = position
+        report = integrity.check(self.df, start=start)
+        self.verified = dict(until=self.df.index[-1], rows=self.df.index.size)
+        if not report.ok:
+            log.warning(str(report))
+        return report
+
     def __getattr__(self, name):
         """Get attribute from inner `pd.DataFrame` if not provided by base class.
 
-        The core compoment of the database is the internal `pd.DataFrame`
-        object. This method helps calling the attributes of this core component
-        by using the attributes of the WetterDB. First, the attributes of the
-        WetterDB are returned. Should this result in an error, then the request
-        is delegated to the `pd.DataFrame`. Any error on this level is not catched.
+        The attributes of the WetterDB are fixed (`__slots__`). Any other
+        attribute is delegated to the internal `pd.DataFrame`. This delegation
+        is deprecated, use `df` (or the `wetter.client.WetterClient`) instead.
 
         :param name: Requested attribute name
         :type name: str
         :return: Requested Attribute
         :type: Not clear and based on the request
-        :raises: KeyError
+        :raises: AttributeError
         """
-        try:
-            return self.__dict__[name]
-        except KeyError:
-            return getattr(self.df, name)
+        if name.startswith("_") or name in self.__slots__:
+            # Not (yet) set slot e.g. while unpickling
+            raise AttributeError(name)
+        warnings.warn(f"WetterDB.{name} is deprecated, use WetterDB.df.{name}", DeprecationWarning, stacklevel=2)
+        return getattr(self.df, name)
+
+    def overall_stats(self):
+        """Running statistics of each variable over all measurements.
+
+        :return: Statistics per variable
+        :rtype: dict
+        """
+        return stats_module.overall(self.stats, self.df.columns)
+
+    def _refresh_stats(self, index):
+        """Recalculate the statistics and sketches of all calendar months touched by the timestamps.
+
+        Only the measurements of the touched months are read (the store is sorted).
+        The sketch of a month with compacted measurements is kept, since the
+        daily aggregates do not contain the distribution of the measurements.
+
+        :param index: Timestamps of changed measurements
+        :type index: pd.DatetimeIndex
+        """
+        for key in np.unique(stats_module.bucket_keys(index)):
+            start = pd.Timestamp(f"{key}-01", tz="UTC")
+            end = start + pd.offsets.MonthBegin(1)
+            lo, hi = self.df.index.searchsorted([start, end])
+            window = self.df.iloc[lo:hi]
+            lo, hi = self.rollup.index.searchsorted([start, end])
+            days = self.rollup.iloc[lo:hi]
+            self.stats[key] = dict()
+            if days.index.size == 0 or key not in self.sketches:
+                self.sketches[key] = {
+                    var: sketch_module.QuantileSketch.from_values(window[var].to_numpy()) for var in self.df.columns
+                }
+            for var in self.df.columns:
+                self.stats[key][var] = stats_module.RunningStats.from_values(window[var].to_numpy()).merge(
+                    stats_module.RunningStats.from_aggregates(
+                        days[f"{var}_count"],
+                        days[var],
+                        days[f"{var}_m2"],
+                        days[f"{var}_min"],
+                        days[f"{var}_max"],
+                    )
+                )
+
+    def _push_stats(self, index):
+        """Add new measurements to the statistics and sketches of their calendar months.
+
+        Only the new measurements are read. Their statistics are merged into the
+        running statistics of the month (see `RunningStats.merge`), hence the
+        effort is independent of the number of measurements already in the month.
+
+        :param index: Timestamps of added measurements (not replacing stored ones)
+        :type index: pd.DatetimeIndex
+        """
+        if index.size == 0:
+            return
+        rows = self.df.iloc[self.df.index.searchsorted(index)]
+        keys = stats_module.bucket_keys(index)
+        for key in np.unique(keys):
+            window = rows[keys == key]
+            bucket = self.stats.setdefault(key, dict())
+            sketches = self.sketches.setdefault(key, dict())
+            for var in self.df.columns:
+                values = window[var].to_numpy()
+                bucket[var] = bucket.get(var, stats_module.RunningStats()).push(values)
+                sketch = sketch_module.QuantileSketch.from_values(values)
+                sketches[var] = sketch if var not in sketches else sketches[var].merge(sketch)
+
+    def compact(self, now=None):
+        """Compact measurements older than the retention period into daily aggregates.
+
+        Only the measurements before the cutoff are touched. The latest
+        measurement is never compacted.
+
+        :param now: Current time [default: now()]
+        :type now: datetime.datetime w/ time zone information
+        :return: Number of compacted measurements
+        :rtype: int
+        """
+        if self.retention is None:
+            return 0
+        if now is None:
+            now = utcnow()
+        cutoff = min(retention_module.cutoff(now, self.retention), self.df.index.max())
+        position = self.df.index.searchsorted(cutoff)
+        if position == 0:
+            return 0
+        old = self.df.iloc[:position]
+        self.rollup = retention_module.merge(self.rollup, retention_module.daily(old))
+        self.df = self.df.iloc[position:]
+        # The content changed, results cached by generation are outdated
+        self.generation += 1
+        self.filled = self.filled[self.filled > old.index[-1]]
+        if self.verified is not None and old.index[-1] <= self.verified["until"]:
+            self.verified["rows"] -= position
+        log.info(f"Compacted {position} measurements before {cutoff} into daily aggregates")
+        return position
 
     # @logio(log)
-    def update(self, start=None, end=None, lat=None, lon=None, api=OpenMeteoMeasurements):
+    def update(
+        self, start=None, end=None, lat=None, lon=None, api=OpenMeteoMeasurements, forecast_hours=FORECAST_HOURS
+    ):
         """Update of a database at a given location.
 
+        By default, only the hours after the latest measurement are requested
+        (plus the forecast). APIs supporting hour bounds therefore only send
+        the one or two new hours of an hourly update.
+
+        :param start: Date from which the update should be done [default: hour after latest measurement]
+        :type start: Datetime
+        :param end: Date until which the update should be done [default: now()]
+        :type end: Datetime
         :param api: API to be used for measurement updates
         :type api: APIForWeatherData
-        :param until: Date until which the update should be done [default: now()]
-        :type until: Datetime
-        :return: Latest and updated weather measurements
-        :rtype: pd.DataFrame
-        :raises: Exception (if response status code != 200), AssertionError
+        :param forecast_hours: Number of forecast hours requested after the end date
+        :type forecast_hours: int
+        :return: True if the update was successful (response status code == 200)
+        :rtype: bool
+        :raises: AssertionError
         """
         if end is None:
             end = utcnow()
         if start is None:
-            start = self.df.index.max()
+            start = min(self.df.index.max() + pd.Timedelta(hours=1), pd.Timestamp(end))
         if lat is None:
             lat = self.lat
         if lon is None:
@@ -115,24 +393,219 @@ class WetterDB:
         assert start.tzinfo is not None, "Start date must have a timezone"
         assert issubclass(api, APIForWeatherData), "API must be an APIForWeatherData"
 
-        # Build parameters for query
-        qt = QueryTicket(start=start, end=end, lat=lat, lon=lon)
-
-        # Request data from API
-        resp = api.get(qt)
-        if resp.status_code == 200:
-            json = resp.json()
-            df = api.parse(json)
-            df = df[df.index <= qt.end]  # kick out predictions
-
-            # Merge old and new data as well as eliminate duplicates and prediction data
-            # (Some API provide forecast data which are not of interest for us)
-            df = pd.concat([self.df, df])
-            df = df[~df.index.duplicated(keep="last")]
-            self.df = df
-            self.lat = lat
-            self.lon = lon
-        else:
-            log.error(f"An error occurred during request [{resp.status_code}]: {resp.json()}", exc_info=True)
-            print(f"A connection error occured with the API provider: {resp.status_code} {resp.json()}.")
-            print("Please try again at a later time or change your input.")
+        with tracing.span("update", api=api.__name__) as update_span:
+            # Build parameters for query
+            with tracing.span("ticket"):
+                qt = QueryTicket(start=start, end=end, lat=lat, lon=lon, forecast_hours=forecast_hours)
+
+            resp = self._request(api, qt)
+            update_span.set(status=resp.status_code)
+            if resp.status_code == 200:
+                self._merge(api, resp, qt, lat, lon)
+                return True
+            _report_failure(resp)
+            return False
+
+    def ingest(self, start, end, lat=None, lon=None, api=OpenMeteoArchiveMeasurements, days=365, on_chunk=None):
+        """Update of a database with a long time range (e.g. decades) in chunks.
+
+        The time range is requested in chunks of `days`. The measurements of each
+        chunk are decoded and merged into the datastore right away, after which the
+        chunk is released. Hence, nothing is allocated for the whole range: the
+        memory needed on top of the datastore is a single copy of it (while a chunk
+        is merged) plus the chunk itself. The content of the datastore is checked
+        once after the last chunk.
+
+        :param start: Start date of the measurements to be ingested
+        :type start: datetime.datetime w/ time zone information
+        :param end: End date of the measurements to be ingested
+        :type end: datetime.datetime w/ time zone information
+        :param api: API to be used for measurement updates [default: archive]
+        :type api: APIForWeatherData
+        :param days: Length of a chunk in days
+        :type days: int
+        :param on_chunk: Called with start and end date after each successful chunk e.g. for progress
+        :type on_chunk: function
+        :return: True if all chunks were successful
+        :rtype: bool
+        :raises: AssertionError
+        """
+        if lat is None:
+            lat = self.lat
+        if lon is None:
+            lon = self.lon
+        assert start.tzinfo is not None, "Start date must have a timezone"
+        assert end.tzinfo is not None, "End date must have a timezone"
+        assert issubclass(api, APIForWeatherData), "API must be an APIForWeatherData"
+        first = pd.Timestamp(start).tz_convert("UTC").floor("H")
+        last = pd.Timestamp(end).tz_convert("UTC")
+        generation = self.generation
+        success = True
+
+        with tracing.span("ingest", api=api.__name__, days=days) as sp:
+            for chunk_start, chunk_end in date_chunks(start, end, days=days):
+                qt = QueryTicket(start=chunk_start, end=chunk_end, lat=lat, lon=lon)
+                resp = self._request(api, qt)
+                if resp.status_code != 200:
+                    _report_failure(resp)
+                    success = False
+                    continue
+                with tracing.span("decode", bytes=len(resp.content)) as chunk:
+                    df = api.decode(resp.content)[self.df.columns]
+                    chunk.set(rows=len(df))
+                del resp
+                # The archive answers with whole days
+                self._integrate(df[(df.index >= first) & (df.index <= last)], lat, lon, check=False)
+                del df
+                if on_chunk is not None:
+                    on_chunk(chunk_start, chunk_end)
+            # All chunks are a single new version of the content
+            self.generation = min(self.generation, generation + 1)
+            sp.set(rows=len(self.df), generation=self.generation)
+            with tracing.span("verify") as check:
+                report = self.verify()
+                check.set(rows=report.rows, **report.counts())
+        return success
+
+    def _fill_gaps(self, index):
+        """Interpolate the gaps around new measurements (see `gaps.regularize`).
+
+        :param index: Timestamps of the new measurements
+        :type index: pd.DatetimeIndex
+        :return: Hours which were interpolated
+        :rtype: pd.DatetimeIndex
+        """
+        # The gaps next to the new measurements are bounded by their neighbours
+        lo, hi = self.df.index.searchsorted([index.min(), index.max()])
+        lo, hi = max(lo - 1, 0), min(hi + 2, self.df.index.size)
+        region, flags = gaps.regularize(self.df.iloc[lo:hi], limit=self.gap_limit)
+        hours = flags.index[flags.any(axis=1).to_numpy()]
+        if hours.size > 0:
+            self.df = pd.concat([self.df.iloc[:lo], region, self.df.iloc[hi:]])
+            self.filled = self.filled.union(hours)
+            log.info(f"Interpolated {hours.size} missing hours between {region.index[0]} and {region.index[-1]}")
+        return hours
+
+    def _request(self, api, qt):
+        """Request measurements from the API (traced and measured)."""
+        with tracing.span("request", api=api.__name__) as sp:
+            start_request = time.perf_counter()
+            resp = api.get(qt)
+            duration = time.perf_counter() - start_request
+            sp.set(status=resp.status_code, bytes=len(resp.content))
+        metrics.API_REQUESTS.inc(api=api.__name__, status=resp.status_code)
+        metrics.API_LATENCY.observe(duration, api=api.__name__, status=resp.status_code)
+        metrics.API_BYTES.observe(len(resp.content), api=api.__name__)
+        log.info(f"Received {len(resp.content)} bytes from {api.__name__} for {qt.start} - {qt.end}")
+        return resp
+
+    def _merge(self, api, resp, qt, lat, lon):
+        """Decode a successful response and merge it into the datastore."""
+        with tracing.span("decode", bytes=len(resp.content)) as sp:
+            df = api.decode(resp.content)
+            sp.set(rows=len(df))
+
+        # Some API provide forecast data. These replace the forecast table.
+        # Hours after the ticket of other APIs (e.g. whole days of the archive) are measurements.
+        with tracing.span("forecast") as sp:
+            forecast = df.iloc[:0]
+            if getattr(api, "FORECAST", False) and qt.forecast_hours > 0:
+                forecast = df[df.index > qt.end]
+                df = df[df.index <= qt.end]
+            if forecast.index.size > 0 and not forecast.equals(self.forecast):
+                self.forecast = forecast
+                self.forecast_version += 1
+                self.forecast_issued = pd.Timestamp(qt.end)
+            sp.set(rows=len(forecast), version=self.forecast_version)
+        self._integrate(df, lat, lon)
+
+    def _integrate(self, new, lat, lon, check=True):
+        """Merge new measurements into the datastore and refresh statistics, rollup and watermark.
+
+        :param check: Flag if the content should be verified afterwards [default: True]
+        :type check: bool
+        """
+        if self.rollup.index.size > 0:
+            # Measurements of compacted days are already part of the rollup (e.g. overlapping historical update)
+            boundary = min(self.rollup.index.max() + pd.Timedelta(days=1), self.df.index.min())
+            if new.index.size > 0 and new.index.min() < boundary:
+                log.info(f"Ignoring {int((new.index < boundary).sum())} measurements of compacted days")
+                new = new[new.index >= boundary]
+        # Merge old and new data as well as eliminate duplicates
+        with tracing.span("merge", rows=len(new)) as sp:
+            metrics.ROWS_INGESTED.inc(len(new))
+            # New measurements without overlap (e.g. a chunk of a historical ingest) are inserted with a single copy
+            position = self.df.index.searchsorted(new.index.min()) if new.index.size > 0 else 0
+            inserted = set(new.columns) == set(self.df.columns) and _fits_between(self.df.index, new.index, position)
+            # Nothing changed e.g. a second update within the same hour
+            changed = lat != self.lat or lon != self.lon or inserted or not self.df.reindex(new.index).equals(new)
+            if changed:
+                if inserted:
+                    replaced = new.index[:0]
+                    values = np.insert(self.df.to_numpy(dtype=float), position, new[self.df.columns].to_numpy(), axis=0)
+                    index = self.df.index[:position].append([new.index, self.df.index[position:]])
+                    df = pd.DataFrame(values, index=index, columns=self.df.columns)
+                else:
+                    new = new[~new.index.duplicated(keep="last")]
+                    replaced = _stored(self.df.index, new.index)
+                    df = pd.concat([self.df, new])
+                    df = df[~df.index.duplicated(keep="last")]
+                    if not df.index.is_monotonic_increasing:
+                        df = df.sort_index()
+                self.df = df
+                self.lat = lat
+                self.lon = lon
+                self.generation += 1
+            sp.set(total=len(self.df), generation=self.generation, changed=changed)
+        if changed:
+            # Real measurements replace interpolated ones
+            self.filled = self.filled.difference(new.index)
+            added = new.index.difference(replaced)
+            if self.gap_limit is not None:
+                with tracing.span("fill", limit=self.gap_limit) as sp:
+                    filled = self._fill_gaps(new.index)
+                    added = added.union(filled)
+                    sp.set(filled=filled.size)
+            with tracing.span("stats", rows=len(new)):
+                # Months with replaced measurements are recalculated, added ones are pushed into the months
+                self._refresh_stats(replaced)
+                self._push_stats(added[~np.isin(stats_module.bucket_keys(added), stats_module.bucket_keys(replaced))])
+        with tracing.span("compact") as sp:
+            before = len(self.df)
+            self.compact()
+            sp.set(compacted=before - len(self.df))
+        if not check:
+            return
+        with tracing.span("verify") as sp:
+            report = self.verify()
+            sp.set(rows=report.rows, **report.counts())
+
+
+def _fits_between(index, new, position):
+    """Check if sorted unique timestamps fit between two neighbours of a sorted index without overlap."""
+    if new.size == 0 or not new.is_monotonic_increasing or not new.is_unique:
+        return False
+    return position == index.size or new[-1] < index[position]
+
+
+def _stored(index, new):
+    """Return the timestamps which are already part of a sorted index (binary search instead of a hash table)."""
+    if index.size == 0:
+        return new[:0]
+    positions = np.minimum(index.searchsorted(new), index.size - 1)
+    return new[index[positions] == new]
+
+
+def _report_failure(resp):
+    """Log and print a failed request."""
+    log.error(f"An error occurred during request [{resp.status_code}]: {resp.json()}", exc_info=True)
+    print(f"A connection error occured with the API provider: {resp.status_code} {resp.json()}.")
+    print("Please try again at a later time or change your input.")
+
+
+def _frame_from_split(raw):
+    """Create `pd.DataFrame` from json `split` format (variables as rows)."""
+    measurements = {raw["index"][i]: raw["data"][i] for i in range(0, len(raw["data"]))}
+    df = pd.DataFrame({"time": raw["columns"], **measurements})
+    df = df.set_index("time")
+    return df
@@ -5,11 +5,29 @@ Most of them share the same parameter space with `df` for the DataFrame used
 as `pandas` and a `date` object used for context. Some functions might define
 additional parameters for context. All of these functions share the same
 output type. This allows the chaining of queries.
+
+The windowed queries optionally accept the daily aggregates (`rollup`) of
+measurements compacted by the retention policy. Days of the rollup within the
+window are added to the selection together with a `count` column holding
+the number of measured hours of each row and a `{var}_count` column holding
+the number of valid measurements of each variable. Use `average` and `size` for
+calculations which are correct on both, plain and rollup-aware selections.
+
+For ad-hoc queries there is the lazy `Query` builder. Its methods only record
+the requested steps. They are compiled into a single pass over the (sorted)
+measurements when the result is collected. Gaps of the selection can be
+interpolated lazily with `Query.fill` (see `wetter.backend.gaps`).
 """
 import logging
 from datetime import datetime as dt
 from datetime import timedelta
 
+import numpy as np
+import pandas as pd
+
+from wetter.backend import gaps
+from wetter.backend.retention import COUNT, SUFFIXES
+from wetter.backend.sketch import QuantileSketch, merge_all
 from wetter.tools import logio
 
 log = logging.getLogger(__name__)
@@ -37,8 +55,12 @@ def latest_datapoint(df, date):
     return result
 
 
+def _latest_datapoint_bounds(date):
+    return None, date - timedelta(microseconds=1)
+
+
 @logio(log)
-def last_week(df, date):
+def last_week(df, date, rollup=None):
     """Retrieve all measurements within a week before a certain date (excluding).
 
     Returns the measurements of one week earlier than a specific date.
@@ -48,29 +70,43 @@ def last_week(df, date):
     :type df: pandas.DataFrame
     :param date: Upper limit for search of latest measurement
     :type date: datetime.datetime w/ time zone information
+    :param rollup: Daily aggregates of compacted measurements [default: None]
+    :type rollup: pandas.DataFrame
     :return: The latest measurement
     :rtype: pandas.DataFrame
     :raises: AssertionError
     """
     assert date.tzinfo is not None
-    threshold = date - timedelta(days=7)
-    result = _windowed_selection(df, threshold, date)
+    start, end = _last_week_bounds(date)
+    result = _windowed_selection(df, start, end, rollup)
     return result
 
 
+def _last_week_bounds(date):
+    return date - timedelta(days=7), date
+
+
 @logio(log)
-def last_month(df, date):
+def last_month(df, date, rollup=None):
     """Retrieve all measurements of last month.
 
     :param df: Database with all measurements
     :type df: pandas.DataFrame
     :param date: Date used as context to define last month
     :type date: datetime.datetime w/ time zone information
+    :param rollup: Daily aggregates of compacted measurements [default: None]
+    :type rollup: pandas.DataFrame
     :return: The latest measurement
     :rtype: pandas.DataFrame
     :raises: AssertionError
     """
     assert date.tzinfo is not None
+    start, end = _last_month_bounds(date)
+    result = _windowed_selection(df, start, end, rollup)
+    return result
+
+
+def _last_month_bounds(date):
     if date.month != 1:
         year, month = (date.year, date.month - 1)
     else:
@@ -78,8 +114,25 @@ def last_month(df, date):
     start = dt(year=year, month=month, day=1, tzinfo=date.tzinfo)
     days_of_month = _calc_days_of_month(start)
     end = start.replace(month=start.month, day=days_of_month, hour=23, minute=59, second=59)
-    result = _windowed_selection(df, start, end)
-    return result
+    return start, end
+
+
+@logio(log)
+def next_hours(df, date, hours=24):
+    """Retrieve all measurements (or forecasts) within the hours after a certain date.
+
+    :param df: Database with all measurements or forecasts
+    :type df: pandas.DataFrame
+    :param date: Lower limit of the selection (excluded)
+    :type date: datetime.datetime w/ time zone information
+    :param hours: Number of hours after the date
+    :type hours: int
+    :return: Measurements within the hours after the date
+    :rtype: pandas.DataFrame
+    :raises: AssertionError
+    """
+    assert date.tzinfo is not None
+    return df[(df.index > date) & (df.index <= date + timedelta(hours=hours))]
 
 
 # Pandas allows for easy selection of month/year by using
@@ -88,26 +141,33 @@ def last_month(df, date):
 # time zone. The following implementation actually considers
 # timezones and selects data accordingly.
 @logio(log)
-def last_year(df, date):
+def last_year(df, date, rollup=None):
     """Retrieve all measurements of last year.
 
     :param df: Database with all measurements
     :type df: pandas.DataFrame
     :param date: Date used as context to define last year
     :type date: datetime.datetime w/ time zone information
+    :param rollup: Daily aggregates of compacted measurements [default: None]
+    :type rollup: pandas.DataFrame
     :return: The latest measurement
     :rtype: pandas.DataFrame
     :raises: AssertionError
     """
     assert date.tzinfo is not None
+    start, end = _last_year_bounds(date)
+    result = _windowed_selection(df, start, end, rollup)
+    return result
+
+
+def _last_year_bounds(date):
     start = dt(year=date.year - 1, month=1, day=1, tzinfo=date.tzinfo)
     end = start.replace(year=date.year) - timedelta(seconds=1)
-    result = _windowed_selection(df, start, end)
-    return result
+    return start, end
 
 
 @logio(log)
-def specific_month(df, date, month):
+def specific_month(df, date, month, rollup=None):
     """Retrieve all measurements of a specific month.
 
     The month will be calculated relative to the given date. Is the month
@@ -119,25 +179,211 @@ def specific_month(df, date, month):
     :type df: pandas.DataFrame
     :param date: Date used as context to define if month already past this year
     :type date: datetime.datetime w/ time zone information
+    :param rollup: Daily aggregates of compacted measurements [default: None]
+    :type rollup: pandas.DataFrame
     :return: The latest measurement
     :rtype: pandas.DataFrame
     :raises: AssertionError
     """
     assert date.tzinfo is not None
+    start, end = _specific_month_bounds(date, month)
+    result = _windowed_selection(df, start, end, rollup)
+    return result
+
+
+def _specific_month_bounds(date, month):
     year = date.year if date.month > month else date.year - 1
     start = dt(year=year, month=month, day=1, tzinfo=date.tzinfo)
     days_of_month = _calc_days_of_month(start)
     end = start.replace(month=start.month, day=days_of_month, hour=23, minute=59, second=59)
-    result = _windowed_selection(df, start, end)
-    return result
+    return start, end
 
 
 @logio(log)
-def _windowed_selection(df, start, end):
+def compare_all(df, date, rollup=None):
+    """Aggregate the measurements of last week, last month and last year at once.
+
+    The union of all windows is selected once. It is split at the borders of
+    the windows into segments which are aggregated in a single vectorized pass.
+    The aggregates of each window are then combined from its segments.
+    Days of the rollup are weighted by their number of valid measurements.
+
+    :param df: Database with all measurements
+    :type df: pandas.DataFrame
+    :param date: Date used as context to define the windows
+    :type date: datetime.datetime w/ time zone information
+    :param rollup: Daily aggregates of compacted measurements [default: None]
+    :type rollup: pandas.DataFrame
+    :return: Start, end, number of measurements as well as mean, min and max
+        of each variable (columns) for each window (rows `week`, `month`, `year`)
+    :rtype: pandas.DataFrame
+    :raises: AssertionError
+    """
+    assert date.tzinfo is not None
+    bounds = _compare_all_bounds(date)
+    start = min(start for start, _ in bounds)
+    end = max(end for _, end in bounds)
+    variables = list(df.columns)
+
+    # Union of all windows as arrays of means, weights, minima and maxima
+    raw = _slice(df, start, end)
+    days = None if rollup is None or rollup.index.size == 0 else _slice(rollup, start, end)
+
+    def column(name, values):
+        if days is None:
+            return values
+        return np.concatenate([days[name].to_numpy(dtype=float), values])
+
+    times = raw.index if days is None else days.index.append(raw.index)
+    weights = column(COUNT, raw.notna().any(axis=1).to_numpy(dtype=float))
+    order = None if times.is_monotonic_increasing else np.argsort(times.asi8, kind="stable")
+    if order is not None:
+        times, weights = times[order], weights[order]
+    means, counts, columns = dict(), dict(), dict()
+    for var in variables:
+        values = raw[var].to_numpy(dtype=float)
+        means[var], lows, highs = (column(name, values) for name in (var, f"{var}_min", f"{var}_max"))
+        counts[var] = column(f"{var}_count", (~np.isnan(values)).astype(float))
+        if order is not None:
+            means[var], lows, highs, counts[var] = means[var][order], lows[order], highs[order], counts[var][order]
+        columns[var] = (lows, highs)
+
+    # Split the union into segments at all borders and aggregate each segment
+    positions = [_positions(times, start, end) for start, end in bounds]
+    edges = np.unique(np.concatenate([[0], np.ravel(positions)]))
+    edges = edges[edges < times.size]
+    segments = dict(count=np.add.reduceat(weights, edges) if edges.size > 0 else np.empty(0))
+    for var in variables:
+        valid = ~np.isnan(means[var])
+        lows, highs = columns[var]
+        if edges.size == 0:
+            segments[var] = (np.empty(0),) * 4
+            continue
+        segments[var] = (
+            np.add.reduceat(np.where(valid, means[var] * counts[var], 0), edges),
+            np.add.reduceat(np.where(valid, counts[var], 0), edges),
+            np.fmin.reduceat(lows, edges),
+            np.fmax.reduceat(highs, edges),
+        )
+
+    # Combine the segments of each window
+    result = dict()
+    for name, (start, end), (lo, hi) in zip(("week", "month", "year"), bounds, positions):
+        first, last = np.searchsorted(edges, lo), np.searchsorted(edges, hi)
+        row = dict(start=start, end=end, count=float(segments["count"][first:last].sum()))
+        for var in variables:
+            sums, counts, lows, highs = (values[first:last] for values in segments[var])
+            total = counts.sum()
+            row[f"{var}_mean"] = sums.sum() / total if total > 0 else np.nan
+            row[f"{var}_min"] = np.nanmin(lows) if total > 0 else np.nan
+            row[f"{var}_max"] = np.nanmax(highs) if total > 0 else np.nan
+        result[name] = row
+    return pd.DataFrame.from_dict(result, orient="index")
+
+
+def _compare_all_bounds(date):
+    return [_last_week_bounds(date), _last_month_bounds(date), _last_year_bounds(date)]
+
+
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+@logio(log)
+def percentiles(df, start, end, sketches, qs=QUANTILES):
+    """Calculate quantiles of each variable within an arbitrary long time period.
+
+    Calendar months (UTC) fully within the period are answered by merging
+    their quantile sketches. Only the measurements of the partially covered
+    months at both borders are read. For the error bound see `wetter.backend.sketch`.
+
+    :param df: Database with all measurements
+    :type df: pandas.DataFrame
+    :param start: Start date of time period (included)
+    :type start: datetime.datetime w/ time zone information
+    :param end: End date of time period (included)
+    :type end: datetime.datetime w/ time zone information
+    :param sketches: Quantile sketches per calendar month and variable
+    :type sketches: dict
+    :param qs: Probabilities between 0 and 1 [default: p10, p50, p90]
+    :type qs: tuple of float
+    :return: Quantiles (columns e.g. `p10`) and number of measurements (`count`) per variable
+    :rtype: pandas.DataFrame
+    :raises: AssertionError
+    """
+    assert start.tzinfo is not None
+    assert end.tzinfo is not None
+    start, end = _round_to_hours(start, end)
+    first = start.normalize().replace(day=1)
+    if first < start:
+        first = first + pd.offsets.MonthBegin(1)
+    # Months are covered completely if their last hour is within the period
+    stop = (end + pd.Timedelta(hours=1)).normalize().replace(day=1)
+    if first < stop:
+        months = pd.date_range(first, stop, freq="MS", inclusive="left").strftime("%Y-%m")
+        edges = [_slice(df, start, first - pd.Timedelta(hours=1)), _slice(df, stop, end)]
+    else:
+        months = []
+        edges = [_slice(df, start, end)]
+    result = dict()
+    for var in df.columns:
+        parts = [sketches[month][var] for month in months if month in sketches]
+        parts += [QuantileSketch.from_values(edge[var].to_numpy()) for edge in edges]
+        merged = merge_all(parts)
+        row = {f"p{round(q * 100):d}": value for q, value in zip(qs, merged.quantiles(qs))}
+        row[COUNT] = merged.count
+        result[var] = row
+    return pd.DataFrame.from_dict(result, orient="index")
+
+
+_BOUNDS = {
+    "compare_all": _compare_all_bounds,
+    "latest_datapoint": _latest_datapoint_bounds,
+    "last_week": _last_week_bounds,
+    "last_month": _last_month_bounds,
+    "last_year": _last_year_bounds,
+    "specific_month": _specific_month_bounds,
+}
+
+
+def window(func, date, **kwargs):
+    """Return the hourly measurement slots a query selects.
+
+    The measurements are saved on full (UTC) hours. Therefore the start of
+    the window is rounded up and the end is rounded down to the next full hour.
+    Two calls with the same window select the same measurements on an
+    unchanged store. This is used as key for caching query results.
+
+    :param func: Query function of this module e.g. `last_week`
+    :type func: function
+    :param date: Date used as context for the query
+    :type date: datetime.datetime w/ time zone information
+    :param kwargs: Additional parameters of the query e.g. `month`
+    :type kwargs: dict
+    :return: First and last hourly slot (both included, None for unbounded)
+        of each window of the query
+    :rtype: tuple of pd.Timestamp
+    :raises: AssertionError, KeyError
+    """
+    assert date.tzinfo is not None
+    bounds = _BOUNDS[func.__name__](date, **kwargs)
+    if isinstance(bounds, list):
+        return tuple(border for start, end in bounds for border in _round_to_hours(start, end))
+    return _round_to_hours(*bounds)
+
+
+def _round_to_hours(start, end):
+    start = None if start is None else pd.Timestamp(start).tz_convert("UTC").ceil("H")
+    end = pd.Timestamp(end).tz_convert("UTC").floor("H")
+    return start, end
+
+
+@logio(log)
+def _windowed_selection(df, start, end, rollup=None):
     """Select a time period in database considering time zones.
 
     This function takes the timezone into consideration when selecting data.
-    Both borders are included in the data selection.
+    Both borders are included in the data selection. Days of the rollup are
+    selected if the start of the day (UTC) is within the time period.
 
     :param df: Database with all measurements
     :type df: pandas.DataFrame
@@ -145,10 +391,215 @@ def _windowed_selection(df, start, end):
     :type start: datetime.datetime w/ time zone information
     :param end: End date of time period
     :type end: datetime.datetime w/ time zone information
+    :param rollup: Daily aggregates of compacted measurements [default: None]
+    :type rollup: pandas.DataFrame
+    """
+    result = _slice(df, start, end)
+    if rollup is None or rollup.index.size == 0:
+        return result
+    days = rollup[(rollup.index <= end) & (rollup.index >= start)]
+    if days.index.size == 0:
+        return result
+    counts = [f"{var}_count" for var in df.columns]
+    days = days[list(df.columns) + counts + [COUNT]]
+    valid = result.notna()
+    hours = result.assign(**{f"{var}_count": valid[var].astype(float) for var in df.columns})
+    hours[COUNT] = valid.any(axis=1).astype(float)
+    return pd.concat([days, hours]).sort_index()
+
+
+def average(window):
+    """Calculate the average of each variable of a selection.
+
+    Rows of daily aggregates are weighted by their number of valid measurements
+    of the variable (`{var}_count`, otherwise `count`). Missing values (NaN) are ignored.
+
+    :param window: Selection of measurements
+    :type window: pandas.DataFrame
+    :return: Average of each variable
+    :rtype: pandas.Series
+    """
+    if COUNT not in window.columns:
+        return window.mean()
+    result = dict()
+    for var in [col for col in window.columns if col != COUNT and not col.endswith(SUFFIXES)]:
+        weights = window[f"{var}_count"] if f"{var}_count" in window.columns else window[COUNT]
+        weights = weights.where(window[var].notna(), 0.0)
+        total = weights.sum()
+        result[var] = (window[var].fillna(0.0) * weights).sum() / total if total > 0 else np.nan
+    return pd.Series(result, dtype=float)
+
+
+def size(window):
+    """Return the number of measured hours in a selection (incl. compacted measurements).
+
+    Hours without any valid measurement (all NaN) are not counted.
+
+    :param window: Selection of measurements
+    :type window: pandas.DataFrame
+    :rtype: int
+    """
+    if COUNT not in window.columns:
+        return int(window.notna().any(axis=1).sum())
+    return int(window[COUNT].sum())
+
+
+def _slice(df, start, end):
+    """Select the rows of a time period (both borders included).
+
+    A sorted index is sliced using binary search without scanning all rows.
+    Otherwise, all rows are compared with the borders.
     """
+    if df.index.is_monotonic_increasing:
+        lo, hi = _positions(df.index, start, end)
+        return df.iloc[lo:hi]
     return df[(df.index <= end) & (df.index >= start)]
 
 
+def _positions(index, start, end):
+    lo = 0 if start is None else index.searchsorted(start, side="left")
+    hi = index.size if end is None else index.searchsorted(end, side="right")
+    return lo, max(lo, hi)
+
+
+class Query:
+    """Lazy and chainable query on measurements.
+
+    Each method returns a new query with an additional step. Nothing is
+    executed until `collect` is called. The steps are then compiled into a
+    plan: all windows are intersected and all variable selections are
+    combined. The plan is executed in a single pass. On a sorted index,
+    the window is found by binary search and the rows are sliced without copy.
+    Resampling and aggregation are applied on the selection only.
+
+    Example: `Query(df).window(start, end).variables("temperature").resample("D").agg("max").collect()`
+
+    :param df: Database with all measurements
+    :type df: pandas.DataFrame
+    """
+
+    def __init__(self, df, steps=()):
+        self.df = df
+        self.steps = tuple(steps)
+
+    def window(self, start=None, end=None):
+        """Restrict to measurements between start and end (both included, None for unbounded)."""
+        assert start is None or start.tzinfo is not None, "Start date must have a timezone"
+        assert end is None or end.tzinfo is not None, "End date must have a timezone"
+        return Query(self.df, self.steps + (("window", (start, end)),))
+
+    def variables(self, *names):
+        """Restrict to the given variables e.g. `temperature`."""
+        assert len(names) > 0, "At least one variable is necessary."
+        missing = set(names) - set(self.df.columns)
+        assert len(missing) == 0, f"Unknown variables {missing}"
+        return Query(self.df, self.steps + (("variables", names),))
+
+    def fill(self, limit=gaps.LIMIT, flag=False):
+        """Interpolate gaps of at most `limit` hours (see `wetter.backend.gaps`).
+
+        Measurements up to `limit` hours outside the window are considered,
+        hence gaps at the borders of the window are filled as well.
+        With `flag` a boolean column `filled` marks the interpolated hours.
+        """
+        assert not any(step == "fill" for step, _ in self.steps), "Query can only be filled once."
+        return Query(self.df, self.steps + (("fill", (limit, flag)),))
+
+    def resample(self, rule):
+        """Group measurements into periods of a `pandas` frequency e.g. `D` or `M`."""
+        assert not any(step == "resample" for step, _ in self.steps), "Query can only be resampled once."
+        return Query(self.df, self.steps + (("resample", rule),))
+
+    def agg(self, func):
+        """Aggregate (each period) with a function e.g. `mean`, `min`, `max`, `sum` or `count`."""
+        assert not any(step == "agg" for step, _ in self.steps), "Query can only be aggregated once."
+        return Query(self.df, self.steps + (("agg", func),))
+
+    def plan(self):
+        """Compile the recorded steps into a plan.
+
+        :return: Window, variables, resampling rule and aggregation function
+        :rtype: dict
+        """
+        plan = dict(start=None, end=None, variables=list(self.df.columns), fill=None, resample=None, agg=None)
+        for step, arg in self.steps:
+            if step == "window":
+                start, end = arg
+                if start is not None:
+                    plan["start"] = start if plan["start"] is None else max(plan["start"], start)
+                if end is not None:
+                    plan["end"] = end if plan["end"] is None else min(plan["end"], end)
+            elif step == "variables":
+                plan["variables"] = [var for var in arg if var in plan["variables"]]
+            elif step == "fill":
+                plan["fill"] = arg
+            elif step == "resample":
+                plan["resample"] = arg
+            elif step == "agg":
+                plan["agg"] = arg
+        assert plan["resample"] is None or plan["agg"] is not None, "Resampling requires an aggregation."
+        return plan
+
+    def explain(self):
+        """Describe the plan of the query without executing it.
+
+        :rtype: str
+        """
+        plan = self.plan()
+        index = self.df.index
+        lines = [f"Query on {index.size} measurements of {list(self.df.columns)}"]
+        if plan["start"] is None and plan["end"] is None:
+            lines.append("1. select all rows")
+        elif index.is_monotonic_increasing:
+            lo, hi = _positions(index, plan["start"], plan["end"])
+            lines.append(f"1. slice rows [{lo}:{hi}] found by binary search ({plan['start']} <= time <= {plan['end']})")
+        else:
+            lines.append(f"1. scan all rows for {plan['start']} <= time <= {plan['end']} (index not sorted)")
+        lines.append(f"2. select variables {plan['variables']}")
+        if plan["fill"] is not None:
+            lines.append(f"2a. interpolate gaps of at most {plan['fill'][0]} hours")
+        if plan["resample"] is not None:
+            lines.append(f"3. resample to {plan['resample']} and aggregate with {plan['agg']}")
+        elif plan["agg"] is not None:
+            lines.append(f"3. aggregate with {plan['agg']}")
+        return "\n".join(lines)
+
+    def collect(self):
+        """Execute the query.
+
+        :return: Selected (and aggregated) measurements. An aggregation without
+            resampling returns a single row labeled with the first selected timestamp.
+        :rtype: pandas.DataFrame
+        """
+        plan = self.plan()
+        if plan["fill"] is None:
+            result = _slice(self.df, plan["start"], plan["end"])[plan["variables"]]
+        else:
+            result = self._fill(plan)
+        if plan["resample"] is not None:
+            return result.resample(plan["resample"]).agg(plan["agg"])
+        if plan["agg"] is not None:
+            label = result.index[:1] if result.index.size > 0 else pd.DatetimeIndex([plan["start"]], name="time")
+            return pd.DataFrame([result.agg(plan["agg"])], index=label)
+        return result
+
+    def _fill(self, plan):
+        limit, flag = plan["fill"]
+        margin = gaps.FREQUENCY * limit
+        start = None if plan["start"] is None else plan["start"] - margin
+        end = None if plan["end"] is None else plan["end"] + margin
+        selection = _slice(self.df, start, end)[plan["variables"]]
+        if not selection.index.is_monotonic_increasing:
+            selection = selection.sort_index()
+        result, filled = gaps.regularize(selection, limit=limit)
+        if flag:
+            result = result.assign(filled=filled.any(axis=1))
+        return _slice(result, plan["start"], plan["end"])
+
+    def __repr__(self):
+        return self.explain()
+
+
 @logio(log)
 def _calc_days_of_month(date):
     """Calculate the day of the month for a specific date.
@@ -0,0 +1,116 @@
+"""Retention policy of the measurements to bound the growth of the datastore.
+
+Hourly measurements are kept for a configurable number of years. Older
+measurements are compacted into daily (UTC) aggregates. The aggregates keep
+the count, mean, sum of squared differences from the mean, minimum and
+maximum of each variable. This way averages, running statistics and
+extremes can still be calculated correctly from the compacted days.
+
+The daily aggregates (the rollup) are a `pd.DataFrame` indexed by the start of
+the day. The mean of a variable uses the name of the variable. The other
+aggregates use the suffixes `_count` (number of valid i.e. non-NaN
+measurements of the variable), `_m2`, `_min` and `_max`. The number of hours
+with at least one valid measurement per day is saved in the `count` column.
+"""
+import numpy as np
+import pandas as pd
+
+COUNT = "count"
+SUFFIXES = ("_count", "_m2", "_min", "_max")
+
+
+def columns(variables):
+    """Return the columns of a rollup for the given variables."""
+    return [f"{var}{suffix}" for var in variables for suffix in ("",) + SUFFIXES] + [COUNT]
+
+
+def empty(variables):
+    """Return a rollup without any days."""
+    index = pd.DatetimeIndex([], tz="UTC", name="time")
+    return pd.DataFrame({col: pd.Series(dtype=float) for col in columns(variables)}, index=index)
+
+
+def cutoff(now, years):
+    """Return the start of the (UTC) day until which measurements are compacted.
+
+    :param now: Current time
+    :type now: datetime.datetime w/ time zone information
+    :param years: Number of years hourly measurements are kept
+    :type years: int
+    :rtype: pd.Timestamp
+    """
+    now = pd.Timestamp(now).tz_convert("UTC")
+    return (now - pd.DateOffset(years=years)).floor("D")
+
+
+def daily(df):
+    """Aggregate hourly measurements into daily (UTC) aggregates.
+
+    :param df: Hourly measurements
+    :type df: pd.DataFrame
+    :return: Daily aggregates
+    :rtype: pd.DataFrame
+    """
+    days = df.index.tz_convert("UTC").floor("D")
+    groups = df.groupby(days)
+    result = dict()
+    for var in df.columns:
+        count = groups[var].count()
+        result[var] = groups[var].mean()
+        result[f"{var}_count"] = count.astype(float)
+        result[f"{var}_m2"] = groups[var].var(ddof=0) * count
+        result[f"{var}_min"] = groups[var].min()
+        result[f"{var}_max"] = groups[var].max()
+    result[COUNT] = df.notna().any(axis=1).groupby(days).sum().astype(float)
+    result = pd.DataFrame(result)
+    result.index.name = "time"
+    return result
+
+
+def upgrade(rollup, variables):
+    """Add the valid counts per variable to a rollup of an older version.
+
+    Older rollups only hold the number of hours per day, which is the best
+    estimate of the number of valid measurements of each variable.
+
+    :param rollup: Daily aggregates
+    :type rollup: pd.DataFrame
+    :param variables: Names of the variables
+    :type variables: list of str
+    :rtype: pd.DataFrame
+    """
+    missing = {f"{var}_count": rollup[COUNT] for var in variables if f"{var}_count" not in rollup.columns}
+    if len(missing) == 0:
+        return rollup
+    return rollup.assign(**missing)[columns(variables)]
+
+
+def merge(first, second):
+    """Merge two rollups (days in both are combined like running statistics).
+
+    :param first: Daily aggregates
+    :type first: pd.DataFrame
+    :param second: Daily aggregates
+    :type second: pd.DataFrame
+    :return: Merged daily aggregates
+    :rtype: pd.DataFrame
+    """
+    both = first.index.intersection(second.index)
+    result = pd.concat([first, second.drop(both)]).sort_index()
+    if both.size == 0:
+        return result
+    a, b = first.loc[both], second.loc[both]
+    for var in [col for col in first.columns if col != COUNT and not col.endswith(SUFFIXES)]:
+        # Variables without valid measurements on one side (mean and m2 NaN) do not contribute
+        na, nb = a[f"{var}_count"], b[f"{var}_count"]
+        count = na + nb
+        ma, mb = a[var].where(na > 0, 0.0), b[var].where(nb > 0, 0.0)
+        delta = mb - ma
+        result.loc[both, var] = (ma * na + mb * nb) / count
+        m2 = a[f"{var}_m2"].where(na > 0, 0.0) + b[f"{var}_m2"].where(nb > 0, 0.0) + delta**2 * na * nb / count
+        result.loc[both, f"{var}_count"] = count
+        result.loc[both, f"{var}_m2"] = m2
+        result.loc[both, f"{var}_min"] = np.fmin(a[f"{var}_min"], b[f"{var}_min"])
+        result.loc[both, f"{var}_max"] = np.fmax(a[f"{var}_max"], b[f"{var}_max"])
+    result.loc[both, COUNT] = a[COUNT] + b[COUNT]
+    return result
@@ -0,0 +1,110 @@
+"""Rolling analytics of the measurements.
+
+Moving averages, minima and maxima over the last 24 hours, 7 days or 30 days
+as well as rolling z-scores for the detection of anomalies. The windows are
+computed with the moving window functions of `bottleneck` in a single pass
+over contiguous arrays. Each variable is a row of the array, hence the values
+of `WetterDB.df` (a single block of floats) are used without copy.
+
+The windows are defined in hours. Missing hours are considered by placing
+the measurements on an hourly grid first. A value is calculated if at least
+`MIN_FRACTION` of the hours of its window were measured.
+"""
+import logging
+
+import bottleneck as bn
+import numpy as np
+import pandas as pd
+
+from wetter.backend.gaps import FREQUENCY
+
+log = logging.getLogger(__name__)
+
+# Length of the windows in hours
+WINDOWS = {"24h": 24, "7d": 7 * 24, "30d": 30 * 24}
+STATISTICS = {"mean": bn.move_mean, "min": bn.move_min, "max": bn.move_max, "std": bn.move_std}
+MIN_FRACTION = 0.5
+# Absolute z-score from which a measurement is an anomaly
+THRESHOLD = 3.0
+
+
+def _hourly(df):
+    """Return the measurements as contiguous array (variables x hours) on an hourly grid."""
+    index = df.index
+    if index.size > 1 and (index[-1] - index[0]) // FREQUENCY + 1 != index.size:
+        df = df.reindex(pd.date_range(index[0], index[-1], freq=FREQUENCY, name=index.name))
+    return df.index, np.ascontiguousarray(df.to_numpy(dtype=float).T)
+
+
+def _window(window):
+    assert window in WINDOWS, f"Unknown window {window}, expected one of {list(WINDOWS)}"
+    hours = WINDOWS[window]
+    return hours, max(1, int(hours * MIN_FRACTION))
+
+
+def rolling(df, window="24h", statistics=("mean", "min", "max")):
+    """Calculate moving statistics of each variable over the trailing window of each hour.
+
+    :param df: Sorted measurements (variables as columns) e.g. `WetterDB.df`
+    :type df: pd.DataFrame
+    :param window: Length of the window (see `WINDOWS`)
+    :type window: str
+    :param statistics: Moving statistics to be calculated (see `STATISTICS`)
+    :type statistics: tuple of str
+    :return: Columns `{var}_{statistic}` for each measurement
+    :rtype: pd.DataFrame
+    :raises: AssertionError
+    """
+    assert df.index.is_monotonic_increasing, "Measurements must be sorted."
+    hours, min_count = _window(window)
+    index, values = _hourly(df)
+    columns = dict()
+    for name in statistics:
+        assert name in STATISTICS, f"Unknown statistic {name}, expected one of {list(STATISTICS)}"
+        moved = STATISTICS[name](values, window=hours, min_count=min_count, axis=-1)
+        for var, row in zip(df.columns, moved):
+            columns[f"{var}_{name}"] = row
+    result = pd.DataFrame(columns, index=index)
+    return result if index is df.index else result.reindex(df.index)
+
+
+def zscores(df, window="30d"):
+    """Calculate the z-score of each measurement relative to the window before it.
+
+    The mean and standard deviation are taken from the window ending one hour
+    before the measurement. An anomaly therefore does not dampen its own score.
+
+    :param df: Sorted measurements (variables as columns) e.g. `WetterDB.df`
+    :type df: pd.DataFrame
+    :param window: Length of the window (see `WINDOWS`)
+    :type window: str
+    :return: Z-score of each measurement and variable (NaN if the window is too sparse)
+    :rtype: pd.DataFrame
+    :raises: AssertionError
+    """
+    assert df.index.is_monotonic_increasing, "Measurements must be sorted."
+    hours, min_count = _window(window)
+    index, values = _hourly(df)
+    mean = bn.move_mean(values, window=hours, min_count=min_count, axis=-1)
+    std = bn.move_std(values, window=hours, min_count=min_count, axis=-1)
+    scores = np.full_like(values, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores[:, 1:] = (values[:, 1:] - mean[:, :-1]) / std[:, :-1]
+    result = pd.DataFrame(scores.T, index=index, columns=df.columns)
+    return result if index is df.index else result.reindex(df.index)
+
+
+def anomalies(df, window="30d", threshold=THRESHOLD):
+    """Return the measurements whose absolute z-score exceeds a threshold in any variable.
+
+    :param df: Sorted measurements (variables as columns) e.g. `WetterDB.df`
+    :type df: pd.DataFrame
+    :param window: Length of the window (see `WINDOWS`)
+    :type window: str
+    :param threshold: Absolute z-score from which a measurement is an anomaly
+    :type threshold: float
+    :return: Z-scores of the anomalous measurements
+    :rtype: pd.DataFrame
+    """
+    scores = zscores(df, window=window)
+    return scores[(scores.abs() > threshold).any(axis=1)]
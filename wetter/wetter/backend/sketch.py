@@ -0,0 +1,123 @@
+"""Mergeable quantile sketches of the measurements maintained on ingest.
+
+Exact quantiles over decades of hourly measurements require sorting all of
+them for every query. Instead, a sketch is kept per variable and calendar
+month (UTC, same buckets as `wetter.backend.stats`). The quantiles of any
+window are answered by merging the sketches of the months within the window.
+
+A sketch is a sparse histogram with a fixed bin width of `RESOLUTION`.
+Each measurement is counted in the bin of its nearest multiple of the
+resolution. Merging two sketches adds their counts, hence merging is exact
+and independent of the order. The quantiles follow the nearest-rank
+definition (`numpy.quantile(..., method="inverted_cdf")`).
+
+Error bound: a reported quantile differs by at most `RESOLUTION / 2` from the
+exact quantile of the measurements. The measurements of the Open Meteo API
+are rounded to `RESOLUTION` already, therefore the quantiles are exact.
+"""
+import math
+
+import numpy as np
+
+# Bin width of the sketches in units of the variables (e.g. °C and km/h)
+RESOLUTION = 0.1
+
+
+class QuantileSketch:
+    """Sparse fixed-width histogram answering quantile queries.
+
+    :param bins: Sorted bin numbers (value / RESOLUTION) with at least one measurement
+    :type bins: np.ndarray of int
+    :param counts: Number of measurements per bin
+    :type counts: np.ndarray of int
+    """
+
+    __slots__ = ("bins", "counts")
+
+    def __init__(self, bins=None, counts=None):
+        self.bins = np.zeros(0, dtype=np.int64) if bins is None else np.asarray(bins, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def from_values(cls, values):
+        """Create sketch from an array of measurements (NaNs are ignored).
+
+        :param values: Measurements
+        :type values: np.ndarray
+        :rtype: QuantileSketch
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        bins, counts = np.unique(np.round(values / RESOLUTION).astype(np.int64), return_counts=True)
+        return cls(bins, counts)
+
+    @property
+    def count(self):
+        """Number of measurements in the sketch."""
+        return int(self.counts.sum())
+
+    def merge(self, other):
+        """Merge sketches of two disjoint sets of measurements.
+
+        :param other: Sketch to be merged with this one
+        :type other: QuantileSketch
+        :return: Merged sketch
+        :rtype: QuantileSketch
+        """
+        return merge_all([self, other])
+
+    def quantiles(self, qs):
+        """Return quantiles of the measurements (NaN if empty).
+
+        :param qs: Probabilities between 0 and 1
+        :type qs: list of float
+        :return: Quantile per probability
+        :rtype: list of float
+        """
+        count = self.count
+        if count == 0:
+            return [math.nan for _ in qs]
+        cumulative = np.cumsum(self.counts)
+        ranks = [max(math.ceil(q * count), 1) for q in qs]
+        positions = np.searchsorted(cumulative, ranks, side="left")
+        return [round(float(self.bins[position]) * RESOLUTION, 10) for position in positions]
+
+    def to_dict(self):
+        """Serialization of the sketch (dense counts between the first and last bin)."""
+        if self.bins.size == 0:
+            return dict(first=0, counts=[])
+        counts = np.zeros(self.bins[-1] - self.bins[0] + 1, dtype=np.int64)
+        counts[self.bins - self.bins[0]] = self.counts
+        return dict(first=int(self.bins[0]), counts=counts.tolist())
+
+    @classmethod
+    def from_dict(cls, data):
+        """Deserialization of the sketch."""
+        counts = np.asarray(data["counts"], dtype=np.int64)
+        nonzero = np.flatnonzero(counts)
+        return cls(nonzero + data["first"], counts[nonzero])
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, QuantileSketch)
+            and np.array_equal(self.bins, other.bins)
+            and np.array_equal(self.counts, other.counts)
+        )
+
+    def __repr__(self):
+        return f"QuantileSketch(count={self.count}, bins={self.bins.size})"
+
+
+def merge_all(sketches):
+    """Merge many sketches at once.
+
+    :param sketches: Sketches of disjoint sets of measurements
+    :type sketches: iterable of QuantileSketch
+    :rtype: QuantileSketch
+    """
+    sketches = [sketch for sketch in sketches if sketch.bins.size > 0]
+    if len(sketches) == 0:
+        return QuantileSketch()
+    bins, inverse = np.unique(np.concatenate([sketch.bins for sketch in sketches]), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate([sketch.counts for sketch in sketches]))
+    return QuantileSketch(bins, counts.astype(np.int64))
@@ -0,0 +1,116 @@
+"""Spatial index of datastores of previously configured locations.
+
+Whenever the configured location changes, the datastore of the old
+location is archived instead of being overwritten. The `LocationIndex`
+maps the archived datastores onto a regular lat/lon grid. Looking up
+the nearest archived location therefore only inspects the grid cells
+around the requested coordinates and not every archived datastore.
+A relocation can reuse the data of an archived location within
+tolerance and only needs to fetch the missing time ranges.
+
+The distance is measured like `Configuration.location_changed` i.e. as
+the maximum of the absolute latitude and longitude difference.
+"""
+import json
+import logging
+import math
+import os
+
+log = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+
+
+class LocationIndex:
+    """Grid index of archived datastores.
+
+    :param directory: Location of the archive (datastores and index file)
+    :type directory: str
+    :param cell: Size of the grid cells in degrees
+    :type cell: float
+    """
+
+    def __init__(self, directory, cell=1.0):
+        assert cell > 0, "Cell size must be > 0."
+        self.directory = directory
+        self.cell = cell
+        self._grid = dict()
+        self._load()
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._grid.values())
+
+    def _key(self, lat, lon):
+        return (math.floor(lat / self.cell), math.floor(lon / self.cell))
+
+    def path(self, lat, lon):
+        """Return the location of the archived datastore of a coordinate.
+
+        :param lat: Latitude of the location
+        :type lat: float
+        :param lon: Longitude of the location
+        :type lon: float
+        :rtype: str
+        """
+        return os.path.join(self.directory, f"{lat:.4f}_{lon:.4f}.json")
+
+    def add(self, lat, lon, path):
+        """Add (or replace) an archived datastore.
+
+        :param lat: Latitude of the datastore
+        :type lat: float
+        :param lon: Longitude of the datastore
+        :type lon: float
+        :param path: Location of the datastore
+        :type path: str
+        """
+        entries = self._grid.setdefault(self._key(lat, lon), [])
+        entries[:] = [entry for entry in entries if entry[2] != path]
+        entries.append((lat, lon, path))
+
+    def nearest(self, lat, lon, tolerance):
+        """Return the nearest archived datastore within tolerance.
+
+        Only the grid cells within `tolerance` around the location are inspected.
+
+        :param lat: Latitude of the location
+        :type lat: float
+        :param lon: Longitude of the location
+        :type lon: float
+        :param tolerance: Maximum difference in latitude and longitude
+        :type tolerance: float
+        :return: Latitude, longitude and location of the datastore (None if nothing is within tolerance)
+        :rtype: tuple of (float, float, str)
+        """
+        row, col = self._key(lat, lon)
+        rings = math.ceil(tolerance / self.cell)
+        best, best_distance = None, None
+        for i in range(row - rings, row + rings + 1):
+            for j in range(col - rings, col + rings + 1):
+                for entry in self._grid.get((i, j), []):
+                    distance = max(abs(entry[0] - lat), abs(entry[1] - lon))
+                    if distance <= tolerance and (best is None or distance < best_distance):
+                        best, best_distance = entry, distance
+        return best
+
+    def save(self):
+        """Persist the index next to the archived datastores."""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = [dict(lat=lat, lon=lon, path=os.path.relpath(path, self.directory)) for lat, lon, path in self]
+        tmp = os.path.join(self.directory, f"{INDEX_FILE}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(dict(cell=self.cell, locations=entries), f, indent=4)
+        os.replace(tmp, os.path.join(self.directory, INDEX_FILE))
+
+    def __iter__(self):
+        for entries in self._grid.values():
+            yield from entries
+
+    def _load(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            data = json.load(f)
+        for entry in data["locations"]:
+            self.add(entry["lat"], entry["lon"], os.path.join(self.directory, entry["path"]))
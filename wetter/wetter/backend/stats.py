@@ -0,0 +1,171 @@
+"""Running statistics of the measurements maintained on ingest.
+
+The statistics are kept per variable and per calendar month (UTC) of the
+measurements. Each bucket holds count, mean, the sum of squared differences
+from the mean (for the variance) as well as the minimum and maximum.
+Buckets are merged using the parallel variant of Welford's algorithm.
+This allows the update of a few buckets on ingest and the calculation of
+all-time statistics by merging the buckets without touching the raw data.
+"""
+import math
+
+import numpy as np
+
+
+class RunningStats:
+    """Mergeable aggregate of count, mean, variance, minimum and maximum.
+
+    :param count: Number of measurements
+    :type count: int
+    :param mean: Mean of the measurements
+    :type mean: float
+    :param m2: Sum of squared differences from the mean
+    :type m2: float
+    :param min: Minimum of the measurements
+    :type min: float
+    :param max: Maximum of the measurements
+    :type max: float
+    """
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, min=math.inf, max=-math.inf):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = min
+        self.max = max
+
+    @classmethod
+    def from_values(cls, values):
+        """Create statistics from an array of measurements (NaNs are ignored).
+
+        :param values: Measurements
+        :type values: np.ndarray
+        :rtype: RunningStats
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return cls()
+        mean = values.mean()
+        return cls(
+            count=int(values.size),
+            mean=float(mean),
+            m2=float(((values - mean) ** 2).sum()),
+            min=float(values.min()),
+            max=float(values.max()),
+        )
+
+    @classmethod
+    def from_aggregates(cls, counts, means, m2s, mins, maxs):
+        """Create statistics from aggregates of disjoint sets of measurements e.g. days.
+
+        :param counts: Number of measurements of each set
+        :type counts: np.ndarray
+        :param means: Mean of each set
+        :type means: np.ndarray
+        :param m2s: Sum of squared differences from the mean of each set
+        :type m2s: np.ndarray
+        :param mins: Minimum of each set
+        :type mins: np.ndarray
+        :param maxs: Maximum of each set
+        :type maxs: np.ndarray
+        :rtype: RunningStats
+        """
+        counts = np.asarray(counts, dtype=float)
+        # Sets without measurements have no mean, variance and extremes (NaN)
+        valid = counts > 0
+        counts = counts[valid]
+        count = counts.sum()
+        if count == 0:
+            return cls()
+        means = np.asarray(means, dtype=float)[valid]
+        mean = (counts * means).sum() / count
+        m2 = np.asarray(m2s, dtype=float)[valid].sum() + (counts * (means - mean) ** 2).sum()
+        low, high = np.asarray(mins, dtype=float)[valid].min(), np.asarray(maxs, dtype=float)[valid].max()
+        return cls(count=int(count), mean=float(mean), m2=float(m2), min=float(low), max=float(high))
+
+    def push(self, values):
+        """Add measurements to the statistics.
+
+        :param values: Measurements
+        :type values: np.ndarray
+        :return: Updated statistics
+        :rtype: RunningStats
+        """
+        return self.merge(RunningStats.from_values(values))
+
+    def merge(self, other):
+        """Merge statistics of two disjoint sets of measurements (in-place).
+
+        :param other: Statistics to be merged into this one
+        :type other: RunningStats
+        :return: Merged statistics
+        :rtype: RunningStats
+        """
+        count = self.count + other.count
+        if count == 0:
+            return self
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """Population variance of the measurements (NaN if empty)."""
+        return self.m2 / self.count if self.count > 0 else math.nan
+
+    @property
+    def std(self):
+        """Population standard deviation of the measurements (NaN if empty)."""
+        return math.sqrt(self.variance)
+
+    def to_dict(self):
+        """Serialization of the statistics."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Deserialization of the statistics."""
+        return cls(**data)
+
+    def __eq__(self, other):
+        return isinstance(other, RunningStats) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"RunningStats(count={self.count}, mean={self.mean:.2f}, min={self.min}, max={self.max})"
+
+
+def bucket_keys(index):
+    """Return the calendar month bucket (UTC) of each timestamp e.g. `2022-01`.
+
+    :param index: Timestamps of the measurements
+    :type index: pd.DatetimeIndex
+    :rtype: np.ndarray of str
+    """
+    index = index.tz_convert("UTC")
+    codes, inverse = np.unique(index.year.to_numpy() * 100 + index.month.to_numpy(), return_inverse=True)
+    labels = np.array([f"{code // 100}-{code % 100:02d}" for code in codes])
+    return labels[inverse]
+
+
+def overall(buckets, variables):
+    """Merge the statistics of all buckets.
+
+    :param buckets: Statistics per bucket and variable
+    :type buckets: dict
+    :param variables: Names of the variables
+    :type variables: list of str
+    :return: Statistics per variable
+    :rtype: dict
+    """
+    result = {var: RunningStats() for var in variables}
+    for bucket in buckets.values():
+        for var in variables:
+            result[var].merge(bucket[var])
+    return result
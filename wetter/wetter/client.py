@@ -0,0 +1,369 @@
+"""Library interface to the local measurements for other Python programs.
+
+The cli tool loads the datastore once per invocation. Long running programs
+e.g. web services instead query the same datastore from many threads. The
+`WetterClient` is the facade for this use case:
+
+- Creating a client is free. Neither the configuration nor the datastore
+  is read before the first query.
+- Datastores are loaded once per process and shared by all clients of the
+  same file and options (in-process cache). Changes of the file on disk are only picked
+  up by an explicit `refresh()`.
+- Queries hold a shared (read) lock, refreshes and updates an exclusive
+  (write) lock of the datastore. Any number of queries run concurrently while
+  a datastore is never replaced or modified in the middle of a query.
+- Results are copies and can be modified by the caller.
+
+Example:
+
+    client = WetterClient("/path/to/wetter.json")
+    client.last_week()["temperature"].mean()
+"""
+import inspect
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from wetter.backend import derived as dv
+from wetter.backend import queries as qu
+from wetter.backend import rolling as rl
+from wetter.backend.cache import QueryCache
+from wetter.config.parser import from_store, to_store
+from wetter.tools import now
+
+log = logging.getLogger(__name__)
+
+
+class RWLock:
+    """Readers-writer lock i.e. many concurrent readers or a single writer.
+
+    Waiting writers take precedence over new readers. A steady stream of
+    queries can therefore not starve a refresh.
+    """
+
+    __slots__ = ("_cond", "_readers", "_writer", "_waiting")
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting = 0
+
+    @contextmanager
+    def read(self):
+        """Hold the lock shared with other readers."""
+        with self._cond:
+            while self._writer or self._waiting > 0:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """Hold the lock exclusively."""
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._writer or self._readers > 0:
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class _Entry:
+    """Datastore shared by all clients of the same file and options."""
+
+    __slots__ = ("lock", "store", "signature")
+
+    def __init__(self):
+        self.lock = RWLock()
+        self.store = None
+        self.signature = None
+
+
+_ENTRIES = dict()
+_ENTRIES_LOCK = threading.Lock()
+
+
+def _entry(path, retention, gap_limit):
+    # The options change the loaded datastore (e.g. compacted days), clients with other options get their own copy
+    key = (path, retention, gap_limit)
+    with _ENTRIES_LOCK:
+        entry = _ENTRIES.get(key)
+        if entry is None:
+            entry = _ENTRIES[key] = _Entry()
+        return entry
+
+
+def clear_cache():
+    """Drop all datastores of the in-process cache (loaded again on next access)."""
+    with _ENTRIES_LOCK:
+        _ENTRIES.clear()
+
+
+class WetterClient:
+    """Thread-safe access to the measurements of a single datastore.
+
+    :param store_path: Location of the datastore file
+    :type store_path: str
+    :param retention: Number of years hourly measurements are kept [default: None i.e. forever]
+    :type retention: int
+    :param gap_limit: Maximum number of missing hours interpolated on update [default: None i.e. no interpolation]
+    :type gap_limit: int
+    """
+
+    __slots__ = ("store_path", "retention", "gap_limit", "_entry")
+
+    def __init__(self, store_path, retention=None, gap_limit=None):
+        self.store_path = os.path.abspath(store_path)
+        self.retention = retention
+        self.gap_limit = gap_limit
+        self._entry = _entry(self.store_path, retention, gap_limit)
+
+    @classmethod
+    def from_configuration(cls, configuration):
+        """Create a client for the datastore of a configuration.
+
+        :param configuration: Configuration of the application
+        :type configuration: wetter.config.config.Configuration
+        :rtype: WetterClient
+        """
+        return cls(configuration.store_path, **configuration.store_options())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.store_path!r})"
+
+    @contextmanager
+    def _reading(self):
+        entry = self._entry
+        if entry.store is None:
+            with entry.lock.write():
+                if entry.store is None:
+                    self._load(entry)
+        with entry.lock.read():
+            yield entry.store
+
+    def _load(self, entry):
+        signature = QueryCache.signature(self.store_path)
+        assert signature is not None, f"Datastore {self.store_path} does not exist."
+        entry.store = from_store(self.store_path, retention=self.retention, gap_limit=self.gap_limit)
+        entry.signature = signature
+
+    def refresh(self):
+        """Reload the datastore if its file changed since it was loaded.
+
+        :return: True if the datastore was (re)loaded
+        :rtype: bool
+        """
+        entry = self._entry
+        with entry.lock.write():
+            if entry.store is not None and entry.signature == QueryCache.signature(self.store_path):
+                return False
+            log.info(f"Reloading datastore {self.store_path}")
+            self._load(entry)
+            return True
+
+    def update(self, save=True, **kwargs):
+        """Download new measurements into the datastore (blocks all queries meanwhile).
+
+        :param save: Flag if the datastore should be saved afterwards [default: True]
+        :type save: bool
+        :param kwargs: Parameters of `WetterDB.update` e.g. `start` and `end`
+        :type kwargs: dict
+        :return: True if the measurements or the forecast changed
+        :rtype: bool
+        """
+        entry = self._entry
+        with entry.lock.write():
+            if entry.store is None:
+                self._load(entry)
+            before = (entry.store.generation, entry.store.forecast_version)
+            entry.store.update(**kwargs)
+            if save and to_store(entry.store, path=self.store_path):
+                entry.signature = QueryCache.signature(self.store_path)
+            return (entry.store.generation, entry.store.forecast_version) != before
+
+    @property
+    def location(self):
+        """Latitude and longitude of the measurements.
+
+        :rtype: tuple of float
+        """
+        with self._reading() as store:
+            return store.lat, store.lon
+
+    @property
+    def generation(self):
+        """Counter of the content version of the datastore.
+
+        :rtype: int
+        """
+        with self._reading() as store:
+            return store.generation
+
+    def measurements(self, start=None, end=None, fill=None):
+        """Return the hourly measurements of a time period.
+
+        :param start: Start date of time period (included) [default: first measurement]
+        :type start: datetime.datetime w/ time zone information
+        :param end: End date of time period (included) [default: last measurement]
+        :type end: datetime.datetime w/ time zone information
+        :param fill: Maximum number of missing hours to interpolate (see `Query.fill`) [default: None]
+        :type fill: int
+        :rtype: pd.DataFrame
+        """
+        with self._reading() as store:
+            query = qu.Query(store.df).window(start, end)
+            if fill is not None:
+                query = query.fill(fill)
+            return query.collect().copy()
+
+    def evaluate(self, expression, start=None, end=None, derived=None):
+        """Evaluate an expression over the hourly measurements of a time period.
+
+        :param expression: Arithmetic expression over stored and derived variables e.g. `wind_chill`
+        :type expression: str
+        :param start: Start date of time period (included) [default: first measurement]
+        :type start: datetime.datetime w/ time zone information
+        :param end: End date of time period (included) [default: last measurement]
+        :type end: datetime.datetime w/ time zone information
+        :param derived: Expression of each derived variable [default: predefined ones]
+        :type derived: dict
+        :rtype: pd.Series
+        """
+        with self._reading() as store:
+            window = qu.Query(store.df).window(start, end).collect()
+            return dv.evaluate(window, expression, derived=derived)
+
+    def rolling(self, window="24h", start=None, end=None, statistics=("mean", "min", "max")):
+        """Return moving statistics of each variable (see `wetter.backend.rolling`).
+
+        The statistics are calculated over the whole datastore, hence the first
+        hours of the time period consider the measurements before it.
+
+        :param window: Length of the window e.g. `24h`, `7d` or `30d`
+        :type window: str
+        :param start: Start date of time period (included) [default: first measurement]
+        :type start: datetime.datetime w/ time zone information
+        :param end: End date of time period (included) [default: last measurement]
+        :type end: datetime.datetime w/ time zone information
+        :param statistics: Moving statistics e.g. `mean`, `min`, `max` or `std`
+        :type statistics: tuple of str
+        :rtype: pd.DataFrame
+        """
+        with self._reading() as store:
+            return qu.Query(rl.rolling(store.df, window=window, statistics=statistics)).window(start, end).collect()
+
+    def zscores(self, window="30d", start=None, end=None):
+        """Return the z-score of each measurement relative to the window before it.
+
+        :param window: Length of the window e.g. `24h`, `7d` or `30d`
+        :type window: str
+        :param start: Start date of time period (included) [default: first measurement]
+        :type start: datetime.datetime w/ time zone information
+        :param end: End date of time period (included) [default: last measurement]
+        :type end: datetime.datetime w/ time zone information
+        :rtype: pd.DataFrame
+        """
+        with self._reading() as store:
+            return qu.Query(rl.zscores(store.df, window=window)).window(start, end).collect()
+
+    def latest(self, date=None):
+        """Return the latest measurement before a date.
+
+        :param date: Date used as context for the query [default: now]
+        :type date: datetime.datetime w/ time zone information
+        :rtype: pd.DataFrame
+        """
+        return self._query(qu.latest_datapoint, date)
+
+    def last_week(self, date=None):
+        """Return the measurements of the last seven days.
+
+        :param date: Date used as context for the query [default: now]
+        :type date: datetime.datetime w/ time zone information
+        :rtype: pd.DataFrame
+        """
+        return self._query(qu.last_week, date)
+
+    def last_month(self, date=None):
+        """Return the measurements of the last month.
+
+        :param date: Date used as context for the query [default: now]
+        :type date: datetime.datetime w/ time zone information
+        :rtype: pd.DataFrame
+        """
+        return self._query(qu.last_month, date)
+
+    def last_year(self, date=None):
+        """Return the measurements of the last year.
+
+        :param date: Date used as context for the query [default: now]
+        :type date: datetime.datetime w/ time zone information
+        :rtype: pd.DataFrame
+        """
+        return self._query(qu.last_year, date)
+
+    def month(self, month, date=None):
+        """Return the measurements of a specific month (of this or last year).
+
+        :param month: Month (1-12)
+        :type month: int
+        :param date: Date used as context for the query [default: now]
+        :type date: datetime.datetime w/ time zone information
+        :rtype: pd.DataFrame
+        """
+        return self._query(qu.specific_month, date, month=month)
+
+    def compare(self, date=None):
+        """Return the averages of the last week, month and year.
+
+        :param date: Date used as context for the query [default: now]
+        :type date: datetime.datetime w/ time zone information
+        :rtype: pd.DataFrame
+        """
+        return self._query(qu.compare_all, date)
+
+    def percentiles(self, start, end, qs=qu.QUANTILES):
+        """Return quantiles of each variable within a time period.
+
+        :param start: Start date of time period (included)
+        :type start: datetime.datetime w/ time zone information
+        :param end: End date of time period (included)
+        :type end: datetime.datetime w/ time zone information
+        :param qs: Probabilities between 0 and 1
+        :type qs: tuple of float
+        :rtype: pd.DataFrame
+        """
+        with self._reading() as store:
+            return qu.percentiles(store.df, start, end, store.sketches, qs=qs)
+
+    def statistics(self):
+        """Return the running statistics of each variable over all measurements.
+
+        :rtype: dict
+        """
+        with self._reading() as store:
+            return {var: stats.to_dict() for var, stats in store.overall_stats().items()}
+
+    def _query(self, func, date, **kwargs):
+        if date is None:
+            date = now()
+        with self._reading() as store:
+            if "rollup" in inspect.signature(func).parameters:
+                kwargs["rollup"] = store.rollup
+            return func(store.df, date, **kwargs).copy()
@@ -1,6 +1,7 @@
 """Configuration module for storing the current settings in memory."""
 
 import datetime
+import inspect
 import json
 import logging
 import os
@@ -9,20 +10,27 @@ from dataclasses import dataclass
 import platformdirs
 import toml
 
+from wetter import metrics
+from wetter.backend import derived
+from wetter.backend import queries as qu
+from wetter.backend.cache import QueryCache
+from wetter.backend.climatology import Climatology
+from wetter.backend.cube import CalendarCube
 from wetter.backend.extern import OpenMeteoArchiveMeasurements
-from wetter.backend.local import WetterDB
+from wetter.backend.spatial import LocationIndex
 from wetter.config.defaults import (
     APPAUTHOR,
     APPNAME,
     BASE_CONFIG,
     BASE_STORE,
+    DEFAULT_CACHE_PATH,
     DEFAULT_CONFIG_PATH,
     SYSTEMD_SERVICE,
     SYSTEMD_TIMER,
     USER,
 )
-from wetter.config.parser import DecodeDateTime, to_store
-from wetter.tools import logio, utcnow
+from wetter.config.parser import from_store, to_store
+from wetter.tools import local_zone, logio, utcnow
 
 log = logging.getLogger(__name__)
 
@@ -31,6 +39,12 @@ log = logging.getLogger(__name__)
 class Configuration:
     """Current configuration and storage files in one object.
 
+    The storage file is loaded lazily on first access of `store` (or `get_store()`).
+    Commands which only need the configuration e.g. `wetter configure` never touch it.
+    The self check only validates the configuration itself. A changed location
+    is detected by `location_changed()` and the refetch of the data needs to be
+    requested explicitly using `relocate()` (`wetter relocate`).
+
     :param max_distance: Acceptable change in location coordinate changes until reload of data
     :type max_distance: int
     :param config_path: Location of configuration file
@@ -39,6 +53,8 @@ class Configuration:
     :type self_check: bool
     :param store_path: Location of storage file
     :type store_path: str
+    :param cache_path: Location of the query cache file
+    :type cache_path: str
     """
 
     max_distance: int = 1
@@ -48,14 +64,27 @@ class Configuration:
         platformdirs.user_data_dir(appname=APPNAME, appauthor=APPAUTHOR),
         f"{APPNAME}.json",
     )
+    cache_path: str = DEFAULT_CACHE_PATH
 
     def __post_init__(self):
+        self._store = None
+        self._cache = None
         self._load_config()
         self.max_distance = getattr(self.config, "max_distance", self.max_distance)
-        self._load_store()
         if self.self_check:
             self._check()
 
+    @property
+    def store(self):
+        """Datastore of the measurements (loaded on first access).
+
+        :returns: WetterDB with all measurements
+        :rtype: WetterDB
+        """
+        if self._store is None:
+            self._load_store()
+        return self._store
+
     def get_store(self):
         """Return the inner datastore
 
@@ -64,16 +93,224 @@ class Configuration:
         """
         return self.store
 
+    @property
+    def cache(self):
+        """Cache of query results (loaded on first access).
+
+        :returns: Persistent cache of query results
+        :rtype: QueryCache
+        """
+        if self._cache is None:
+            self._cache = QueryCache(path=self.cache_path)
+        return self._cache
+
+    def query(self, func, date, **kwargs):
+        """Execute query on the datastore and cache its result.
+
+        Results are cached based on the query, its window and the generation of
+        the datastore. A cached result is returned without loading the datastore.
+
+        :param func: Query function of `wetter.backend.queries`
+        :type func: function
+        :param date: Date used as context for the query
+        :type date: datetime.datetime w/ time zone information
+        :param kwargs: Additional parameters of the query e.g. `month`
+        :type kwargs: dict
+        :returns: Result of the query
+        :rtype: pd.DataFrame
+        """
+        with metrics.QUERY_LATENCY.time(query=func.__name__):
+            return self._query(func, date, **kwargs)
+
+    def _query(self, func, date, **kwargs):
+        info = self._store_info()
+        key = (func.__name__, *qu.window(func, date, **kwargs), os.path.abspath(self.store_path), info["generation"])
+        result = self.cache.get(key)
+        if result is None:
+            if "rollup" in inspect.signature(func).parameters:
+                kwargs["rollup"] = self.store.rollup
+            result = func(self.store.df, date, **kwargs)
+            self.cache.put(key, result)
+        return result.copy()
+
+    def statistics(self):
+        """Return the running statistics of the datastore per calendar month.
+
+        The statistics are cached like query results. A cached result is
+        returned without loading the datastore.
+
+        :returns: Statistics per calendar month and variable
+        :rtype: dict
+        """
+        return self._cached("statistics", lambda store: store.stats)
+
+    def forecast(self):
+        """Return the forecast table saved during the latest update.
+
+        The table is cached like query results. A cached result is
+        returned without loading the datastore.
+
+        :returns: Forecast, its version and the date it was issued
+        :rtype: tuple of (pd.DataFrame, int, pd.Timestamp)
+        """
+        # An update may replace the forecast without changing the measurements (generation)
+        return self._cached(
+            "forecast",
+            lambda store: (store.forecast, store.forecast_version, store.forecast_issued),
+            version=self._store_info()["forecast_version"],
+        )
+
+    def climatology(self):
+        """Return the climatology index of the datastore.
+
+        The index is persisted next to the datastore. It is rebuilt if it belongs
+        to another location (e.g. before a relocation) and only extended (and the
+        datastore loaded) if the datastore changed since then.
+
+        :returns: Climatology index of all completed years
+        :rtype: Climatology
+        """
+        path = self._sidecar_path("climatology")
+        index = Climatology.load(path)
+        info = self._store_info()
+        if index.location != (info["lat"], info["lon"]):
+            index = Climatology(location=(info["lat"], info["lon"]))
+        if index.generation != info["generation"]:
+            index.extend(self.store.df, until=utcnow())
+            index.generation = self.store.generation
+            index.save(path)
+        return index
+
+    def cube(self):
+        """Return the calendar aggregation cube (local calendar) of the datastore.
+
+        The cube is persisted next to the datastore. It is rebuilt if it belongs
+        to another location (e.g. before a relocation) or time zone and only extended (and the
+        datastore loaded) if the datastore changed since then.
+
+        :returns: Aggregates per local year, month, day and hour
+        :rtype: CalendarCube
+        """
+        path = self._sidecar_path("cube")
+        zone = local_zone()
+        cube = CalendarCube.load(path, zone=zone)
+        info = self._store_info()
+        if cube.location != (info["lat"], info["lon"]):
+            cube = CalendarCube(zone=zone, location=(info["lat"], info["lon"]))
+        if cube.generation != info["generation"]:
+            cube.extend(self.store.df)
+            cube.generation = self.store.generation
+            cube.save(path)
+        return cube
+
+    def location_changed(self):
+        """Check if the configured location differs from the location of the store.
+
+        :returns: True if the distance exceeds `max_distance` in any direction
+        :rtype: bool
+        """
+        info = self._store_info()
+        lat_diff = abs(self.config["location"]["lat"] - info["lat"])
+        lon_diff = abs(self.config["location"]["lon"] - info["lon"])
+        return lat_diff > self.max_distance or lon_diff > self.max_distance
+
+    def _cached(self, name, func, version=None):
+        info = self._store_info()
+        key = (name, os.path.abspath(self.store_path), info["generation"], version)
+        result = self.cache.get(key)
+        if result is None:
+            result = func(self.store)
+            self.cache.put(key, result)
+        return result
+
+    def _store_info(self):
+        if self._store is None:
+            info = self.cache.store_info(self.store_path)
+            # Information registered by older versions lacks the forecast version
+            if info is not None and "forecast_version" in info:
+                return info
+        return dict(
+            generation=self.store.generation,
+            forecast_version=self.store.forecast_version,
+            lat=self.store.lat,
+            lon=self.store.lon,
+        )
+
+    def relocate(self):
+        """Refetch the measurements of the configured location.
+
+        The datastore of the old location is archived. If an archived datastore
+        within `max_distance` of the new location exists, it is reused and only the
+        missing time ranges are downloaded. Otherwise, historical and recent data
+        for the new location are downloaded. The downloads block until they are
+        done, hence relocation is an explicit command and never a side effect of a query.
+        """
+        log.info(f"Relocating datastore to {self.config['location']}")
+        self._location_changed(lat=self.config["location"]["lat"], lon=self.config["location"]["lon"])
+
     @logio(log)
     def _location_changed(self, lat, lon):
-        start = utcnow()
-        end = start - datetime.timedelta(days=30)
-        start = datetime.datetime(year=start.year - 1, month=1, day=1, tzinfo=start.tzinfo)
-        print("Updating database from historical data API")
-        self.store.update(start=start, end=end, lat=lat, lon=lon, api=OpenMeteoArchiveMeasurements)
+        now = utcnow()
+        start = datetime.datetime(year=now.year - 1, month=1, day=1, tzinfo=now.tzinfo)
+        end = now - datetime.timedelta(days=30)
+        index = self.locations()
+        index.add(self.store.lat, self.store.lon, self._archive(index))
+        nearest = index.nearest(lat, lon, tolerance=self.max_distance)
+        if nearest is None:
+            print("Updating database from historical data API")
+            self.store.update(start=start, end=end, lat=lat, lon=lon, api=OpenMeteoArchiveMeasurements)
+        else:
+            lat, lon, path = nearest
+            print(f"Reusing database of nearby location ({lat}, {lon})")
+            self._store = from_store(path, **self.store_options())
+            first, latest = self.store.df.index.min(), self.store.df.index.max()
+            if first > start:
+                print("Updating database from historical data API (missing past)")
+                self.store.update(start=start, end=min(first, end), api=OpenMeteoArchiveMeasurements)
+            if latest < end:
+                print("Updating database from historical data API (missing recent past)")
+                self.store.update(start=latest, end=end, api=OpenMeteoArchiveMeasurements)
         print("Updating database from recent API")
         self.store.update()
-        to_store(self.store)
+        to_store(self.store, path=self.store_path)
+        index.save()
+
+    def store_options(self):
+        """Return the options of the datastore set in the configuration.
+
+        :returns: Parameters of the WetterDB i.e. `retention` and `gap_limit`
+        :rtype: dict
+        """
+        return dict(
+            retention=self.config.get("retention", {}).get("raw_years"),
+            gap_limit=self.config.get("gaps", {}).get("limit"),
+        )
+
+    def derived(self):
+        """Return the derived variables i.e. predefined and from the `[derived]` table of the configuration.
+
+        :returns: Expression of each derived variable
+        :rtype: dict
+        """
+        return derived.definitions(self.config.get("derived"))
+
+    def locations(self):
+        """Return the spatial index of the datastores of previously configured locations.
+
+        :returns: Index of the archived datastores
+        :rtype: LocationIndex
+        """
+        root, _ = os.path.splitext(self.store_path)
+        return LocationIndex(f"{root}.locations", cell=self.max_distance)
+
+    def _archive(self, index):
+        path = index.path(self.store.lat, self.store.lon)
+        to_store(self.store, path=path)
+        return path
+
+    def _sidecar_path(self, name):
+        root, _ = os.path.splitext(self.store_path)
+        return f"{root}.{name}.npz"
 
     def _load_config(self):
         path = self.config_path
@@ -85,10 +322,17 @@ class Configuration:
         path = self.store_path
         if not os.path.exists(path):
             self._generate_default_store()
-        with open(path, "r") as f:
-            data = json.load(f, object_hook=DecodeDateTime)
-        self.store = WetterDB(**data)
-        self._check()
+        signature = QueryCache.signature(path)
+        self._store = from_store(path, **self.store_options())
+        self._store.verify()
+        self.cache.register(
+            path,
+            signature,
+            generation=self._store.generation,
+            forecast_version=self._store.forecast_version,
+            lat=self._store.lat,
+            lon=self._store.lon,
+        )
 
     def _generate_default_config(self):
         path = self.config_path
@@ -119,8 +363,4 @@ class Configuration:
         assert self.config["location"]["lon"] <= 180
         assert self.config["location"]["lat"] >= -90
         assert self.config["location"]["lat"] <= 90
-        lat_diff = abs(self.config["location"]["lat"] - self.store.lat)
-        lon_diff = abs(self.config["location"]["lon"] - self.store.lon)
-        if lat_diff > self.max_distance or lon_diff > self.max_distance:
-            self._location_changed(lat=self.config["location"]["lat"], lon=self.config["location"]["lon"])
         return True
@@ -5,11 +5,13 @@ import platform as pl
 import platformdirs
 
 WETTER_LOG_VARIABLE = "WETTER_LOG"
+WETTER_TRACE_VARIABLE = "WETTER_TRACE"
 
 APPNAME = "wetter"
 APPAUTHOR = "ucyo"
 DEFAULT_LAT = 49
 DEFAULT_LON = 8.41
+QUERY_CACHE_SIZE = 64
 
 BASE_CONFIG = {"location": {"lat": DEFAULT_LAT, "lon": DEFAULT_LON}}
 
@@ -66,3 +68,7 @@ def get_config_path():
 
 
 DEFAULT_CONFIG_PATH = get_config_path()
+DEFAULT_CACHE_PATH = os.path.join(
+    platformdirs.user_cache_dir(appname=APPNAME, appauthor=APPAUTHOR),
+    "queries.pickle",
+)
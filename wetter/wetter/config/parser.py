@@ -8,42 +8,130 @@ timestamps i.e. including timezones prevents misusage.
 
 import datetime
 import json
+import logging
+import math
 import os
 
 import pandas as pd
 import platformdirs
 
+from wetter import metrics, tracing
 from wetter.backend.local import WetterDB
 from wetter.config.defaults import APPAUTHOR, APPNAME
 
+log = logging.getLogger(__name__)
 
-def to_store(wetterdb):
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+# Number of measurements formatted at once while streaming the datastore to disk
+CHUNK_ROWS = 8760
+
+
+def to_store(wetterdb, path=None):
     """Store the data in memory to disk.
 
+    The write is skipped if the content did not change since it was loaded
+    from (or saved to) the same file, e.g. after an update without new data.
+    The measurements are streamed to the file in chunks (see `dump_split`).
+
     :param wetterdb: The local measurements to be saved on disk
     :type wetterdb: WetterDB
+    :param path: Location of the storage file [default: user data directory]
+    :type path: str
+    :return: True if the file was written
+    :rtype: bool
     :raises: AssertionError
     """
     assert isinstance(wetterdb, WetterDB), f"Expected WetterDB, got {type(wetterdb)}"
-    dirname = platformdirs.user_data_dir(appname=APPNAME, appauthor=APPAUTHOR)
-    path = os.path.join(dirname, f"{APPNAME}.json")
+    if path is None:
+        dirname = platformdirs.user_data_dir(appname=APPNAME, appauthor=APPAUTHOR)
+        path = os.path.join(dirname, f"{APPNAME}.json")
+    fingerprint = wetterdb.fingerprint()
+    persisted = (os.path.abspath(path), fingerprint)
+    if wetterdb.persisted == persisted and os.path.exists(path):
+        log.info(f"Content of {path} did not change, skipping write")
+        return False
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    data = wetterdb.serialize()
-    with open(path, "w") as f:
-        result = json.dump(data, f, cls=WetterEncoder)
-    return result
+    with metrics.STORE_SAVE.time(), tracing.span("save", path=path) as sp:
+        with open(path, "w") as f:
+            f.write('{"data": ')
+            dump_split(wetterdb.df, f)
+            for key, value in wetterdb.serialize(measurements=False).items():
+                f.write(f", {json.dumps(key)}: ")
+                json.dump(value, f, cls=WetterEncoder)
+            f.write("}")
+        size = os.path.getsize(path)
+        sp.set(rows=len(wetterdb.df), bytes=size)
+    metrics.STORE_SIZE.set(size)
+    wetterdb.persisted = persisted
+    return True
+
+
+def from_store(path, **kwargs):
+    """Load the data of a storage file into memory.
+
+    :param path: Location of the storage file
+    :type path: str
+    :param kwargs: Additional parameters for the WetterDB e.g. `retention`
+    :type kwargs: dict
+    :return: The local measurements saved on disk
+    :rtype: WetterDB
+    """
+    with metrics.STORE_LOAD.time(), tracing.span("load", path=path) as sp:
+        with open(path, "r") as f:
+            data = json.load(f, object_hook=DecodeDateTime)
+        wetterdb = WetterDB(**data, **kwargs)
+        wetterdb.persisted = (os.path.abspath(path), wetterdb.fingerprint())
+        size = os.path.getsize(path)
+        sp.set(rows=len(wetterdb.df), bytes=size)
+    metrics.STORE_SIZE.set(size)
+    return wetterdb
+
+
+def dump_split(df, f, chunksize=CHUNK_ROWS):
+    """Stream measurements to a file in the json `split` format of `WetterDB`.
+
+    The result equals `json.dump(df.T.to_dict(orient="split"), f, cls=WetterEncoder)`.
+    Timestamps and values are formatted in chunks of rows, hence the memory
+    needed is bounded by `chunksize` and not by the number of measurements.
+
+    :param df: Measurements (variables as columns, timestamps as index)
+    :type df: pd.DataFrame
+    :param f: File opened for writing
+    :type f: file object
+    :param chunksize: Number of rows formatted at once
+    :type chunksize: int
+    """
+    f.write(f'{{"index": {json.dumps(list(df.columns))}, "columns": [')
+    for lo in range(0, df.index.size, chunksize):
+        stop = lo + chunksize
+        dates = df.index[lo:stop].strftime(DATE_FORMAT)
+        f.write((", " if lo > 0 else "") + ", ".join(f'"{date}"' for date in dates))
+    f.write('], "data": [')
+    for position, column in enumerate(df.columns):
+        values = df[column].to_numpy(dtype=float)
+        f.write(", [" if position > 0 else "[")
+        for lo in range(0, values.size, chunksize):
+            stop = lo + chunksize
+            f.write((", " if lo > 0 else "") + ", ".join(map(_format_float, values[lo:stop].tolist())))
+        f.write("]")
+    f.write("]}")
+
+
+def _format_float(value):
+    """Format float like `json.dump` (incl. NaN and Infinity)."""
+    if math.isfinite(value):
+        return float.__repr__(value)
+    return json.dumps(value)
 
 
 def serialize_date(timestamp):
     """Serialize timestamp (w/ timezone) to str."""
-    form = "%Y-%m-%dT%H:%M:%S.%f%z"
-    return timestamp.strftime(form)
+    return timestamp.strftime(DATE_FORMAT)
 
 
 def deserialize_date(encoded):
     """Deserialize str back to timestamp (w/ timezone)"""
-    form = "%Y-%m-%dT%H:%M:%S.%f%z"
-    return datetime.datetime.strptime(encoded, form)
+    return datetime.datetime.strptime(encoded, DATE_FORMAT)
 
 
 class WetterEncoder(json.JSONEncoder):
@@ -0,0 +1,152 @@
+"""In-process scheduler for periodic updates of the datastore.
+
+The `wetter daemon` mode replaces the systemd timer (`SYSTEMD_TIMER`).
+The process stays warm between updates and the scheduler takes care of:
+
+- Per-host jitter: each host runs at a stable, host specific offset within
+  the interval. Hence, a fleet of hosts does not hit the API at the same second.
+- Exponential backoff: a failed update (e.g. response status code != 200)
+  is retried after `backoff`, `2 * backoff`, ... seconds (at most one interval).
+- Coalescing: missed runs (e.g. after downtime or suspend) are not replayed.
+  They are merged into a single catch-up run, which fetches all missing
+  measurements at once since `WetterDB.update` starts at the latest measurement.
+"""
+import hashlib
+import logging
+import math
+import random
+import socket
+import threading
+import time
+
+from wetter import metrics
+
+log = logging.getLogger(__name__)
+
+SCHEDULED_RUNS = metrics.REGISTRY.register(
+    metrics.Counter("wetter_scheduled_updates_total", "Updates run by the scheduler.", labels=("result",))
+)
+NEXT_RUN = metrics.REGISTRY.register(
+    metrics.Gauge("wetter_scheduled_update_next_timestamp_seconds", "Time of the next scheduled update.")
+)
+
+
+def host_jitter(jitter, host=None):
+    """Return a stable offset in seconds for the given host.
+
+    :param jitter: Maximum offset in seconds
+    :type jitter: float
+    :param host: Name of the host [default: hostname of this machine]
+    :type host: str
+    :rtype: float
+    """
+    if host is None:
+        host = socket.gethostname()
+    digest = hashlib.sha256(host.encode()).digest()
+    return jitter * int.from_bytes(digest[:8], "big") / 2**64
+
+
+class Scheduler:
+    """Periodic execution of a job with jitter, backoff and coalescing.
+
+    :param job: Function executed periodically, returns True if successful
+    :type job: function
+    :param interval: Seconds between two runs [default: hourly]
+    :type interval: float
+    :param offset: Seconds after the start of the interval [default: 5 minutes 5 seconds]
+    :type offset: float
+    :param jitter: Maximum additional offset per host in seconds
+    :type jitter: float
+    :param backoff: Seconds until the first retry of a failed run
+    :type backoff: float
+    :param host: Name of the host used for the jitter [default: hostname]
+    :type host: str
+    :param clock: Function returning the current (wall clock) time in seconds
+    :type clock: function
+    """
+
+    tick = 60
+
+    def __init__(self, job, interval=3600, offset=305, jitter=300, backoff=60, host=None, clock=time.time):
+        assert interval > 0, "Interval must be > 0."
+        assert backoff > 0, "Backoff must be > 0."
+        self.job = job
+        self.interval = interval
+        self.offset = offset + host_jitter(jitter, host)
+        self.backoff = backoff
+        self.clock = clock
+        self.failures = 0
+        self._stop = threading.Event()
+
+    def next_slot(self, now):
+        """Return the next scheduled time after `now`.
+
+        :param now: Current time in seconds
+        :type now: float
+        :rtype: float
+        """
+        return (math.floor((now - self.offset) / self.interval) + 1) * self.interval + self.offset
+
+    def retry_delay(self):
+        """Return the delay until the next retry after consecutive failures.
+
+        :rtype: float
+        """
+        delay = min(self.backoff * 2 ** (self.failures - 1), self.interval)
+        return delay * random.uniform(0.9, 1.1)
+
+    def run_once(self):
+        """Execute the job once and return the time of the next run.
+
+        :return: Time of the next run in seconds
+        :rtype: float
+        """
+        try:
+            success = bool(self.job())
+        except Exception as err:
+            log.error(f"Scheduled update failed: {err}", exc_info=True)
+            success = False
+        SCHEDULED_RUNS.inc(result="success" if success else "failure")
+        now = self.clock()
+        if success:
+            self.failures = 0
+            # Missed slots (e.g. long run, suspend) are coalesced into the next one
+            return self.next_slot(now)
+        self.failures += 1
+        log.warning(f"Scheduled update failed {self.failures} time(s) in a row, retrying with backoff")
+        return now + self.retry_delay()
+
+    def run(self, last_run=None, iterations=None, sleep=None):
+        """Run the job periodically until `stop` is called.
+
+        If the last run is older than one interval (e.g. after downtime),
+        a single catch-up run is executed immediately.
+
+        :param last_run: Time of the last successful run in seconds [default: unknown]
+        :type last_run: float
+        :param iterations: Maximum number of runs [default: unlimited]
+        :type iterations: int
+        :param sleep: Function waiting for the given number of seconds [default: interruptible wait]
+        :type sleep: function
+        """
+        if sleep is None:
+            sleep = self._stop.wait
+        now = self.clock()
+        due = now if last_run is None or now - last_run >= self.interval else self.next_slot(now)
+        runs = 0
+        while not self._stop.is_set() and (iterations is None or runs < iterations):
+            NEXT_RUN.set(due)
+            log.info(f"Next update scheduled in {due - now:.0f}s")
+            # Sleep in small steps, the monotonic clock of sleep does not advance during suspend
+            while now < due and not self._stop.is_set():
+                sleep(min(due - now, self.tick))
+                now = self.clock()
+            if self._stop.is_set():
+                break
+            due = self.run_once()
+            now = self.clock()
+            runs += 1
+
+    def stop(self):
+        """Stop the scheduler after the current run."""
+        self._stop.set()
@@ -0,0 +1,128 @@
+"""Reports over a fleet of datastores e.g. one per site.
+
+A query of `wetter.backend.queries` is executed on many datastores in
+parallel. Each datastore is loaded and queried in a separate process
+(map). Only the aggregated value of each datastore is sent back to the
+main process. The results are streamed as soon as they are finished and
+finally reduced to a single answer e.g. the hottest site of last month.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+
+from wetter.backend import queries as qu
+from wetter.config.parser import from_store
+
+log = logging.getLogger(__name__)
+
+QUERIES = {
+    "latest": qu.latest_datapoint,
+    "last-week": qu.last_week,
+    "last-month": qu.last_month,
+    "last-year": qu.last_year,
+}
+
+REDUCERS = ("max", "min", "mean")
+
+
+@dataclass
+class SiteResult:
+    """Aggregated result of a query on the datastore of a single site.
+
+    :param path: Location of the datastore
+    :type path: str
+    :param value: Average of the variable within the query (NaN if empty)
+    :type value: float
+    :param count: Number of measurements within the query
+    :type count: int
+    :param lat: Latitude position of the site
+    :type lat: float
+    :param lon: Longitude position of the site
+    :type lon: float
+    """
+
+    path: str
+    value: float
+    count: int
+    lat: float
+    lon: float
+
+
+def evaluate(path, query, date, variable="temperature"):
+    """Execute a query on a single datastore and aggregate the result (map).
+
+    :param path: Location of the datastore
+    :type path: str
+    :param query: Name of the query (see `QUERIES`)
+    :type query: str
+    :param date: Date used as context for the query
+    :type date: datetime.datetime w/ time zone information
+    :param variable: Variable to be aggregated
+    :type variable: str
+    :rtype: SiteResult
+    """
+    db = from_store(path)
+    func = QUERIES[query]
+    if query == "latest":
+        window = func(db.df, date)
+    else:
+        window = func(db.df, date, rollup=db.rollup)
+    count = qu.size(window)
+    value = float(qu.average(window)[variable]) if count > 0 else float("nan")
+    return SiteResult(path=path, value=value, count=count, lat=db.lat, lon=db.lon)
+
+
+def run(paths, query, date, variable="temperature", workers=None):
+    """Execute a query on many datastores in parallel and stream the results.
+
+    :param paths: Locations of the datastores
+    :type paths: list of str
+    :param query: Name of the query (see `QUERIES`)
+    :type query: str
+    :param date: Date used as context for the query
+    :type date: datetime.datetime w/ time zone information
+    :param variable: Variable to be aggregated
+    :type variable: str
+    :param workers: Number of processes [default: number of cores]
+    :type workers: int
+    :return: Results in the order they are finished
+    :rtype: Generator of SiteResult
+    :raises: AssertionError
+    """
+    assert query in QUERIES, f"Unknown query {query}, expected one of {list(QUERIES)}"
+    assert date.tzinfo is not None
+    workers = min(workers or os.cpu_count() or 1, max(len(paths), 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(evaluate, path, query, date, variable): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as err:
+                log.error(f"Query on {futures[future]} failed: {err}", exc_info=True)
+
+
+def reduce(results, how="max"):
+    """Reduce the results of all sites to a single answer.
+
+    Sites without measurements are ignored.
+
+    :param results: Results of all sites
+    :type results: iterable of SiteResult
+    :param how: Reduction `max`, `min` or `mean` (weighted by number of measurements)
+    :type how: str
+    :return: Site with the maximum/minimum value or the mean over all sites (path is None)
+    :rtype: SiteResult
+    :raises: AssertionError
+    """
+    assert how in REDUCERS, f"Unknown reduction {how}, expected one of {REDUCERS}"
+    results = [result for result in results if result.count > 0]
+    if len(results) == 0:
+        return None
+    if how == "max":
+        return max(results, key=lambda result: result.value)
+    if how == "min":
+        return min(results, key=lambda result: result.value)
+    count = sum(result.count for result in results)
+    value = sum(result.value * result.count for result in results) / count
+    return SiteResult(path=None, value=value, count=count, lat=float("nan"), lon=float("nan"))
@@ -0,0 +1,303 @@
+"""Operational metrics of updates, the datastore and queries.
+
+Counters, gauges and histograms are collected in a process wide registry
+and exported in the Prometheus text format (version 0.0.4). The export
+is possible as a textfile for the node exporter (e.g. after the hourly
+systemd update) or via an HTTP endpoint in a long running mode.
+
+Following metrics are collected:
+
+- `wetter_api_requests_total` and `wetter_api_request_seconds` per API and status
+- `wetter_api_response_bytes` per API (bytes transferred per request)
+- `wetter_rows_ingested_total` per update
+- `wetter_store_load_seconds`, `wetter_store_save_seconds` and `wetter_store_size_bytes`
+- `wetter_query_seconds` per query
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (1e3, 4e3, 16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6)
+
+
+class Metric:
+    """Base class of a metric with an optional set of labels.
+
+    :param name: Name of the metric
+    :type name: str
+    :param documentation: Help text of the metric
+    :type documentation: str
+    :param labels: Names of the labels
+    :type labels: tuple of str
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        assert set(labels) == set(self.labels), f"Expected labels {self.labels}, got {tuple(labels)}"
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if len(pairs) == 0:
+            return ""
+        escaped = [
+            (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in pairs
+        ]
+        return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+    def samples(self):
+        """Return the samples of the metric.
+
+        :return: Pairs of sample name incl. labels and value
+        :rtype: list of tuple
+        """
+        with self._lock:
+            return [(self.name + self._format_labels(key), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        """Render the metric in the Prometheus text format.
+
+        :rtype: str
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name} {_format_value(value)}" for name, value in self.samples()]
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        """Remove all samples."""
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    """Monotonically increasing counter."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Increase the counter.
+
+        :param amount: Non negative increment
+        :type amount: float
+        :param labels: Values of the labels
+        :type labels: dict
+        :raises: AssertionError
+        """
+        assert amount >= 0, "Counters can only be increased"
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Return the current value of the counter."""
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """Value which can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        """Set the value of the gauge.
+
+        :param value: New value
+        :type value: float
+        :param labels: Values of the labels
+        :type labels: dict
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        """Return the current value of the gauge."""
+        return self._values.get(self._key(labels))
+
+
+class Histogram(Metric):
+    """Cumulative histogram of observations e.g. durations in seconds.
+
+    :param buckets: Upper bounds of the buckets (`+Inf` is added implicitly)
+    :type buckets: tuple of float
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        assert list(buckets) == sorted(buckets), "Buckets must be sorted"
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        """Add an observation.
+
+        :param value: Observed value
+        :type value: float
+        :param labels: Values of the labels
+        :type labels: dict
+        """
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the enclosed block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        """Return the number of observations."""
+        counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+        return sum(counts)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        samples = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(
+                    (self.name + "_bucket" + self._format_labels(key, [("le", _format_value(bound))]), cumulative)
+                )
+            samples.append((self.name + "_sum" + self._format_labels(key), total))
+            samples.append((self.name + "_count" + self._format_labels(key), cumulative))
+        return samples
+
+
+class Registry:
+    """Collection of metrics to be exported together."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        """Add a metric to the registry.
+
+        :param metric: Metric to be exported
+        :type metric: Metric
+        :return: The registered metric
+        :rtype: Metric
+        :raises: AssertionError
+        """
+        assert metric.name not in self._metrics, f"Metric {metric.name} already registered"
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Render all metrics in the Prometheus text format.
+
+        :rtype: str
+        """
+        return "".join(metric.render() for _, metric in sorted(self._metrics.items()))
+
+    def clear(self):
+        """Remove the samples of all metrics."""
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+API_REQUESTS = REGISTRY.register(
+    Counter("wetter_api_requests_total", "Requests to external weather APIs.", labels=("api", "status"))
+)
+API_LATENCY = REGISTRY.register(
+    Histogram("wetter_api_request_seconds", "Latency of requests to external weather APIs.", labels=("api", "status"))
+)
+API_BYTES = REGISTRY.register(
+    Histogram("wetter_api_response_bytes", "Size of the responses of external weather APIs.", ("api",), BYTES_BUCKETS)
+)
+ROWS_INGESTED = REGISTRY.register(Counter("wetter_rows_ingested_total", "Measurements ingested by updates."))
+STORE_LOAD = REGISTRY.register(Histogram("wetter_store_load_seconds", "Duration of loading the datastore."))
+STORE_SAVE = REGISTRY.register(Histogram("wetter_store_save_seconds", "Duration of saving the datastore."))
+STORE_SIZE = REGISTRY.register(Gauge("wetter_store_size_bytes", "Size of the datastore on disk."))
+QUERY_LATENCY = REGISTRY.register(
+    Histogram("wetter_query_seconds", "Latency of queries incl. cached results.", labels=("query",))
+)
+
+
+def write_textfile(path, registry=REGISTRY):
+    """Write the metrics for the textfile collector of the node exporter.
+
+    The file is replaced atomically so the collector never reads partial content.
+
+    :param path: Location of the `.prom` file
+    :type path: str
+    :param registry: Metrics to be written
+    :type registry: Registry
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dirname, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+    log.info(f"Metrics written to {path}")
+
+
+def serve(port, addr="127.0.0.1", registry=REGISTRY):
+    """Serve the metrics via HTTP on `/metrics` in a background thread.
+
+    :param port: Port to listen on (0 picks a free port)
+    :type port: int
+    :param addr: Address to listen on, `0.0.0.0` for all interfaces [default: loopback only]
+    :type addr: str
+    :param registry: Metrics to be served
+    :type registry: Registry
+    :return: Running server (call `shutdown()` to stop it)
+    :rtype: http.server.ThreadingHTTPServer
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            log.debug(format % args)
+
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="wetter-metrics", daemon=True)
+    thread.start()
+    log.info(f"Serving metrics on port {server.server_address[1]}")
+    return server
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
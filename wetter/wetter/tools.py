@@ -4,9 +4,12 @@ Most of these functions are in one way or the other helping out w/ DRY principle
 They are not functions specifically designed for this package and can
 easily fit in other packages.
 """
+import atexit
 import functools
 import logging
 import os
+import queue
+import threading
 import time
 from datetime import datetime as dt
 from datetime import timezone as tz
@@ -27,14 +30,19 @@ def logio(logger, level="debug"):
     :type level: str
     """
 
+    levelno = logging.getLevelName(level.upper())
+
     def dec_logio(func):
         @functools.wraps(func)
         def wrapper_func(*args, **kwargs):
-            getattr(logger, level)(f"Call: {func.__name__}()")
-            getattr(logger, level)(f"Args: {args}")
-            getattr(logger, level)(f"Kwargs: {kwargs}")
+            # Formatting arguments/results (e.g. large DataFrames) is expensive, skip it if not logged
+            if not logger.isEnabledFor(levelno):
+                return func(*args, **kwargs)
+            logger.log(levelno, f"Call: {func.__name__}()")
+            logger.log(levelno, f"Args: {args}")
+            logger.log(levelno, f"Kwargs: {kwargs}")
             result = func(*args, **kwargs)
-            getattr(logger, level)(f"Result: {result}")
+            logger.log(levelno, f"Result: {result}")
             return result
 
         return wrapper_func
@@ -42,9 +50,59 @@ def logio(logger, level="debug"):
     return dec_logio
 
 
+class LazyQueueHandler(handlers.QueueHandler):
+    """Queue based logging handler setting up the writing handler on first use.
+
+    Records are put into a queue and written by a background thread. Hence,
+    the logging thread does not pay disk latency per log line. The writing
+    handler (e.g. creation of directories and opening of files) is only set
+    up once the first record is emitted.
+
+    :param factory: Function returning the handler writing the records
+    :type factory: function
+    """
+
+    def __init__(self, factory):
+        super().__init__(queue.SimpleQueue())
+        self.factory = factory
+        self.listener = None
+        self._setup_lock = threading.Lock()
+
+    def enqueue(self, record):
+        if self.listener is None:
+            self._start()
+        super().enqueue(record)
+
+    def _start(self):
+        with self._setup_lock:
+            if self.listener is not None:
+                return
+            listener = handlers.QueueListener(self.queue, self.factory(), respect_handler_level=True)
+            listener.start()
+            atexit.register(self.stop)
+            self.listener = listener
+
+    def stop(self):
+        """Write all queued records and close the writing handler."""
+        with self._setup_lock:
+            if self.listener is None:
+                return
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
 def setup_logging(level=logging.INFO, max_bytes=10 * 1024 * 1024, backups=10):
     """Setting up the logging environment.
 
+    The records are written by a background thread into a rotating log file.
+    The log file is only opened once the first record is emitted.
+
     :param level: Logging level
     :type level: int (best use proper level e.g. logging.INFO)
     :param max_bytes: Maximum file size of log in bytes
@@ -52,15 +110,19 @@ def setup_logging(level=logging.INFO, max_bytes=10 * 1024 * 1024, backups=10):
     :param backups: Number of rotation files for logs
     :type backups: int
     """
-    log_path = os.path.join(
-        platformdirs.user_log_dir(appname=APPNAME, appauthor=APPAUTHOR),
-        f"{APPNAME}.log",
-    )
-    os.makedirs(os.path.dirname(log_path), exist_ok=True)
-    handler = handlers.RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups)
-    formatter = logging.Formatter("%(name)s %(asctime)s %(levelname)s %(message)s")
-    handler.setFormatter(formatter)
-    logging.basicConfig(handlers=[handler], level=level)
+
+    def file_handler():
+        log_path = os.path.join(
+            platformdirs.user_log_dir(appname=APPNAME, appauthor=APPAUTHOR),
+            f"{APPNAME}.log",
+        )
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        handler = handlers.RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups)
+        formatter = logging.Formatter("%(name)s %(asctime)s %(levelname)s %(message)s")
+        handler.setFormatter(formatter)
+        return handler
+
+    logging.basicConfig(handlers=[LazyQueueHandler(file_handler)], level=level)
     # debug, info, warning, error, critical
 
 
@@ -75,6 +137,23 @@ def now():
     return dt.now().replace(tzinfo=pytz.FixedOffset(utc_offset / 60))
 
 
+def local_zone():
+    """Return the name of the local time zone e.g. `Europe/Berlin` (incl. daylight saving time).
+
+    The name is read from the `TZ` environment variable or the link `/etc/localtime`.
+    Unknown zones fall back to the current offset from UTC in full hours e.g. `Etc/GMT-2`.
+
+    :rtype: str
+    """
+    zone = os.environ.get("TZ", "").lstrip(":")
+    if zone == "" and os.path.islink("/etc/localtime"):
+        zone = os.path.realpath("/etc/localtime").partition("zoneinfo/")[2]
+    if zone in pytz.all_timezones_set:
+        return zone
+    hours = round(now().utcoffset().total_seconds() / 3600)
+    return "UTC" if hours == 0 else f"Etc/GMT{-hours:+d}"
+
+
 def get_env_logging(env_key):
     """Return logging level based on povided environment variable.
 
@@ -0,0 +1,168 @@
+"""Span based tracing of the update pipeline.
+
+Each stage of an update (request, decoding, merging, saving, ...) is
+enclosed in a span. Finished spans are written as JSON lines to a trace
+file incl. their duration, parent span and attributes like row counts or
+byte sizes. This helps to find the stage which regressed if an update
+suddenly takes much longer.
+
+Tracing is enabled by setting the environment variable `WETTER_TRACE` to
+the location of the trace file (or by calling `configure`). If disabled,
+`span` returns a shared no-op object without recording anything.
+
+Example::
+
+    with tracing.span("decode", bytes=len(content)) as sp:
+        df = api.decode(content)
+        sp.set(rows=len(df))
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime as dt
+from datetime import timezone as tz
+
+from wetter.config.defaults import WETTER_TRACE_VARIABLE
+
+log = logging.getLogger(__name__)
+
+
+class _NoopSpan:
+    """Span used if tracing is disabled."""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP = _NoopSpan()
+
+
+class Span:
+    """A timed stage of the pipeline.
+
+    :param tracer: Tracer recording the span
+    :type tracer: Tracer
+    :param name: Name of the stage
+    :type name: str
+    :param attributes: Additional information e.g. row counts
+    :type attributes: dict
+    """
+
+    __slots__ = ("tracer", "name", "attributes", "trace_id", "span_id", "parent_id", "start", "_clock")
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span_id = os.urandom(8).hex()
+
+    def set(self, **attributes):
+        """Add attributes to the span e.g. results of the stage."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        parent = stack[-1] if len(stack) > 0 else None
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        stack.append(self)
+        self.start = dt.now(tz.utc)
+        self._clock = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self._clock
+        self.tracer._stack().pop()
+        record = {
+            "trace": self.trace_id,
+            "span": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "start": self.start.isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "attributes": self.attributes,
+        }
+        if exc_type is not None:
+            record["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.write(record)
+        return False
+
+
+class Tracer:
+    """Writer of finished spans as JSON lines.
+
+    :param path: Location of the trace file (appended to)
+    :type path: str
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def write(self, record):
+        """Append a record to the trace file.
+
+        :param record: Finished span
+        :type record: dict
+        """
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+
+_tracer = None
+
+
+def configure(path):
+    """Enable (or disable) tracing.
+
+    :param path: Location of the trace file (None disables tracing)
+    :type path: str
+    """
+    global _tracer
+    _tracer = Tracer(path) if path else None
+    if _tracer is not None:
+        log.info(f"Tracing enabled, writing spans to {path}")
+
+
+def enabled():
+    """Return whether tracing is enabled."""
+    return _tracer is not None
+
+
+def span(name, **attributes):
+    """Create a span for the enclosed stage.
+
+    :param name: Name of the stage
+    :type name: str
+    :param attributes: Additional information e.g. row counts
+    :type attributes: dict
+    :return: Context manager of the span (no-op if tracing is disabled)
+    :rtype: Span
+    """
+    if _tracer is None:
+        return NOOP
+    return Span(_tracer, name, attributes)
+
+
+configure(os.environ.get(WETTER_TRACE_VARIABLE))